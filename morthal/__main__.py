@@ -1,13 +1,27 @@
 """Morthal CLI — Python code analysis toolkit"""
 
 import argparse
-import tempfile
 from pathlib import Path
 
-from .main import handle
-from .utils.codebase import LocalCodebase, GitCodebase
-from .utils.store import Store
-from .vcs import normalize_url, clone_repo
+from .options import DIFF_FORMATS, METRICS, WORKTREE
+from .query import OUTPUT_FORMATS
+
+
+def _metrics_list(value: str) -> list[str]:
+    metrics = value.split(",")
+    unknown = [metric for metric in metrics if metric not in METRICS]
+    if unknown:
+        raise argparse.ArgumentTypeError(
+            f"unknown metrics {', '.join(unknown)}, choose among {', '.join(METRICS)}"
+        )
+    return metrics
+
+
+def _sample_fraction(value: str) -> float:
+    fraction = float(value)
+    if not 0 < fraction <= 1:
+        raise argparse.ArgumentTypeError(f"sample fraction must be in (0, 1], got {value}")
+    return fraction
 
 
 def main() -> None:
@@ -40,12 +54,71 @@ def main() -> None:
         action="store_true",
         help="Generate HTML report in the support directory",
     )
+    parser.add_argument(
+        "--sharded",
+        action="store_true",
+        help="With --report, write an index page plus one page per directory in {support-dir}/report",
+    )
+    parser.add_argument(
+        "--workers",
+        "-j",
+        type=int,
+        default=None,
+        help="Worker processes rendering the sharded report (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--rules",
+        type=Path,
+        default=None,
+        dest="rules_path",
+        help="TOML file of tech debt rules used by the report (default: built-in rules)",
+    )
+    parser.add_argument(
+        "--metrics",
+        type=_metrics_list,
+        default=None,
+        help="Comma separated metrics to collect, the others are neither computed nor stored "
+            f"(default: all of {','.join(METRICS)})",
+    )
+    parser.add_argument(
+        "--plugins",
+        type=lambda value: value.split(","),
+        default=None,
+        help="Comma separated metric plugins adding columns to the results: complexity, "
+            "calls, comprehensions, or the import path of a plugin class (module:Class)",
+    )
+    parser.add_argument(
+        "--docstrings",
+        action="store_true",
+        help="Also store the full docstrings, in a table of their own "
+            "(by default only their presence, length and hash are kept)",
+    )
     parser.add_argument(
         "--force",
         "-f",
         action="store_true",
         help="Force re-collection, ignoring cached data",
     )
+    parser.add_argument(
+        "--ipc-cache",
+        action="store_true",
+        help="Keep a memory-mapped Arrow IPC copy of the results for instant loading",
+    )
+    parser.add_argument(
+        "--sample",
+        type=_sample_fraction,
+        default=None,
+        metavar="FRACTION",
+        help="Only analyze a stratified random sample of this fraction of the files, "
+            "and print the estimated recap with confidence intervals",
+    )
+    parser.add_argument(
+        "--time-budget",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Sample files until this many seconds have passed, then print the estimated recap",
+    )
     parser.add_argument(
         "--history",
         "-H",
@@ -53,18 +126,165 @@ def main() -> None:
         help="Walk commit history and output CSV",
     )
 
+    subparsers = parser.add_subparsers(dest="command")
+    query_parser = subparsers.add_parser(
+        "query",
+        help="Filter, sort, group and rank the stored results",
+        description="Query the stored results, e.g. "
+            "query --where \"n_nodes > 200\" --group-by dir --top 20",
+    )
+    query_parser.add_argument(
+        "--support-dir",
+        "-s",
+        type=Path,
+        default=argparse.SUPPRESS,
+        help="Directory holding the stored results (default: .morthal)",
+    )
+    query_parser.add_argument(
+        "--rules",
+        type=Path,
+        nargs="?",
+        const=None,
+        default=argparse.SUPPRESS,
+        dest="query_rules",
+        help="Query the findings of the tech debt rules instead of the functions, "
+            "optionally reading the rules from a TOML file",
+    )
+    query_parser.add_argument(
+        "--where",
+        "-w",
+        type=str,
+        default=None,
+        help="SQL filter expression, e.g. \"n_nodes > 200 and not return_annotated\"",
+    )
+    query_parser.add_argument(
+        "--group-by",
+        type=lambda value: value.split(","),
+        default=[],
+        help="Comma separated columns to group by (\"dir\" is derived from fpath)",
+    )
+    query_parser.add_argument(
+        "--agg",
+        action="append",
+        default=[],
+        help="SQL aggregation for grouped queries, repeatable, e.g. \"avg(n_nodes) as avg_nodes\"",
+    )
+    query_parser.add_argument(
+        "--sort",
+        type=str,
+        default=None,
+        help="Column to sort by (descending unless --asc)",
+    )
+    query_parser.add_argument(
+        "--asc",
+        action="store_true",
+        help="Sort ascending",
+    )
+    query_parser.add_argument(
+        "--top",
+        "-n",
+        type=int,
+        default=None,
+        help="Only keep the first N rows",
+    )
+    query_parser.add_argument(
+        "--columns",
+        "-c",
+        type=lambda value: value.split(","),
+        default=[],
+        help="Comma separated columns to output",
+    )
+    query_parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        default="table",
+        help="Output format (default: table)",
+    )
+
+    diff_parser = subparsers.add_parser(
+        "diff",
+        help="Compare two analyses of the target",
+        description="Report the functions added, removed and changed between two "
+            "snapshots, and how the recap moved. A snapshot is a git revision of the "
+            f"target, a store directory, or \"{WORKTREE}\" for the files on disk",
+    )
+    diff_parser.add_argument(
+        "base",
+        help="Snapshot to compare from",
+    )
+    diff_parser.add_argument(
+        "head",
+        nargs="?",
+        default=WORKTREE,
+        help=f"Snapshot to compare to (default: {WORKTREE})",
+    )
+    diff_parser.add_argument(
+        "--path",
+        "-p",
+        type=Path,
+        default=argparse.SUPPRESS,
+        help="Local repository the revisions belong to (default: current directory)",
+    )
+    diff_parser.add_argument(
+        "--format",
+        choices=DIFF_FORMATS,
+        default="markdown",
+        help="Output format (default: markdown)",
+    )
+
     args = parser.parse_args()
 
+    # imported once the arguments are known to be valid, so that --help
+    # and usage errors don't wait for them
+    from .main import handle, handle_diff, handle_query
+    from .query import Query
+    from .utils.codebase import GitCodebase, LocalCodebase
+    from .utils.store import Store
+
+    if args.command == "query":
+        handle_query(
+            store=Store(
+                path=Path(args.support_dir),
+                ipc_cache=args.ipc_cache,
+            ),
+            query=Query(
+                where=args.where,
+                group_by=args.group_by,
+                aggs=args.agg,
+                sort=args.sort,
+                ascending=args.asc,
+                top=args.top,
+                columns=args.columns,
+            ),
+            fmt=args.format,
+            rules_path=getattr(args, "query_rules", None),
+            findings=hasattr(args, "query_rules"),
+        )
+        return
+
+    if args.command == "diff":
+        handle_diff(
+            base=args.base,
+            head=args.head,
+            repo_path=args.path or Path.cwd(),
+            fmt=args.format,
+        )
+        return
+
     if args.github:
         # TODO: handle potential errors in case urls is invalid
         target = GitCodebase(args.github)
     else:
-        target = LocalCodebase(args.path)
+        target = LocalCodebase(args.path or Path.cwd())
 
     store = Store(
         path=Path(args.support_dir),
         target=target.name,
-        force=args.force
+        force=args.force,
+        ipc_cache=args.ipc_cache,
+        metrics=args.metrics,
+        plugins=args.plugins,
+        docstrings=args.docstrings,
     )
     
     handle(
@@ -72,6 +292,14 @@ def main() -> None:
         store=store,
         report=args.report,
         history=args.history,
+        sharded=args.sharded,
+        workers=args.workers,
+        rules_path=args.rules_path,
+        sample=args.sample,
+        time_budget=args.time_budget,
+        metrics=args.metrics,
+        plugins=args.plugins,
+        docstrings=args.docstrings,
     )
 
     target.dispose()
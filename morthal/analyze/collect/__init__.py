@@ -1,19 +1,51 @@
+from .cache import CachedFunc, FuncCache, struct_hash
 from .collect import (
     collect_codebase_data,
     collect_func_stats,
     collect_pyfile,
+    collect_scanned,
+    collect_source,
 )
-from .data import CodebaseData, CodebaseDataBuilder, FuncStats
+from .data import (
+    FUNC_SCHEMA,
+    METRICS,
+    NODE_DEPTH_BINS,
+    SCAN_METRICS,
+    STMT_DEPTH_BINS,
+    CodebaseData,
+    CodebaseDataBuilder,
+    FileRecord,
+    FileStats,
+    FuncStats,
+    func_fields,
+)
+from .stream import Source, iter_collect, iter_func_batches
 from .utils import FuncArgsStats, dicts_to_df, get_func_args_stats
 
 __all__ = [
+    "FUNC_SCHEMA",
+    "METRICS",
+    "NODE_DEPTH_BINS",
+    "SCAN_METRICS",
+    "STMT_DEPTH_BINS",
+    "CachedFunc",
     "CodebaseData",
     "CodebaseDataBuilder",
+    "FileRecord",
+    "FileStats",
     "FuncArgsStats",
+    "FuncCache",
     "FuncStats",
+    "Source",
     "collect_codebase_data",
     "collect_func_stats",
     "collect_pyfile",
+    "collect_scanned",
+    "collect_source",
     "dicts_to_df",
+    "func_fields",
     "get_func_args_stats",
+    "iter_collect",
+    "iter_func_batches",
+    "struct_hash",
 ]
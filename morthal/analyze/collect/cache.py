@@ -0,0 +1,73 @@
+'''
+content addressed cache of the stats of functions
+
+vendored libraries, generated code and copy pasted helpers make large
+codebases hold many copies of the same functions, and walking a commit
+history sees the same functions over and over. the stats of a function
+only depend on its source (wherever it is, whatever its indentation),
+on the indentation unit of its module and on what is collected, so
+they are cached under those, and enrich skips the bodies of the
+functions found in the cache
+
+only outermost functions (not nested in other functions) are cached,
+each entry holding the rows of the nested functions as well
+'''
+
+import hashlib
+import textwrap
+from dataclasses import dataclass, field
+from typing import Any
+
+
+@dataclass
+class CachedFunc:
+    # the FuncStats (and plugin) fields of the function and of the
+    # functions nested in it, in order of appearance. the parent_name
+    # of the first one and the qualname prefix they share depend on
+    # where the function is, and are overwritten by whoever reuses the
+    # entry
+    rows: list[dict[str, Any]]
+    # nodes and statements below the function node
+    n_nodes: int
+    n_stmts: int
+    # full docstrings of the rows, when those are collected
+    docstrings: list[str | None] | None = None
+
+
+@dataclass
+class FuncCache:
+    entries: dict[tuple, CachedFunc] = field(default_factory=lambda:{})
+    hits: int = 0
+    misses: int = 0
+    # beyond this many entries the least recently used ones are
+    # dropped, for the memory not to grow with the codebase. unbounded
+    # when None
+    max_entries: int | None = None
+
+    def get(self, key: tuple) -> CachedFunc | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            if self.max_entries is not None:
+                # moved to the end, the most recently used one
+                self.entries[key] = self.entries.pop(key)
+        return entry
+
+    def put(self, key: tuple, entry: CachedFunc) -> None:
+        self.entries[key] = entry
+        if self.max_entries is not None:
+            while len(self.entries) > self.max_entries:
+                del self.entries[next(iter(self.entries))]
+
+
+def struct_hash(lines: list[str], first_lineno: int, end_lineno: int) -> int:
+    '''
+    64 bit hash of the source of a function (decorators included), with
+    its indentation removed, so that copies of a function get the same
+    hash wherever they are. stable across runs and processes
+    '''
+    text = textwrap.dedent('\n'.join(lines[first_lineno - 1:end_lineno]))
+    digest = hashlib.blake2b(text.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
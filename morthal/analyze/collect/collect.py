@@ -1,9 +1,18 @@
 import ast
+import hashlib
+import math
+import time
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Generator
 
+import polars as pl
+
 from .data import (
+    METRICS,
+    NODE_DEPTH_BINS,
+    SCAN_METRICS,
+    STMT_DEPTH_BINS,
     CodebaseData,
     CodebaseDataBuilder,
     FuncStats,
@@ -14,14 +23,40 @@ from morthal.utils.ast import (
     identify_tab_offset,
     enrich
 )
-from morthal.utils.path import iter_pyfiles
-from morthal.utils.calc import max_and_avg
+from morthal.analyze.plugin import PluginSet
+from morthal.analyze.sample import SampleSpec, plan_sample, sample_weights
+from morthal.utils.path import iter_pyfiles, module_name, qualify
+from morthal.utils.scan import AmbiguousSource, ScannedModule, scan_module
+from morthal.utils.calc import histogram, max_and_avg
 
+from .cache import CachedFunc, FuncCache, struct_hash
 from .utils import get_func_args_stats
 
 
-def collect_codebase_data(codebase_path: Path) -> CodebaseData:
-    cbuilder = CodebaseDataBuilder()
+def collect_codebase_data(
+    codebase_path: Path,
+    sample: SampleSpec | None = None,
+    metrics: list[str] | None = None,
+    plugins: PluginSet | None = None,
+    docstrings: bool = False,
+    cache: FuncCache | None = None,
+) -> CodebaseData:
+    '''
+    metrics selects what is computed for every function (see METRICS),
+    the unselected ones cost nothing and get no column. the columns of
+    the plugins are computed during the same traversal. docstrings
+    also keeps the full docstrings, in CodebaseData.docstrings_df
+
+    copies of the functions already collected are taken from cache,
+    which can be shared by several collections (of the revisions of a
+    repo, say). each collection gets a cache of its own otherwise
+    '''
+    cbuilder = CodebaseDataBuilder(metrics=metrics, plugins=plugins, docstrings=docstrings)
+    if cache is not None:
+        cbuilder.cache = cache
+
+    if sample is not None:
+        return collect_sample(codebase_path, cbuilder, sample)
 
     for pypath in iter_pyfiles(codebase_path):
         local_path_str = str(pypath.relative_to(codebase_path))
@@ -30,12 +65,102 @@ def collect_codebase_data(codebase_path: Path) -> CodebaseData:
     return cbuilder.build()
 
 
+def collect_sample(
+    codebase_path: Path,
+    cbuilder: CodebaseDataBuilder,
+    sample: SampleSpec,
+) -> CodebaseData:
+    '''
+    collects a stratified random sample of the files, files_df getting
+    the "stratum" and "weight" columns needed to extrapolate the recap
+    of the whole codebase
+    '''
+    start = time.monotonic()
+    plan = plan_sample(codebase_path, list(iter_pyfiles(codebase_path)), sample.seed)
+    n_target = max(1, math.ceil(plan.height * sample.fraction))
+
+    collected: list[str] = []
+    for local_path_str in plan['fpath']:
+        if len(collected) >= n_target:
+            break
+        if sample.time_budget is not None and collected and time.monotonic() - start > sample.time_budget:
+            break
+        collect_pyfile(codebase_path / local_path_str, cbuilder, local_path_str)
+        collected.append(local_path_str)
+
+    data = cbuilder.build()
+    weights = sample_weights(plan, collected)
+    if data.files_df.height == 0:
+        data.files_df = weights
+    else:
+        data.files_df = data.files_df.join(
+            weights.with_columns(pl.col('fpath').cast(data.files_df.schema['fpath'])),
+            on='fpath',
+            how='left',
+        )
+    return data
+
+
 def collect_pyfile(
     filepath: Path,
     cbuilder: CodebaseDataBuilder,
     local_path_str: str,
 ):
-    ast_mod = ast.parse(filepath.read_text())
+    collect_source(filepath.read_text(), cbuilder, local_path_str)
+
+
+def collect_source(
+    source: str,
+    cbuilder: CodebaseDataBuilder,
+    local_path_str: str,
+):
+    '''
+    collects the module of the given source as if it was the file at
+    local_path_str
+    '''
+    metrics = METRICS if cbuilder.metrics is None else cbuilder.metrics
+    lines = source.split('\n')
+
+    # the token scanner is several times faster than the tree, when
+    # it can yield every metric asked for
+    scanning = set(metrics) <= SCAN_METRICS and cbuilder.plugins is None \
+        and not cbuilder.docstrings
+    if scanning:
+        try:
+            scanned = scan_module(source)
+        except AmbiguousSource:
+            # the tree knows better, the file is collected the usual way
+            pass
+        else:
+            collect_scanned(scanned, cbuilder, local_path_str, lines)
+            return
+
+    ast_mod = ast.parse(source)
+    # the indentation only matters to the statement depths
+    tab_offset = identify_tab_offset(ast_mod) if 'stmt_depth' in metrics else 0
+    signature = (tab_offset, *cbuilder.cache_signature)
+    # entries of the functions of this file, which may leave a bounded
+    # cache before being reused. those which weren't in the cache are
+    # only made once the enrichment is over
+    file_entries: dict[tuple, CachedFunc | None] = {}
+
+    def prune(func_ast: ast.FunctionDef | ast.AsyncFunctionDef) -> bool:
+        # the bodies of the functions found in the cache are skipped
+        func_ast.struct_hash = struct_hash(lines, _first_lineno(func_ast), func_ast.end_lineno)
+        func_ast.outermost = not _is_nested(func_ast)
+        func_ast.pruned = False
+        if not func_ast.outermost:
+            return False
+        func_ast.cache_key = (func_ast.struct_hash, *signature)
+        if func_ast.cache_key in file_entries:
+            cbuilder.cache.hits += 1
+            func_ast.pruned = True
+        else:
+            cached = cbuilder.cache.get(func_ast.cache_key)
+            file_entries[func_ast.cache_key] = cached
+            func_ast.pruned = cached is not None
+        return func_ast.pruned
+
     mcounts = ModCounts()
     # declaring a nodesink where nodes of interest can be
     # stored during enrichment in order to avoid iterating
@@ -43,56 +168,232 @@ def collect_pyfile(
     nsink = NodeSink()
     # enriching the abstract syntax tree of the module,
     # passing the node sink to avoid rewalking again the tree
-    enrich(ast_mod, node_sink=nsink, cpf=mcounts)
+    enrich(
+        ast_mod,
+        node_sink=nsink,
+        cpf=mcounts,
+        node_depths='node_depth' in metrics,
+        stmt_depths='stmt_depth' in metrics,
+        plugins=cbuilder.plugins,
+        prune=prune,
+    )
 
-    tab_offset = identify_tab_offset(ast_mod)
     pypath_add = {"fpath":str(local_path_str)}
+    module = module_name(local_path_str)
+    # entry of the last outermost function, which the functions nested
+    # in it are added to
+    entry: CachedFunc | None = None
 
     for func_ast in nsink.funcs:
-        fstats = collect_func_stats(func_ast, tab_offset)
-        fdata = fstats.model_dump()
+        if func_ast.pruned:
+            cached = file_entries[func_ast.cache_key]
+            reuse_cached(func_ast, cached, cbuilder, pypath_add, module)
+            mcounts.n_nodes += cached.n_nodes
+            mcounts.n_stmts += cached.n_stmts
+            continue
+
+        fdata = collect_func_stats(func_ast, tab_offset, cbuilder.metrics)
+        if cbuilder.plugins is not None:
+            fdata.update(cbuilder.plugins.finalize(func_ast.plugin_scopes))
+        fdata['qualname'] = qualify(module, fdata['qualname'])
         fdata.update(pypath_add)
-        cbuilder.add_func(fdata)
+        docstring = ast.get_docstring(func_ast) if cbuilder.docstrings else None
+        cbuilder.add_func(fdata, docstring)
+
+        if func_ast.outermost:
+            entry = CachedFunc(
+                rows=[],
+                n_nodes=func_ast.subtree_counts[0],
+                n_stmts=func_ast.subtree_counts[1],
+                docstrings=[] if cbuilder.docstrings else None,
+            )
+            cbuilder.cache.put(func_ast.cache_key, entry)
+            file_entries[func_ast.cache_key] = entry
+        entry.rows.append(fdata)
+        if entry.docstrings is not None:
+            entry.docstrings.append(docstring)
 
-    # collecting filedata in the end
+    # collecting filedata in the end. scanned files have no node
+    # count, so the files falling back to the tree get none either
     cbuilder.add_file({
         'fpath':str(local_path_str),
-        'n_nodes':mcounts.n_nodes,
+        'n_nodes':None if scanning else mcounts.n_nodes,
         'n_startements':mcounts.n_stmts,
     })
 
 
+def reuse_cached(
+    func_ast: ast.FunctionDef | ast.AsyncFunctionDef,
+    cached: CachedFunc,
+    cbuilder: CodebaseDataBuilder,
+    pypath_add: dict[str, str],
+    module: str,
+):
+    '''
+    adds the rows of a function found in the cache, and of the
+    functions nested in it, as if they were just collected
+    '''
+    # the nested functions are named after the function
+    cached_qualname = cached.rows[0]['qualname']
+    qualname = qualify(module, func_ast.qualname)
+    for i, row in enumerate(cached.rows):
+        fdata = dict(row)
+        if i == 0:
+            fdata['parent_name'] = _parent_name(func_ast)
+        fdata['qualname'] = qualname + row['qualname'][len(cached_qualname):]
+        fdata.update(pypath_add)
+        docstring = cached.docstrings[i] if cached.docstrings is not None else None
+        cbuilder.add_func(fdata, docstring)
+
+
+def collect_scanned(
+    scanned: ScannedModule,
+    cbuilder: CodebaseDataBuilder,
+    local_path_str: str,
+    lines: list[str],
+):
+    metrics = cbuilder.metrics
+    pypath_add = {"fpath":str(local_path_str)}
+    module = module_name(local_path_str)
+
+    for func in scanned.funcs:
+        fdata: dict[str, Any] = {
+            'name': func.name,
+            'parent_name': func.parent_name,
+            'qualname': qualify(module, func.qualname),
+            'struct_hash': struct_hash(lines, func.first_lineno, func.end_lineno),
+        }
+        if 'name_len' in metrics:
+            fdata['name_len'] = len(func.name)
+        if 'stmt_depth' in metrics:
+            max_stmt_depth, avg_stmt_depth = stmt_depth_stats(
+                func.relative_stmt_depths, scanned.tab_offset
+            )
+            fdata['max_stmt_depth'] = max_stmt_depth
+            fdata['avg_stmt_depth'] = avg_stmt_depth
+        if 'lines' in metrics:
+            fdata['n_codelines'] = func.end_lineno - func.lineno
+        if 'stmt_depth' in metrics:
+            fdata['n_exprs'] = len(func.relative_stmt_depths)
+            fdata['stmt_depth_hist'] = stmt_depth_hist(func.relative_stmt_depths, scanned.tab_offset)
+        fdata.update(pypath_add)
+        cbuilder.add_func(fdata)
+
+    cbuilder.add_file({
+        'fpath':str(local_path_str),
+        'n_nodes':None,
+        'n_startements':scanned.n_stmts,
+    })
+
+
 def collect_func_stats(
     func_ast : ast.FunctionDef | ast.AsyncFunctionDef,
     tab_offset: int,
-) -> FuncStats:
-    n_codelines = func_ast.end_lineno - func_ast.lineno
-    func_arg_stats = get_func_args_stats(func_ast)
+    metrics: list[str] | None = None,
+) -> dict[str, Any]:
+    '''
+    the FuncStats fields of the function, only those of the given
+    metrics (all of them when None), in the order of FuncStats. the
+    qualname is the one inside the module, which the caller qualifies
+    '''
+    if metrics is None:
+        metrics = METRICS
+
+    fstats: dict[str, Any] = {
+        'name': func_ast.name,
+        'parent_name': _parent_name(func_ast),
+        'qualname': func_ast.qualname,
+        # set by the pruning of collect_pyfile
+        'struct_hash': getattr(func_ast, 'struct_hash', None),
+    }
+
+    if 'name_len' in metrics:
+        fstats['name_len'] = len(func_ast.name)
+
+    if 'node_depth' in metrics:
+        max_node_depth, avg_node_depth = max_and_avg(func_ast.relative_node_depths)
+        fstats['max_node_depth'] = max_node_depth
+        fstats['avg_node_depth'] = avg_node_depth
+        fstats['n_nodes'] = len(func_ast.relative_node_depths)
+        fstats['node_depth_hist'] = histogram(func_ast.relative_node_depths, NODE_DEPTH_BINS)
+
+    if 'stmt_depth' in metrics:
+        max_stmt_depth, avg_stmt_depth = stmt_depth_stats(
+            func_ast.relative_stmt_depths, tab_offset
+        )
+        fstats['max_stmt_depth'] = max_stmt_depth
+        fstats['avg_stmt_depth'] = avg_stmt_depth
+        fstats['n_exprs'] = len(func_ast.relative_stmt_depths)
+        fstats['stmt_depth_hist'] = stmt_depth_hist(func_ast.relative_stmt_depths, tab_offset)
+
+    if 'lines' in metrics:
+        fstats['n_codelines'] = func_ast.end_lineno - func_ast.lineno
+
+    if 'args' in metrics:
+        func_arg_stats = get_func_args_stats(func_ast)
+        fstats['n_func_args'] = func_arg_stats.n_func_args
+        fstats['n_func_args_annotated'] = func_arg_stats.n_func_args_annotated
 
-    max_node_depth, avg_node_depth = max_and_avg(func_ast.relative_node_depths)
-    max_stmt_depth, avg_stmt_depth = max_and_avg(func_ast.relative_stmt_depths)
+    if 'returns' in metrics:
+        fstats['return_annotated'] = func_ast.returns is not None
 
+    if 'docstring' in metrics:
+        fstats.update(docstring_stats(ast.get_docstring(func_ast)))
+
+    return {name: fstats[name] for name in FuncStats.model_fields if name in fstats}
+
+
+def _parent_name(func_ast: ast.FunctionDef | ast.AsyncFunctionDef) -> str | None:
+    if hasattr(func_ast, 'elden') and hasattr(func_ast.elden, 'name'):
+        return func_ast.elden.name
+    return None
+
+
+def _first_lineno(func_ast: ast.FunctionDef | ast.AsyncFunctionDef) -> int:
+    # decorators start on the line of their @
+    if func_ast.decorator_list:
+        return func_ast.decorator_list[0].lineno
+    return func_ast.lineno
+
+
+def _is_nested(func_ast: ast.FunctionDef | ast.AsyncFunctionDef) -> bool:
+    parent = func_ast.parent
+    while parent is not None:
+        if isinstance(parent, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            return True
+        parent = parent.parent
+    return False
+
+
+def docstring_stats(docstring: str | None) -> dict[str, Any]:
+    '''
+    whether there is a docstring, its length and a hash of it, which is
+    stable across runs (unlike hash()) so that changed docstrings can be
+    told apart in the stored results
+    '''
+    if docstring is None:
+        return {'has_docstring': False, 'docstring_len': 0, 'docstring_hash': None}
+    digest = hashlib.blake2b(docstring.encode(), digest_size=8).digest()
+    return {
+        'has_docstring': True,
+        'docstring_len': len(docstring),
+        'docstring_hash': int.from_bytes(digest, 'little'),
+    }
+
+
+def stmt_depth_stats(relative_stmt_depths: list[int], tab_offset: int) -> tuple[int, float]:
+    '''
+    max and average statement depth, in indentation levels
+    '''
+    max_stmt_depth, avg_stmt_depth = max_and_avg(relative_stmt_depths)
     if tab_offset > 0:
         max_stmt_depth = int(max_stmt_depth / tab_offset)
         avg_stmt_depth = avg_stmt_depth / tab_offset
+    return max_stmt_depth, avg_stmt_depth
 
-    parent_name = None
-    if hasattr(func_ast, 'elden') and hasattr(func_ast.elden, 'name'):
-        parent_name = func_ast.elden.name
-
-    return FuncStats(
-        name=func_ast.name,
-        parent_name=parent_name,
-        name_len=len(func_ast.name),
-        max_node_depth=max_node_depth,
-        max_stmt_depth=max_stmt_depth,
-        avg_node_depth=avg_node_depth,
-        avg_stmt_depth=avg_stmt_depth,
-        n_codelines = n_codelines,
-        n_exprs=len(func_ast.relative_stmt_depths),
-        n_nodes=len(func_ast.relative_node_depths),
-        n_func_args = func_arg_stats.n_func_args,
-        n_func_args_annotated = func_arg_stats.n_func_args_annotated,
-        return_annotated = func_ast.returns is not None,
-        docstring = ast.get_docstring(func_ast)
-    )
+
+def stmt_depth_hist(relative_stmt_depths: list[int], tab_offset: int) -> list[int]:
+    '''
+    counts of the statements per indentation level
+    '''
+    return histogram(relative_stmt_depths, STMT_DEPTH_BINS, max(tab_offset, 1))
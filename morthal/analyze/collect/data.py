@@ -1,9 +1,13 @@
 from dataclasses import dataclass, field
-from typing import Any
+from typing import Annotated, Any
 
 import polars as pl
 from pydantic import BaseModel
 
+from morthal.analyze.plugin import PluginSet
+from morthal.options import METRICS
+from morthal.utils.df import pydantic_to_polars_schema
+from .cache import FuncCache
 from .utils import dicts_to_df
 
 
@@ -11,40 +15,190 @@ from .utils import dicts_to_df
 class CodebaseData:
     files_df: pl.DataFrame
     funcs_df: pl.DataFrame
+    # full docstrings ("func_id", "docstring"), func_id being the row of
+    # the function in funcs_df. only collected on demand
+    docstrings_df: pl.DataFrame | None = None
+
+
+@dataclass
+class FileRecord:
+    # the FileStats fields of the file
+    file: dict[str, Any]
+    # the FuncStats (and plugin) fields of its functions, in order of
+    # appearance. they may be shared with the cache, so they are to be
+    # copied before being modified
+    funcs: list[dict[str, Any]]
+    # full docstrings of the functions, only collected on demand
+    docstrings: list[str | None] | None = None
 
 
 @dataclass
 class CodebaseDataBuilder:
+    # metrics collected, all of them when None
+    metrics: list[str] | None = None
+    # metric plugins, whose columns follow the FuncStats ones
+    plugins: PluginSet | None = None
+    # whether the full docstrings are kept, in a table of their own
+    docstrings: bool = False
+    # stats of the functions already collected, which may be shared
+    # by several builders collecting the same way
+    cache: FuncCache = field(default_factory=FuncCache)
     _files_dicts: list[dict] = field(default_factory=lambda:[])
     _funcs_dicts: list[dict] = field(default_factory=lambda:[])
+    _docstring_dicts: list[dict] = field(default_factory=lambda:[])
 
     def build(self) -> CodebaseData:
+        '''
+        paths and names are dictionary encoded: files_df is the table of
+        the files, with a "file_id" and the "fpath" as an Enum whose
+        categories are the paths in collection order, and the "fpath"
+        of funcs_df is the same Enum, so every function row holds just
+        the code of its file. names are Categorical
+        '''
+        files_df = dicts_to_df(self._files_dicts, FileStats)
+        paths = files_df['fpath'] if 'fpath' in files_df.columns else []
+        fpath_dtype = pl.Enum(paths)
+        if 'fpath' in files_df.columns:
+            files_df = files_df.with_columns(pl.col('fpath').cast(fpath_dtype)) \
+                .with_row_index('file_id')
+
+        funcs_df = dicts_to_df(self._funcs_dicts, FuncStats)
+        if self.metrics is not None and funcs_df.height == 0:
+            funcs_df = funcs_df.select(func_fields(self.metrics))
+        if self.plugins is not None:
+            # the declared dtypes, whatever the values found
+            funcs_df = funcs_df.with_columns(
+                pl.lit(None, dtype=dtype).alias(column)
+                for column, dtype in self.plugins.schema.items()
+                if column not in funcs_df.columns
+            ).cast(self.plugins.schema)
+        funcs_df = funcs_df.with_columns(
+            (
+                pl.col('fpath') if 'fpath' in funcs_df.columns else pl.lit(None)
+            ).cast(fpath_dtype).alias('fpath'),
+        )
+        docstrings_df = None
+        if self.docstrings:
+            docstrings_df = pl.DataFrame(
+                self._docstring_dicts,
+                schema={'func_id': pl.UInt32, 'docstring': pl.Utf8},
+            )
         return CodebaseData(
-            files_df=pl.DataFrame(self._files_dicts),
-            funcs_df=dicts_to_df(self._funcs_dicts, FuncStats),
+            files_df=files_df,
+            funcs_df=funcs_df,
+            docstrings_df=docstrings_df,
         )
 
 
+    @property
+    def cache_signature(self) -> tuple:
+        '''
+        what the cached stats depend on, besides the functions
+        '''
+        return (
+            None if self.metrics is None else tuple(self.metrics),
+            () if self.plugins is None else tuple(self.plugins.names),
+            self.docstrings,
+        )
+
+    def take_file(self) -> FileRecord:
+        '''
+        the records of the one file collected since the last call, which
+        the builder doesn't keep
+        '''
+        (file_dict,) = self._files_dicts
+        docstrings = None
+        if self.docstrings:
+            docstrings = [None] * len(self._funcs_dicts)
+            for docstring_dict in self._docstring_dicts:
+                docstrings[docstring_dict['func_id']] = docstring_dict['docstring']
+        record = FileRecord(file=file_dict, funcs=self._funcs_dicts, docstrings=docstrings)
+        self._files_dicts, self._funcs_dicts, self._docstring_dicts = [], [], []
+        return record
+
     def add_file(self, file_dict: dict[str, Any]):
         self._files_dicts.append(file_dict)
 
 
-    def add_func(self, func_dict: dict[str, Any]):
+    def add_func(self, func_dict: dict[str, Any], docstring: str | None = None):
+        if self.docstrings and docstring is not None:
+            self._docstring_dicts.append({
+                'func_id': len(self._funcs_dicts),
+                'docstring': docstring,
+            })
         self._funcs_dicts.append(func_dict)
 
 
+# bins of the depth histograms, the last one counting all the deeper
+# levels as well. they cover well beyond the 99.9th percentile of the
+# max depths found in large codebases
+NODE_DEPTH_BINS = 24
+STMT_DEPTH_BINS = 16
+
+
+# the polars dtypes annotated on the fields are those of the collected
+# frames (see pydantic_to_polars_schema): counts are as narrow as their
+# values allow, and names are dictionary encoded. the statement depth
+# is the column offset of a statement divided by the tab offset, which
+# isn't bounded by the nesting: a statement following a long one after
+# a ";" is as deep as the length of the line
 class FuncStats(BaseModel):
-    name: str
-    parent_name: str | None
-    name_len: int
-    max_node_depth: int
-    max_stmt_depth: int
+    name: Annotated[str, pl.Categorical]
+    parent_name: Annotated[str, pl.Categorical] | None
+    # dotted path of the module plus the __qualname__ of the function,
+    # like "pkg.mod.Class.method" or "pkg.mod.func.<locals>.inner". the
+    # names of everything below a scope share its qualname as prefix
+    qualname: Annotated[str, pl.Categorical]
+    # hash of the source of the function, the same for all its copies
+    # (see morthal.analyze.collect.cache)
+    struct_hash: Annotated[int, pl.UInt64] | None
+    name_len: Annotated[int, pl.UInt16]
+    max_node_depth: Annotated[int, pl.UInt16]
+    max_stmt_depth: Annotated[int, pl.UInt32]
     avg_node_depth: float
     avg_stmt_depth: float
-    n_codelines: int
-    n_exprs: int
-    n_nodes: int
-    n_func_args : int
-    n_func_args_annotated : int
+    n_codelines: Annotated[int, pl.UInt32]
+    n_exprs: Annotated[int, pl.UInt32]
+    n_nodes: Annotated[int, pl.UInt32]
+    # counts of the nodes (statements) of the function per depth level
+    node_depth_hist: Annotated[list[int], pl.Array(pl.UInt32, NODE_DEPTH_BINS)]
+    stmt_depth_hist: Annotated[list[int], pl.Array(pl.UInt32, STMT_DEPTH_BINS)]
+    n_func_args : Annotated[int, pl.UInt16]
+    n_func_args_annotated : Annotated[int, pl.UInt16]
     return_annotated : bool
-    docstring: str | None = None
+    # the text itself is only kept on demand, out of line (see
+    # CodebaseData.docstrings_df)
+    has_docstring: bool
+    docstring_len: Annotated[int, pl.UInt32]
+    docstring_hash: Annotated[int, pl.UInt64] | None
+
+
+class FileStats(BaseModel):
+    fpath: str
+    # not known to the token scanner
+    n_nodes: Annotated[int, pl.UInt32] | None
+    n_startements: Annotated[int, pl.UInt32]
+
+
+FUNC_SCHEMA = pydantic_to_polars_schema(FuncStats)
+
+
+# the fields of every metric are in METRICS. the names and the hash
+# identify the functions, so they are collected whatever the metrics
+ID_FIELDS = ['name', 'parent_name', 'qualname', 'struct_hash']
+# metrics which the token scanner (morthal.utils.scan) yields without
+# building the tree, when nothing else is asked for
+SCAN_METRICS = {'name_len', 'lines', 'stmt_depth'}
+
+
+def func_fields(metrics: list[str] | None = None) -> list[str]:
+    '''
+    the FuncStats fields of the given metrics, in the order of FuncStats
+    '''
+    if metrics is None:
+        return list(FuncStats.model_fields)
+    unknown = set(metrics) - set(METRICS)
+    if unknown:
+        raise ValueError(f'unknown metrics {sorted(unknown)}, expected some of {list(METRICS)}')
+    selected = set(ID_FIELDS).union(*(METRICS[metric] for metric in metrics))
+    return [name for name in FuncStats.model_fields if name in selected]
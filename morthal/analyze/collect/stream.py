@@ -0,0 +1,184 @@
+'''
+streaming collection, for using morthal as a library
+
+collect_codebase_data builds the frames of the whole codebase before
+returning anything. iter_collect instead yields the records of every
+file as soon as it is collected, so that the first results come right
+away and the memory used doesn't grow with the codebase: whatever
+consumes them (a message queue, an arrow or parquet writer...) gets
+the functions of one file at a time, or batches of a fixed number of
+rows through iter_func_batches
+
+files can be collected by a pool of worker processes, of which at
+most a few files per worker are in flight, and whose records are
+yielded in the order of the sources all the same
+'''
+
+import importlib.util
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path, PurePath
+from typing import Iterable, Iterator
+
+import polars as pl
+
+from morthal.analyze.plugin import load_plugins
+from morthal.utils.path import iter_pyfiles
+from .cache import FuncCache
+from .collect import collect_pyfile, collect_source
+from .data import CodebaseDataBuilder, FileRecord, FuncStats
+from .utils import dicts_to_df
+
+
+# a python file or a directory of them, or the path a module is named
+# after together with its content
+Source = str | Path | tuple[str | PurePath, bytes]
+
+# files submitted to the pool per worker, ahead of the one awaited
+IN_FLIGHT_PER_WORKER = 4
+# functions kept in the cache of a stream (and of every worker of it)
+# unless a cache is given. copies are mostly found among the recently
+# collected functions, vendored packages being walked file after file
+STREAM_CACHE_ENTRIES = 8192
+
+
+def iter_collect(
+    sources: Iterable[Source],
+    metrics: list[str] | None = None,
+    plugins: list[str] | None = None,
+    docstrings: bool = False,
+    workers: int | None = 1,
+    cache: FuncCache | None = None,
+) -> Iterator[FileRecord]:
+    '''
+    the records of every file of the sources, in order. a directory
+    stands for the python files below it, named by their path relative
+    to it (as done by collect_codebase_data), other paths are named as
+    given
+
+    metrics and docstrings are as in collect_codebase_data, plugins are
+    given by their specs (see load_plugins). workers are the processes
+    collecting the files, all the CPUs when None, while with a single
+    one files are collected by the calling process, with the given
+    cache. worker processes keep a cache of their own. the caches made
+    here hold up to STREAM_CACHE_ENTRIES functions
+    '''
+    jobs = _iter_jobs(sources)
+    if workers == 1:
+        cbuilder = _new_builder(metrics, plugins, docstrings)
+        if cache is not None:
+            cbuilder.cache = cache
+        for local_path_str, content in jobs:
+            yield _collect_job(cbuilder, local_path_str, content)
+        return
+
+    workers = workers or os.cpu_count() or 1
+    # polars is multithreaded, so forking it is not safe
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=_init_worker,
+        initargs=(metrics, plugins, docstrings),
+    ) as pool:
+        max_pending = workers * IN_FLIGHT_PER_WORKER
+        pending: deque[Future] = deque()
+        for job in jobs:
+            pending.append(pool.submit(_collect_in_worker, job))
+            if len(pending) >= max_pending:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def iter_func_batches(
+    records: Iterable[FileRecord],
+    batch_size: int = 16_384,
+    plugins: list[str] | None = None,
+) -> Iterator[pl.DataFrame]:
+    '''
+    the functions of the records, in frames of batch_size rows (the
+    last one may be smaller) which all have the same schema, so that
+    they can be appended to one arrow or parquet file. fpath is a plain
+    string column, as the paths aren't known upfront. plugins are those
+    the records were collected with, whose columns get their declared
+    dtypes
+    '''
+    schema = load_plugins(plugins).schema if plugins else {}
+    rows: list[dict] = []
+    for record in records:
+        rows.extend(record.funcs)
+        while len(rows) >= batch_size:
+            yield _func_batch(rows[:batch_size], schema)
+            rows = rows[batch_size:]
+    if rows:
+        yield _func_batch(rows, schema)
+
+
+def _func_batch(rows: list[dict], plugin_schema: dict[str, pl.DataType]) -> pl.DataFrame:
+    return dicts_to_df(rows, FuncStats).cast({
+        'fpath': pl.Utf8,
+        **plugin_schema,
+    })
+
+
+def _iter_jobs(sources: Iterable[Source]) -> Iterator[tuple[str, Path | bytes]]:
+    '''
+    (local path, path or content) of every file of the sources
+    '''
+    for source in sources:
+        if isinstance(source, tuple):
+            local_path, content = source
+            yield str(local_path), content
+            continue
+        path = Path(source)
+        if path.is_dir():
+            for pypath in iter_pyfiles(path):
+                yield str(pypath.relative_to(path)), pypath
+        else:
+            yield str(path), path
+
+
+def _new_builder(
+    metrics: list[str] | None,
+    plugins: list[str] | None,
+    docstrings: bool,
+) -> CodebaseDataBuilder:
+    return CodebaseDataBuilder(
+        metrics=metrics,
+        plugins=load_plugins(plugins) if plugins else None,
+        docstrings=docstrings,
+        cache=FuncCache(max_entries=STREAM_CACHE_ENTRIES),
+    )
+
+
+def _collect_job(
+    cbuilder: CodebaseDataBuilder,
+    local_path_str: str,
+    content: Path | bytes,
+) -> FileRecord:
+    if isinstance(content, bytes):
+        # honouring the encoding declaration, as the interpreter does
+        collect_source(importlib.util.decode_source(content), cbuilder, local_path_str)
+    else:
+        collect_pyfile(content, cbuilder, local_path_str)
+    return cbuilder.take_file()
+
+
+# builder of a worker process, made once by the pool initializer
+_worker_builder: CodebaseDataBuilder | None = None
+
+
+def _init_worker(
+    metrics: list[str] | None,
+    plugins: list[str] | None,
+    docstrings: bool,
+) -> None:
+    global _worker_builder
+    _worker_builder = _new_builder(metrics, plugins, docstrings)
+
+
+def _collect_in_worker(job: tuple[str, Path | bytes]) -> FileRecord:
+    return _collect_job(_worker_builder, *job)
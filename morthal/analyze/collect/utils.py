@@ -5,7 +5,7 @@ from typing import Any
 import polars as pl
 from pydantic import BaseModel
 
-from morthal.utils.df import empty_df_from_model
+from morthal.utils.df import empty_df_from_model, pydantic_to_polars_schema
 
 
 @dataclass
@@ -25,6 +25,18 @@ def dicts_to_df(
     dicts_list: list[dict[str, Any]],
     row_model: BaseModel,
 ) -> pl.DataFrame:
+    '''
+    the columns of the fields of row_model get the dtypes of its schema,
+    the other ones are inferred
+    '''
     if len(dicts_list) == 0:
         return empty_df_from_model(row_model)
-    return pl.DataFrame(dicts_list)
\ No newline at end of file
+    # given upfront, as a column whose first values are all None (the
+    # parent names of a module starting with many functions) would be
+    # inferred as null
+    present = dicts_list[0].keys()
+    schema = pydantic_to_polars_schema(row_model)
+    return pl.DataFrame(
+        dicts_list,
+        schema_overrides={name: dtype for name, dtype in schema.items() if name in present},
+    )
\ No newline at end of file
@@ -0,0 +1,131 @@
+'''
+precomputed top-k and percentile index over the funcs dataframe
+
+the reporter and any dashboard keep asking for "the N deepest/longest
+/most complex functions" and "which functions are above p95". rather
+than sorting funcs_df again for every such question, the row order by
+each metric (descending) is computed once at collection time together
+with a few percentile cut points and the number of rows above each of
+them. answering then boils down to slicing a permutation, which is
+O(k) once the index is loaded
+
+likewise the row order by qualified name makes a name index: the
+stats of "pkg.mod.Class.method" are found by a binary search, and as
+the names of everything defined below a scope (methods, nested classes,
+closures) extend the qualified name of the scope, they make a
+contiguous range of that order, so that a subtree costs O(log n + k)
+instead of a scan of funcs_df
+'''
+
+from dataclasses import dataclass
+
+import polars as pl
+
+
+INDEX_METRICS: list[str] = ['max_stmt_depth', 'n_codelines', 'n_nodes']
+PERCENTILES: list[float] = [0.5, 0.75, 0.9, 0.95, 0.99]
+
+
+@dataclass
+class FuncsIndex:
+    # one column per metric, holding the row indexes of funcs_df
+    # sorted by that metric in descending order
+    orders: pl.DataFrame
+    # metric -> percentile label (like "p95") -> {"value", "n_above"}
+    cuts: dict[str, dict[str, dict[str, float | int]]]
+
+    def top_k(self, df: pl.DataFrame, metric: str, k: int) -> pl.DataFrame:
+        return df[self.orders[metric].head(k)]
+
+    def cut(self, metric: str, percentile: float) -> float:
+        return self.cuts[metric][_label(percentile)]['value']
+
+    def above(self, df: pl.DataFrame, metric: str, percentile: float) -> pl.DataFrame:
+        '''
+        rows whose metric is strictly above the given percentile, most
+        extreme first. only the precomputed percentiles are available
+        '''
+        n_above = self.cuts[metric][_label(percentile)]['n_above']
+        return self.top_k(df, metric, int(n_above))
+
+
+@dataclass
+class NameIndex:
+    # "qualname", the qualified names of funcs_df in ascending order,
+    # and "row", the row of funcs_df holding each of them
+    names: pl.DataFrame
+
+    def rows(self, qualname: str) -> pl.Series:
+        '''
+        rows of the functions with the given qualified name, which may
+        be more than one (property setters, conditional definitions)
+        '''
+        names = self.names['qualname']
+        start = names.search_sorted(qualname, 'left')
+        end = names.search_sorted(qualname, 'right')
+        return self.names['row'].slice(start, end - start)
+
+    def lookup(self, df: pl.DataFrame, qualname: str) -> pl.DataFrame:
+        return df[self.rows(qualname)]
+
+    def subtree(self, df: pl.DataFrame, qualname: str) -> pl.DataFrame:
+        '''
+        the functions with the given qualified name and all those
+        defined below it: everything in a class, a function with its
+        closures, everything in a module or in a package
+        '''
+        names = self.names['qualname']
+        # the names below extend it with a ".", and "/" sorts right
+        # after it. the range can't start at the name itself, as the
+        # modules named after paths may go on with "-", "+" or " "
+        start = names.search_sorted(qualname + '.', 'left')
+        end = names.search_sorted(qualname + '/', 'left')
+        below = self.names['row'].slice(start, end - start)
+        return df[pl.concat([self.rows(qualname), below])]
+
+
+def build_funcs_index(
+    df: pl.DataFrame,
+    metrics: list[str] = INDEX_METRICS,
+    percentiles: list[float] = PERCENTILES,
+) -> FuncsIndex:
+    orders = df.select(
+        pl.arg_sort_by(metric, descending=True, maintain_order=True).alias(metric)
+        for metric in metrics
+    )
+
+    cut_values = df.select(
+        pl.col(metric).quantile(q, 'linear').alias(f'{metric}:{_label(q)}')
+        for metric in metrics
+        for q in percentiles
+    ).row(0, named=True)
+    n_aboves = df.select(
+        (pl.col(metric) > cut_values[f'{metric}:{_label(q)}']).sum().alias(f'{metric}:{_label(q)}')
+        for metric in metrics
+        for q in percentiles
+    ).row(0, named=True) if df.height > 0 else {}
+
+    cuts = {
+        metric: {
+            _label(q): {
+                'value': float(cut_values[f'{metric}:{_label(q)}'] or 0.0),
+                'n_above': int(n_aboves.get(f'{metric}:{_label(q)}', 0)),
+            }
+            for q in percentiles
+        }
+        for metric in metrics
+    }
+
+    return FuncsIndex(orders=orders, cuts=cuts)
+
+
+def build_name_index(df: pl.DataFrame) -> NameIndex:
+    names = df.select(
+        pl.col('qualname').cast(pl.Utf8),
+        pl.int_range(pl.len(), dtype=pl.UInt32).alias('row'),
+    ).sort('qualname', maintain_order=True)
+    return NameIndex(names=names)
+
+
+def _label(percentile: float) -> str:
+    return f'p{round(percentile * 100)}'
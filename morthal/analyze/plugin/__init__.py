@@ -0,0 +1,21 @@
+from .base import (
+    PLUGINS,
+    Hook,
+    MetricPlugin,
+    PluginSet,
+    load_plugins,
+    register_plugin,
+)
+from .builtin import Calls, Comprehensions, CyclomaticComplexity
+
+__all__ = [
+    "PLUGINS",
+    "Calls",
+    "Comprehensions",
+    "CyclomaticComplexity",
+    "Hook",
+    "MetricPlugin",
+    "PluginSet",
+    "load_plugins",
+    "register_plugin",
+]
@@ -0,0 +1,148 @@
+'''
+metric plugins, computed during the single traversal made by enrich
+
+a plugin declares the columns it adds to funcs_df (with their dtypes,
+so that the schema doesn't depend on what is found) and the hooks it
+wants called, by node type. every function gets one accumulator per
+plugin, which the hooks update for every node whose elden is that
+function, and which the plugin turns into the values of its columns
+once the traversal is over
+
+the hooks of all the active plugins are merged into one table keyed by
+the concrete node type, so each node costs a single dict lookup however
+many plugins are active, and nodes no plugin cares about cost nothing
+more than that lookup:
+
+    @register_plugin
+    class Returns(MetricPlugin):
+        name = 'returns'
+        columns = {'n_returns': pl.Int64}
+
+        def hooks(self):
+            return {ast.Return: lambda node, n: n + 1}
+
+        def new_scope(self):
+            return 0
+
+        def finalize(self, n):
+            return {'n_returns': n}
+
+plugins are selected by their registered name, or by the import path of
+their class ("package.module:PluginClass")
+'''
+
+import ast
+import importlib
+from typing import Any, Callable
+
+import polars as pl
+
+
+# a hook gets the node and the accumulator of the function, and
+# returns the updated accumulator
+Hook = Callable[[ast.AST, Any], Any]
+
+
+class MetricPlugin:
+    # name selecting the plugin
+    name: str = ''
+    # column -> dtype of every column the plugin yields
+    columns: dict[str, pl.DataType] = {}
+
+    def hooks(self) -> dict[type[ast.AST], Hook]:
+        '''
+        node type -> hook. abstract types (like ast.stmt) stand for all
+        of their concrete subtypes
+        '''
+        return {}
+
+    def new_scope(self) -> Any:
+        '''
+        the accumulator of a function, before visiting any node
+        '''
+        return None
+
+    def finalize(self, acc: Any) -> dict[str, Any]:
+        '''
+        column -> value, for every declared column
+        '''
+        raise NotImplementedError
+
+
+PLUGINS: dict[str, type[MetricPlugin]] = {}
+
+
+def register_plugin(cls: type[MetricPlugin]) -> type[MetricPlugin]:
+    if not cls.name:
+        raise ValueError(f'plugin {cls.__name__} has no name')
+    PLUGINS[cls.name] = cls
+    return cls
+
+
+class PluginSet:
+    '''
+    the active plugins, with their hooks merged into one dispatch table
+    '''
+
+    def __init__(self, plugins: list[MetricPlugin]) -> None:
+        self.plugins = plugins
+        self.schema: dict[str, pl.DataType] = {}
+        for plugin in plugins:
+            for column, dtype in plugin.columns.items():
+                if column in self.schema:
+                    raise ValueError(f'column {column!r} is declared by more than one plugin')
+                self.schema[column] = dtype
+
+        self._dispatch: dict[type[ast.AST], list[tuple[int, Hook]]] = {}
+        for i, plugin in enumerate(plugins):
+            for node_type, hook in plugin.hooks().items():
+                for concrete_type in _concrete_types(node_type):
+                    self._dispatch.setdefault(concrete_type, []).append((i, hook))
+
+    @property
+    def names(self) -> list[str]:
+        return [plugin.name for plugin in self.plugins]
+
+    def new_scopes(self) -> list[Any]:
+        return [plugin.new_scope() for plugin in self.plugins]
+
+    def visit(self, node: ast.AST, scopes: list[Any]) -> None:
+        for i, hook in self._dispatch.get(type(node), ()):
+            scopes[i] = hook(node, scopes[i])
+
+    def finalize(self, scopes: list[Any]) -> dict[str, Any]:
+        values: dict[str, Any] = {}
+        for plugin, acc in zip(self.plugins, scopes):
+            values.update(plugin.finalize(acc))
+        return values
+
+
+def load_plugins(specs: list[str]) -> PluginSet:
+    '''
+    the plugins of the given registered names or "module:Class" paths
+    '''
+    plugins = []
+    for spec in specs:
+        if ':' in spec:
+            module_name, _, attr = spec.partition(':')
+            try:
+                cls = getattr(importlib.import_module(module_name), attr)
+            except (ImportError, AttributeError) as e:
+                raise ValueError(f'cannot load plugin {spec!r}: {e}') from e
+        elif spec in PLUGINS:
+            cls = PLUGINS[spec]
+        else:
+            raise ValueError(f'unknown plugin {spec!r}, expected one of {list(PLUGINS)} or "module:Class"')
+        plugins.append(cls())
+    return PluginSet(plugins)
+
+
+def _concrete_types(node_type: type[ast.AST]) -> list[type[ast.AST]]:
+    subclasses = node_type.__subclasses__()
+    if not subclasses:
+        return [node_type]
+    concrete = [node_type] if node_type._fields else []
+    for subclass in subclasses:
+        concrete += _concrete_types(subclass)
+    return concrete
+
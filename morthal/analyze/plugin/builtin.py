@@ -0,0 +1,78 @@
+'''
+metric plugins shipped with morthal
+'''
+
+import ast
+
+import polars as pl
+
+from .base import Hook, MetricPlugin, register_plugin
+
+
+def _count(node: ast.AST, n: int) -> int:
+    return n + 1
+
+
+@register_plugin
+class CyclomaticComplexity(MetricPlugin):
+    '''
+    McCabe complexity: one plus the decision points of the function
+    (branches, loops, exception handlers, match cases, comprehension
+    loops and filters, and every further operand of and/or)
+    '''
+    name = 'complexity'
+    columns = {'cyclomatic_complexity': pl.Int64}
+
+    def hooks(self) -> dict[type[ast.AST], Hook]:
+        return {
+            ast.If: _count,
+            ast.IfExp: _count,
+            ast.For: _count,
+            ast.AsyncFor: _count,
+            ast.While: _count,
+            ast.ExceptHandler: _count,
+            ast.match_case: _count,
+            ast.comprehension: lambda node, n: n + 1 + len(node.ifs),
+            ast.BoolOp: lambda node, n: n + len(node.values) - 1,
+        }
+
+    def new_scope(self) -> int:
+        return 1
+
+    def finalize(self, acc: int) -> dict[str, int]:
+        return {'cyclomatic_complexity': acc}
+
+
+@register_plugin
+class Calls(MetricPlugin):
+    name = 'calls'
+    columns = {'n_calls': pl.Int64}
+
+    def hooks(self) -> dict[type[ast.AST], Hook]:
+        return {ast.Call: _count}
+
+    def new_scope(self) -> int:
+        return 0
+
+    def finalize(self, acc: int) -> dict[str, int]:
+        return {'n_calls': acc}
+
+
+@register_plugin
+class Comprehensions(MetricPlugin):
+    name = 'comprehensions'
+    columns = {'n_comprehensions': pl.Int64}
+
+    def hooks(self) -> dict[type[ast.AST], Hook]:
+        return {
+            ast.ListComp: _count,
+            ast.SetComp: _count,
+            ast.DictComp: _count,
+            ast.GeneratorExp: _count,
+        }
+
+    def new_scope(self) -> int:
+        return 0
+
+    def finalize(self, acc: int) -> dict[str, int]:
+        return {'n_comprehensions': acc}
@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+
+import polars as pl
+from pydantic import BaseModel
+
+from morthal.analyze.index import FuncsIndex, NameIndex
+
+
+class FuncsRecap(BaseModel):
+    """Scalar summary statistics — no DataFrame, trivially serializable"""
+    total_funcs: int
+    avg_depth: float
+    median_depth: float
+    avg_lines: float
+    avg_node_depth_per_func: float
+    avg_node_depth: float
+    total_args: int
+    annotated_args: int
+    arg_coverage: float
+    return_coverage: float
+    unannotated_funcs: int
+    # percentiles, exact or sketched depending on how the recap was built
+    p90_depth: float = 0.0
+    p99_depth: float = 0.0
+    p90_lines: float = 0.0
+    p99_lines: float = 0.0
+    p90_nodes: float = 0.0
+    p99_nodes: float = 0.0
+
+
+@dataclass
+class CodeRecap:
+    funcs_recap: FuncsRecap
+    funcs_df: pl.DataFrame
+    funcs_index: FuncsIndex | None = None
+    name_index: NameIndex | None = None
@@ -0,0 +1,192 @@
+'''
+extrapolation of the FuncsRecap of a whole codebase from a sample
+
+sums (functions, lines, args...) are estimated by weighting the sums of
+every sampled file by the number of files it stands for (a stratified
+expansion estimator), averages and coverages as ratios of those, and
+percentiles as weighted percentiles of the sampled functions
+
+confidence intervals come from a stratified bootstrap: the files of
+every stratum are resampled with replacement, the estimate is computed
+again on every replicate, and the spread of the replicates is shrunk
+by the finite population correction sqrt(1 - sampled / files), so that
+a sample covering all the files gets intervals of zero width. all the
+replicates are computed together by a handful of polars group-bys
+'''
+
+from dataclasses import dataclass
+
+import polars as pl
+
+from morthal.analyze.collect import CodebaseData
+from .data import FuncsRecap
+from .state import QUANTILE_COLS, _sum_exprs, recap_from_sums, with_recap_columns
+
+
+# recap field -> (metric, quantile) of the percentile fields
+QUANTILE_FIELDS: dict[str, tuple[str, float]] = {
+    'median_depth': ('depth', 0.5),
+    **{
+        f'p{round(q * 100)}_{metric}': (metric, q)
+        for metric in QUANTILE_COLS
+        for q in (0.9, 0.99)
+    },
+}
+
+
+@dataclass
+class RecapEstimate:
+    recap: FuncsRecap
+    # recap field -> (low, high)
+    intervals: dict[str, tuple[float, float]]
+    confidence: float
+    n_files: int
+    n_sampled_files: int
+
+
+def estimate_recap(
+    repo_data: CodebaseData,
+    confidence: float = 0.95,
+    n_boot: int = 200,
+    seed: int = 0,
+) -> RecapEstimate:
+    '''
+    repo_data is expected to come from a sampled collection, whose
+    files_df has the "stratum" and "weight" columns
+    '''
+    files = repo_data.files_df.select('fpath', 'stratum', 'weight')
+    funcs = with_recap_columns(repo_data.funcs_df)
+
+    n_files = len(files)
+    n_population = round(files['weight'].sum()) if n_files else 0
+    fpc = (1 - n_files / n_population) ** 0.5 if n_population else 0.0
+    if fpc == 0.0:
+        # all the files were collected, there is nothing to resample
+        n_boot = 0
+
+    # replicate 0 holds the actual weights, the others the bootstrap ones
+    rep_weights = pl.concat([
+        files.select(pl.lit(0, dtype=pl.Int64).alias('rep'), 'fpath', 'weight'),
+        _bootstrap_weights(files, n_boot, seed),
+    ])
+
+    sums = _replicate_sums(rep_weights, files, funcs)
+    quantiles = _replicate_quantiles(rep_weights, funcs)
+    fields = sums.join(quantiles, on='rep', how='left').fill_null(0.0).sort('rep')
+
+    point = fields.row(0, named=True)
+    recap = FuncsRecap(**{
+        name: round(point[name]) if info.annotation is int else float(point[name])
+        for name, info in FuncsRecap.model_fields.items()
+    })
+
+    alpha = (1 - confidence) / 2
+    bounds = fields.filter(pl.col('rep') > 0).select(
+        pl.col(name).quantile(q, 'linear').alias(f'{name}:{q}')
+        for name in FuncsRecap.model_fields
+        for q in (alpha, 1 - alpha)
+    ).row(0, named=True)
+
+    intervals = {}
+    for name in FuncsRecap.model_fields:
+        value = float(point[name])
+        low, high = bounds[f'{name}:{alpha}'], bounds[f'{name}:{1 - alpha}']
+        if low is None or high is None:
+            intervals[name] = (value, value)
+            continue
+        intervals[name] = (
+            value - max(value - low, 0.0) * fpc,
+            value + max(high - value, 0.0) * fpc,
+        )
+
+    return RecapEstimate(
+        recap=recap,
+        intervals=intervals,
+        confidence=confidence,
+        n_files=n_population,
+        n_sampled_files=n_files,
+    )
+
+
+def _bootstrap_weights(files: pl.DataFrame, n_boot: int, seed: int) -> pl.DataFrame:
+    '''
+    (rep, fpath, weight) of n_boot replicates, each drawing as many files
+    from every stratum as it has, with replacement. draws are made
+    by hashing, so that no python loop runs per draw
+    '''
+    indexed = files.with_columns(
+        pl.int_range(pl.len()).over('stratum').alias('i'),
+        pl.len().over('stratum').alias('n'),
+    )
+    reps = pl.DataFrame({'rep': pl.int_range(1, n_boot + 1, eager=True)})
+    draws = (
+        reps.join(indexed.select('stratum', 'i', 'n', 'weight'), how='cross')
+        .with_columns(
+            (pl.struct('rep', 'stratum', 'i').hash(seed) % pl.col('n').cast(pl.UInt64))
+                .cast(pl.Int64).alias('i')
+        )
+        .group_by('rep', 'stratum', 'i')
+        .agg(pl.col('weight').sum())
+    )
+    return draws.join(
+        indexed.select('stratum', 'i', 'fpath'), on=['stratum', 'i']
+    ).select(pl.col('rep').cast(pl.Int64), 'fpath', 'weight')
+
+
+def _replicate_sums(
+    rep_weights: pl.DataFrame,
+    files: pl.DataFrame,
+    funcs: pl.DataFrame,
+) -> pl.DataFrame:
+    per_file = files.select('fpath').join(
+        funcs.group_by('fpath').agg(_sum_exprs()), on='fpath', how='left'
+    ).fill_null(0)
+    sum_cols = [col for col in per_file.columns if col != 'fpath']
+
+    return (
+        rep_weights.join(per_file, on='fpath')
+        .group_by('rep')
+        .agg((pl.col(col) * pl.col('weight')).sum().alias(col) for col in sum_cols)
+        .select('rep', *recap_from_sums({col: pl.col(col) for col in sum_cols}))
+    )
+
+
+def _replicate_quantiles(rep_weights: pl.DataFrame, funcs: pl.DataFrame) -> pl.DataFrame:
+    '''
+    weighted percentiles of every replicate: the lowest value whose
+    cumulative weight reaches the quantile
+    '''
+    result = rep_weights.select(pl.col('rep').unique())
+    for metric, col in QUANTILE_COLS.items():
+        weighted = (
+            rep_weights.join(funcs.drop_nulls(col).group_by('fpath', col).len(), on='fpath')
+            .group_by('rep', col)
+            .agg((pl.col('len') * pl.col('weight')).sum().alias('w'))
+            .sort('rep', col)
+            .with_columns(
+                (pl.col('w').cum_sum().over('rep') / pl.col('w').sum().over('rep')).alias('cum')
+            )
+        )
+        for name, (field_metric, q) in QUANTILE_FIELDS.items():
+            if field_metric != metric:
+                continue
+            result = result.join(
+                weighted.filter(pl.col('cum') >= q - 1e-12)
+                    .group_by('rep')
+                    .agg(pl.col(col).min().cast(pl.Float64).alias(name)),
+                on='rep',
+                how='left',
+            )
+    return result
+
+
+def format_estimate(estimate: RecapEstimate) -> str:
+    lines = [
+        f'Estimated from {estimate.n_sampled_files} of {estimate.n_files} files, '
+        f'{estimate.confidence:.0%} confidence intervals',
+    ]
+    for name in FuncsRecap.model_fields:
+        value = getattr(estimate.recap, name)
+        low, high = estimate.intervals[name]
+        lines.append(f'  {name:<24} {value:>12,.2f}   [{low:,.2f}, {high:,.2f}]')
+    return '\n'.join(lines)
@@ -0,0 +1,286 @@
+'''
+intermediate, mergeable state from which a FuncsRecap can be finalised
+
+a FuncsRecap only holds finished averages and percentages, which can't
+be combined: the average of two averages is not the average of the
+union. a RecapState instead keeps the raw counts and sums behind every
+recap field, so states computed per file, per directory or per shard
+can be merged in any order and finalised once at the end
+
+medians and percentiles come out of one quantile sketch per metric
+(see morthal.utils.sketch). by default those are exact value counts,
+which can be subtracted just like the sums, so removing the
+contribution of a single file is an O(1) operation. passing
+exact=False switches to KLL sketches, whose size doesn't depend on
+the number of functions, at the price of a bounded rank error and of
+losing subtraction
+'''
+
+from dataclasses import dataclass, field, fields
+
+import polars as pl
+
+from morthal.analyze.collect import FUNC_SCHEMA
+from morthal.utils.sketch import ExactQuantiles, KLLSketch, QuantileSketch
+from .data import FuncsRecap
+
+
+DEPTH_COL = 'max_stmt_depth'
+
+# metric name (as used in the FuncsRecap percentile fields) -> column
+QUANTILE_COLS: dict[str, str] = {
+    'depth': DEPTH_COL,
+    'lines': 'n_codelines',
+    'nodes': 'n_nodes',
+}
+
+
+# columns the recap is computed from. when only some metrics were
+# collected the missing ones are taken as nulls, so that the recap
+# fields depending on them come out as 0
+RECAP_COLUMNS: dict[str, pl.DataType] = {
+    col: FUNC_SCHEMA[col]
+    for col in (
+        DEPTH_COL,
+        'n_codelines',
+        'n_nodes',
+        'avg_node_depth',
+        'n_func_args',
+        'n_func_args_annotated',
+        'return_annotated',
+    )
+}
+
+
+def with_recap_columns(frame: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame | pl.LazyFrame:
+    present = frame.collect_schema().names()
+    return frame.with_columns(
+        pl.lit(None, dtype=dtype).alias(col)
+        for col, dtype in RECAP_COLUMNS.items()
+        if col not in present
+    )
+
+
+def new_sketches(exact: bool = True) -> dict[str, QuantileSketch]:
+    return {
+        metric: ExactQuantiles() if exact else KLLSketch()
+        for metric in QUANTILE_COLS
+    }
+
+
+@dataclass
+class RecapState:
+    n_funcs: int = 0
+    sum_depth: int = 0
+    sum_lines: int = 0
+    total_nodes: int = 0
+    # sum of avg_node_depth * n_nodes, i.e. the sum of the relative
+    # depths of every node, needed for the node weighted average
+    sum_node_depth: float = 0.0
+    total_args: int = 0
+    annotated_args: int = 0
+    n_return_annotated: int = 0
+    # functions whose return_annotated is known, none when the
+    # returns metric wasn't collected
+    n_return_known: int = 0
+    sketches: dict[str, QuantileSketch] = field(default_factory=new_sketches)
+
+    @classmethod
+    def from_df(cls, df: pl.DataFrame, exact: bool = True) -> 'RecapState':
+        '''
+        builds the state of a whole funcs dataframe
+        '''
+        df = with_recap_columns(df)
+        sums = df.select(_sum_exprs()).row(0, named=True)
+        state = cls(sketches=new_sketches(exact), **_sums_to_kwargs(sums))
+
+        for metric, col in QUANTILE_COLS.items():
+            sketch = state.sketches[metric]
+            for value, count in df[col].drop_nulls().value_counts().iter_rows():
+                sketch.add(value, count)
+
+        return state
+
+    @classmethod
+    def partition(
+        cls,
+        df: pl.DataFrame,
+        by: str = 'fpath',
+        exact: bool = True,
+    ) -> dict[str, 'RecapState']:
+        '''
+        builds one state per distinct value of the column "by", so
+        that for example states per file can be kept around and
+        merged/subtracted later on
+        '''
+        df = with_recap_columns(df)
+        states: dict[str, RecapState] = {}
+        for sums in df.group_by(by).agg(_sum_exprs()).iter_rows(named=True):
+            key = sums.pop(by)
+            states[key] = cls(sketches=new_sketches(exact), **_sums_to_kwargs(sums))
+
+        for metric, col in QUANTILE_COLS.items():
+            for key, value, count in df.drop_nulls(col).group_by(by, col).len().iter_rows():
+                states[key].sketches[metric].add(value, count)
+
+        return states
+
+    def merge(self, other: 'RecapState') -> 'RecapState':
+        '''
+        returns a new state accounting for the functions of both
+        states, the operation is associative and commutative
+        '''
+        return RecapState(
+            n_funcs=self.n_funcs + other.n_funcs,
+            sum_depth=self.sum_depth + other.sum_depth,
+            sum_lines=self.sum_lines + other.sum_lines,
+            total_nodes=self.total_nodes + other.total_nodes,
+            sum_node_depth=self.sum_node_depth + other.sum_node_depth,
+            total_args=self.total_args + other.total_args,
+            annotated_args=self.annotated_args + other.annotated_args,
+            n_return_annotated=self.n_return_annotated + other.n_return_annotated,
+            n_return_known=self.n_return_known + other.n_return_known,
+            sketches={
+                metric: sketch.merge(other.sketches[metric])
+                for metric, sketch in self.sketches.items()
+            },
+        )
+
+    def subtract(self, other: 'RecapState') -> 'RecapState':
+        '''
+        returns a new state with the contribution of "other" removed,
+        "other" is expected to have been merged in before. only states
+        built with exact sketches support this
+        '''
+        sketches = {}
+        for metric, sketch in self.sketches.items():
+            if not isinstance(sketch, ExactQuantiles):
+                raise TypeError(
+                    f'cannot subtract from a {type(sketch).__name__}, '
+                    'build the state with exact=True'
+                )
+            sketches[metric] = sketch.subtract(other.sketches[metric])
+
+        return RecapState(
+            n_funcs=self.n_funcs - other.n_funcs,
+            sum_depth=self.sum_depth - other.sum_depth,
+            sum_lines=self.sum_lines - other.sum_lines,
+            total_nodes=self.total_nodes - other.total_nodes,
+            sum_node_depth=self.sum_node_depth - other.sum_node_depth,
+            total_args=self.total_args - other.total_args,
+            annotated_args=self.annotated_args - other.annotated_args,
+            n_return_annotated=self.n_return_annotated - other.n_return_annotated,
+            n_return_known=self.n_return_known - other.n_return_known,
+            sketches=sketches,
+        )
+
+    def __add__(self, other: 'RecapState') -> 'RecapState':
+        return self.merge(other)
+
+    def __sub__(self, other: 'RecapState') -> 'RecapState':
+        return self.subtract(other)
+
+    @property
+    def min_depth(self) -> int:
+        return int(self.sketches['depth'].min) if self.n_funcs > 0 else 0
+
+    @property
+    def max_depth(self) -> int:
+        return int(self.sketches['depth'].max) if self.n_funcs > 0 else 0
+
+    def quantile(self, metric: str, q: float) -> float:
+        return float(self.sketches[metric].quantile(q))
+
+    def median_depth(self) -> float:
+        return self.quantile('depth', 0.5)
+
+    def finalize(self) -> FuncsRecap:
+        sums = {
+            f.name: pl.lit(getattr(self, f.name))
+            for f in fields(self)
+            if f.name != 'sketches'
+        }
+        return FuncsRecap(
+            **pl.select(recap_from_sums(sums)).row(0, named=True),
+            median_depth=self.median_depth(),
+            **{
+                f'p{round(q * 100)}_{metric}': self.quantile(metric, q)
+                for metric in QUANTILE_COLS
+                for q in (0.9, 0.99)
+            },
+        )
+
+
+def _wide_sum(col: str) -> pl.Expr:
+    # the counts are narrow unsigned integers, whose sums would wrap
+    return pl.col(col).cast(pl.Int64).sum()
+
+
+def _sum_exprs() -> list[pl.Expr]:
+    return [
+        pl.len().alias('n_funcs'),
+        _wide_sum(DEPTH_COL).alias('sum_depth'),
+        _wide_sum('n_codelines').alias('sum_lines'),
+        _wide_sum('n_nodes').alias('total_nodes'),
+        (pl.col('avg_node_depth') * pl.col('n_nodes')).sum().alias('sum_node_depth'),
+        _wide_sum('n_func_args').alias('total_args'),
+        _wide_sum('n_func_args_annotated').alias('annotated_args'),
+        pl.col('return_annotated').sum().alias('n_return_annotated'),
+        pl.col('return_annotated').count().alias('n_return_known'),
+    ]
+
+
+def _sums_to_kwargs(sums: dict) -> dict:
+    # sums over empty frames come out as None/0 depending on the
+    # dtype, so everything gets coerced here
+    return {
+        name: (float(value or 0.0) if name == 'sum_node_depth' else int(value or 0))
+        for name, value in sums.items()
+    }
+
+
+def _ratio(num: pl.Expr, den: pl.Expr) -> pl.Expr:
+    return pl.when(den > 0).then(num / den).otherwise(0.0).cast(pl.Float64)
+
+
+def recap_from_sums(sums: dict[str, pl.Expr]) -> list[pl.Expr]:
+    '''
+    the FuncsRecap fields other than the quantiles, out of expressions
+    for every sum of a RecapState (see _sum_exprs). this is where the
+    fields are defined, whether the sums are those of a state, of the
+    groups of an aggregation or the weighted ones of an estimate
+    '''
+    n = sums['n_funcs']
+    return [
+        n.alias('total_funcs'),
+        _ratio(sums['sum_depth'], n).alias('avg_depth'),
+        _ratio(sums['sum_lines'], n).alias('avg_lines'),
+        _ratio(sums['sum_depth'], n).alias('avg_node_depth_per_func'),
+        _ratio(sums['sum_node_depth'], sums['total_nodes']).alias('avg_node_depth'),
+        sums['total_args'].alias('total_args'),
+        sums['annotated_args'].alias('annotated_args'),
+        (_ratio(sums['annotated_args'], sums['total_args']) * 100).alias('arg_coverage'),
+        (_ratio(sums['n_return_annotated'], sums['n_return_known']) * 100).alias('return_coverage'),
+        (sums['n_return_known'] - sums['n_return_annotated']).alias('unannotated_funcs'),
+    ]
+
+
+def recap_agg_exprs() -> list[pl.Expr]:
+    '''
+    aggregations yielding every FuncsRecap field straight away, meant
+    for group_by(...).agg(...) where one recap per group is wanted in
+    a single pass. quantiles are exact here, as polars has all the
+    values of the group at hand anyway
+    '''
+    sums = {expr.meta.output_name(): expr for expr in _sum_exprs()}
+    return [
+        expr.cast(pl.Int64) if FuncsRecap.model_fields[expr.meta.output_name()].annotation is int
+        else expr
+        for expr in recap_from_sums(sums)
+    ] + [
+        pl.col(DEPTH_COL).median().cast(pl.Float64).alias('median_depth'),
+    ] + [
+        pl.col(col).quantile(q, 'linear').cast(pl.Float64).alias(f'p{round(q * 100)}_{metric}')
+        for metric, col in QUANTILE_COLS.items()
+        for q in (0.9, 0.99)
+    ]
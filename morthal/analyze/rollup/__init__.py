@@ -0,0 +1,120 @@
+'''
+per directory and per package rollups of the FuncsRecap metrics
+
+instead of filtering funcs_df once per directory (which would be
+quadratic-ish on a monorepo), every function row is paired with all
+the directories above its file, and one group-by over those path
+prefixes yields the recap of every level of the tree at once
+'''
+
+from dataclasses import dataclass
+from pathlib import PurePath
+
+import polars as pl
+
+from morthal.analyze.collect import CodebaseData
+from morthal.analyze.recap import FuncsRecap, recap_agg_exprs, with_recap_columns
+
+
+ROOT_PREFIX = '.'
+
+
+@dataclass
+class Rollups:
+    '''
+    one row per directory: "prefix" (posix style, "." being the root),
+    "level" (0 for the root), "kind" ("package" when the directory has
+    an __init__.py, "dir" otherwise), "n_files" and then every
+    FuncsRecap field
+    '''
+    df: pl.DataFrame
+
+    def get(self, prefix: str) -> FuncsRecap | None:
+        rows = self.df.filter(pl.col('prefix') == _normalize_prefix(prefix))
+        if rows.height == 0:
+            return None
+        return _row_to_recap(rows.row(0, named=True))
+
+    def under(self, prefix: str) -> pl.DataFrame:
+        '''
+        rollups of the given directory and of everything below it
+        '''
+        prefix = _normalize_prefix(prefix)
+        if prefix == ROOT_PREFIX:
+            return self.df
+        return self.df.filter(
+            (pl.col('prefix') == prefix) |
+            pl.col('prefix').str.starts_with(prefix + '/')
+        )
+
+    def children(self, prefix: str) -> pl.DataFrame:
+        '''
+        rollups of the directories right below the given one
+        '''
+        prefix = _normalize_prefix(prefix)
+        level = 0 if prefix == ROOT_PREFIX else prefix.count('/') + 1
+        return self.under(prefix).filter(pl.col('level') == level + 1)
+
+
+def build_rollups(repo_data: CodebaseData) -> Rollups:
+    rollups_df = (
+        with_prefixes(with_recap_columns(repo_data.funcs_df.lazy()))
+        .group_by('prefix', 'level')
+        .agg([pl.col('fpath').n_unique().cast(pl.Int64).alias('n_files')] + recap_agg_exprs())
+        .with_columns(pl.col(FuncsRecap.model_fields).fill_null(0))
+        .with_columns(
+            pl.when(pl.col('prefix').is_in(_package_dirs(repo_data)))
+                .then(pl.lit('package'))
+                .otherwise(pl.lit('dir'))
+                .alias('kind')
+        )
+        .select('prefix', 'level', 'kind', 'n_files', *FuncsRecap.model_fields)
+        .sort('prefix')
+        .collect()
+    )
+
+    return Rollups(df=rollups_df)
+
+
+def with_prefixes(funcs_lf: pl.LazyFrame) -> pl.LazyFrame:
+    '''
+    pairs every function row with every directory above its file, adding
+    the "prefix" and "level" columns of the directory
+    '''
+    # the prefixes are worked out once per file, not per function
+    fpaths = funcs_lf.select(pl.col('fpath').unique()).collect()['fpath'].to_list()
+    prefix_rows = [
+        (fpath, prefix, level)
+        for fpath in fpaths
+        for level, prefix in enumerate(_dir_prefixes(fpath))
+    ]
+    prefixes_df = pl.DataFrame(
+        prefix_rows,
+        # the same dtype, be it plain or dictionary encoded, for the join
+        schema={'fpath': funcs_lf.collect_schema()['fpath'], 'prefix': pl.Utf8, 'level': pl.Int64},
+        orient='row',
+    )
+    return funcs_lf.join(prefixes_df.lazy(), on='fpath')
+
+
+def _dir_prefixes(fpath: str) -> list[str]:
+    parts = PurePath(fpath).parent.parts
+    return [ROOT_PREFIX] + ['/'.join(parts[:i + 1]) for i in range(len(parts))]
+
+
+def _package_dirs(repo_data: CodebaseData) -> list[str]:
+    fpaths = repo_data.files_df['fpath'] if 'fpath' in repo_data.files_df.columns else repo_data.funcs_df['fpath']
+    return [
+        _dir_prefixes(fpath)[-1]
+        for fpath in fpaths.unique().to_list()
+        if PurePath(fpath).name == '__init__.py'
+    ]
+
+
+def _normalize_prefix(prefix: str) -> str:
+    prefix = PurePath(prefix).as_posix().strip('/')
+    return prefix if prefix else ROOT_PREFIX
+
+
+def _row_to_recap(row: dict) -> FuncsRecap:
+    return FuncsRecap(**{name: row[name] for name in FuncsRecap.model_fields})
@@ -0,0 +1,115 @@
+'''
+stratified random sampling of the files of a codebase
+
+files are split in strata by top level directory and by size class
+(small/medium/large, by terciles of the file sizes), and visited in an
+order such that at any point the files collected so far are a random
+sample of every stratum, sized proportionally to the bytes of the
+stratum (larger files hold more functions, so that's where most of the
+variance is). every stratum gets one file first, so that the sampling
+can be stopped at any time, be it after a fraction of the files or
+when a time budget runs out, and still cover every stratum it could
+
+the collected files get a weight (files of the stratum / files sampled
+from it) from which the recap of the whole codebase can be
+extrapolated, see morthal.analyze.recap.estimate
+'''
+
+import random
+from dataclasses import dataclass
+from pathlib import Path
+
+import polars as pl
+
+
+SIZE_CLASSES = ['small', 'medium', 'large']
+
+
+@dataclass
+class SampleSpec:
+    # fraction of the files to collect at most
+    fraction: float = 1.0
+    # seconds after which the collection stops, whatever the fraction
+    time_budget: float | None = None
+    seed: int | None = None
+
+    def __post_init__(self):
+        if not 0 < self.fraction <= 1:
+            raise ValueError(f'sample fraction must be in (0, 1], got {self.fraction}')
+
+
+def plan_sample(
+    codebase_path: Path,
+    pypaths: list[Path],
+    seed: int | None = None,
+) -> pl.DataFrame:
+    '''
+    one row per file ("fpath", "stratum", "size"), in the order the
+    files are to be collected
+    '''
+    rng = random.Random(seed)
+    files = pl.DataFrame(
+        {
+            'fpath': [str(pypath.relative_to(codebase_path)) for pypath in pypaths],
+            'size': [pypath.stat().st_size for pypath in pypaths],
+        },
+        schema={'fpath': pl.Utf8, 'size': pl.Int64},
+    )
+    if files.height == 0:
+        return files.with_columns(pl.lit('').alias('stratum'))
+
+    q1, q2 = (files['size'].quantile(q, 'nearest') for q in (1 / 3, 2 / 3))
+    files = files.with_columns(
+        (
+            pl.col('fpath').str.extract(r'^([^/\\]+)[/\\]', 1).fill_null('.')
+            + ':'
+            + pl.when(pl.col('size') <= q1).then(pl.lit(SIZE_CLASSES[0]))
+                .when(pl.col('size') <= q2).then(pl.lit(SIZE_CLASSES[1]))
+                .otherwise(pl.lit(SIZE_CLASSES[2]))
+        ).alias('stratum'),
+        pl.Series('u', [rng.random() for _ in range(files.height)]),
+    )
+
+    # the share of the sample every stratum gets is its share of the
+    # bytes. the k-th file of a stratum (in random order) is due once
+    # k / share files have been collected, the first one right away
+    return (
+        files
+        .with_columns(
+            (pl.col('size').sum().over('stratum') / pl.col('size').sum()).alias('share'),
+            pl.col('u').rank('ordinal').over('stratum').sub(1).alias('k'),
+        )
+        .with_columns(
+            pl.when(pl.col('k') == 0)
+                .then(pl.col('u') - 1.0)
+                .otherwise((pl.col('k') + pl.col('u')) / pl.col('share').clip(lower_bound=1e-9))
+                .alias('due')
+        )
+        .sort('due')
+        .select('fpath', 'stratum', 'size')
+    )
+
+
+def sample_weights(plan: pl.DataFrame, collected: list[str]) -> pl.DataFrame:
+    '''
+    "fpath", "stratum" and "weight" of the collected files, the weight
+    being how many files of the codebase each of them stands for.
+    files of strata which got no sample at all (when stopped really
+    early) are spread over all the collected ones
+    '''
+    strata = plan.group_by('stratum').agg(pl.len().alias('n_population'))
+    sampled = (
+        plan.filter(pl.col('fpath').is_in(collected))
+        .join(strata, on='stratum')
+        .with_columns(pl.len().over('stratum').alias('n_sampled'))
+    )
+    covered = sampled.unique('stratum')['n_population'].sum()
+
+    return sampled.select(
+        'fpath',
+        'stratum',
+        (
+            pl.col('n_population') / pl.col('n_sampled')
+            * (plan.height / covered if covered else 1.0)
+        ).alias('weight'),
+    )
@@ -0,0 +1,293 @@
+'''
+diff between two analyses of a codebase
+
+functions of the two sides are matched with a keyed (hash) join, so
+diffing costs O(n) over the stored rows instead of analyzing anything
+again. the key is the file path plus the qualified name of the
+function, plus an occurrence number telling apart functions sharing
+both (like property setters or conditional definitions). matched
+functions whose sources hash the same are unchanged, the others are
+changed when their metrics differ (or, when their sources were hashed,
+when those do)
+
+snapshots stored before qualified names were collected are matched by
+the name of the function and of its parent instead
+'''
+
+import json
+from dataclasses import dataclass
+from pathlib import Path
+
+import polars as pl
+
+from morthal.analyze.recap import FuncsRecap, RecapState
+from morthal.options import DIFF_FORMATS, WORKTREE
+from morthal.utils.df import decode_strings
+
+
+DIFF_KEY: list[str] = ['fpath', 'qualname', 'occurrence']
+# key of the snapshots without qualified names
+LEGACY_DIFF_KEY: list[str] = ['fpath', 'parent_name', 'name', 'occurrence']
+# metrics compared for matched functions
+DIFF_METRICS: list[str] = [
+    'max_stmt_depth',
+    'n_codelines',
+    'n_exprs',
+    'n_nodes',
+    'n_func_args',
+    'n_func_args_annotated',
+    'return_annotated',
+]
+
+# recap fields shown in the summary -> (label, unit)
+SUMMARY_FIELDS: dict[str, tuple[str, str]] = {
+    'total_funcs': ('Functions', ''),
+    'avg_depth': ('Average depth', ''),
+    'p90_depth': ('p90 depth', ''),
+    'avg_lines': ('Average lines', ''),
+    'arg_coverage': ('Argument annotations', '%'),
+    'return_coverage': ('Return annotations', '%'),
+}
+
+
+@dataclass
+class SnapshotDiff:
+    # rows of the functions only found on one side
+    added: pl.DataFrame
+    removed: pl.DataFrame
+    # key columns plus "<metric>_base" and "<metric>_head" for every
+    # DIFF_METRICS column, for the matched functions differing in any
+    changed: pl.DataFrame
+    base_recap: FuncsRecap
+    head_recap: FuncsRecap
+
+    def recap_deltas(self) -> dict[str, tuple[float, float, float]]:
+        '''
+        recap field -> (base, head, head - base)
+        '''
+        base = self.base_recap.model_dump()
+        head = self.head_recap.model_dump()
+        return {
+            name: (base[name], head[name], head[name] - base[name])
+            for name in base
+        }
+
+    def crossed_above(self, metric: str, threshold: float) -> int:
+        '''
+        functions at or above the threshold in head which weren't in
+        base, either because they are new or because they grew
+        '''
+        n_added = self.added.filter(pl.col(metric) >= threshold).height
+        n_grown = self.changed.filter(
+            (pl.col(f'{metric}_head') >= threshold) &
+            (pl.col(f'{metric}_base') < threshold)
+        ).height
+        return n_added + n_grown
+
+    def crossed_below(self, metric: str, threshold: float) -> int:
+        '''
+        functions at or above the threshold in base which aren't in head
+        '''
+        n_removed = self.removed.filter(pl.col(metric) >= threshold).height
+        n_shrunk = self.changed.filter(
+            (pl.col(f'{metric}_base') >= threshold) &
+            (pl.col(f'{metric}_head') < threshold)
+        ).height
+        return n_removed + n_shrunk
+
+
+def load_snapshot(spec: str, repo_path: Path) -> pl.DataFrame:
+    '''
+    the functions of one side of a diff, which is either:
+    - "worktree", the files currently in repo_path
+    - the path of a store (a directory holding funcs.parquet)
+    - a git revision of repo_path (hash, branch, tag, HEAD~2...)
+    '''
+    if spec == WORKTREE:
+        from morthal.analyze.collect import collect_codebase_data
+
+        return collect_codebase_data(repo_path).funcs_df
+
+    if (Path(spec) / 'funcs.parquet').exists():
+        from morthal.utils.store import Store
+
+        return Store(Path(spec)).load_funcs()
+
+    from git import Repo
+
+    from morthal.history import collect_at_rev
+
+    return collect_at_rev(Repo(repo_path), spec).funcs_df
+
+
+def diff_funcs(base_df: pl.DataFrame, head_df: pl.DataFrame) -> SnapshotDiff:
+    key = DIFF_KEY
+    if 'qualname' not in base_df.columns or 'qualname' not in head_df.columns:
+        key = LEGACY_DIFF_KEY
+    base = _with_key(base_df, key)
+    head = _with_key(head_df, key)
+    metrics = [col for col in DIFF_METRICS if col in base.columns and col in head.columns]
+    hashed = 'struct_hash' in base.columns and 'struct_hash' in head.columns
+    extra = ['struct_hash'] if hashed else []
+
+    joined = base.select(key + metrics + extra).join(
+        head.select(key + metrics + extra),
+        on=key,
+        how='inner',
+        suffix='_head',
+        nulls_equal=True,
+    ).rename({col: f'{col}_base' for col in metrics + extra})
+
+    metrics_differ = pl.any_horizontal(
+        pl.col(f'{col}_base') != pl.col(f'{col}_head') for col in metrics
+    ) if metrics else pl.lit(False)
+    if hashed:
+        both_hashed = pl.col('struct_hash_base').is_not_null() & pl.col('struct_hash_head').is_not_null()
+        differ = pl.when(both_hashed) \
+            .then(pl.col('struct_hash_base') != pl.col('struct_hash_head')) \
+            .otherwise(metrics_differ)
+    else:
+        differ = metrics_differ
+
+    changed = joined.filter(differ).select(
+        key + [f'{col}_{side}' for col in metrics for side in ('base', 'head')]
+    )
+
+    return SnapshotDiff(
+        added=head.join(base.select(key), on=key, how='anti', nulls_equal=True),
+        removed=base.join(head.select(key), on=key, how='anti', nulls_equal=True),
+        changed=changed,
+        base_recap=RecapState.from_df(base_df).finalize(),
+        head_recap=RecapState.from_df(head_df).finalize(),
+    )
+
+
+def _with_key(df: pl.DataFrame, key: list[str]) -> pl.DataFrame:
+    # the two sides encode paths and names with their own dictionaries,
+    # so they are matched as plain strings
+    df = decode_strings(df)
+    names = [col for col in key if col != 'occurrence']
+    # a snapshot without functions may lack the path column too
+    df = df.with_columns(
+        pl.lit(None, dtype=pl.Utf8).alias(col)
+        for col in names
+        if col not in df.columns
+    )
+    return df.with_columns(
+        pl.int_range(pl.len()).over(names).alias('occurrence')
+    )
+
+
+def format_diff(
+    diff: SnapshotDiff,
+    fmt: str = 'markdown',
+    depth_high: int = 5,
+    max_listed: int = 10,
+) -> str:
+    if fmt == 'markdown':
+        return _format_markdown(diff, depth_high, max_listed)
+    if fmt == 'json':
+        return json.dumps({
+            'recap': {
+                name: {'base': base, 'head': head, 'delta': delta}
+                for name, (base, head, delta) in diff.recap_deltas().items()
+            },
+            'added': diff.added.drop('occurrence').to_dicts(),
+            'removed': diff.removed.drop('occurrence').to_dicts(),
+            'changed': diff.changed.drop('occurrence').to_dicts(),
+        }, default=str)
+    raise ValueError(f'unknown diff format {fmt!r}, expected one of {DIFF_FORMATS}')
+
+
+def _format_markdown(diff: SnapshotDiff, depth_high: int, max_listed: int) -> str:
+    deltas = diff.recap_deltas()
+    lines = [
+        '| | base | head | Δ |',
+        '|---|---:|---:|---:|',
+    ]
+    for name, (label, unit) in SUMMARY_FIELDS.items():
+        base, head, delta = deltas[name]
+        if unit == '%':
+            lines.append(f'| {label} | {base:.1f}% | {head:.1f}% | {delta:+.1f} pts |')
+        elif isinstance(base, int):
+            lines.append(f'| {label} | {base} | {head} | {delta:+d} |')
+        else:
+            lines.append(f'| {label} | {base:.2f} | {head:.2f} | {delta:+.2f} |')
+
+    lines.append('')
+    lines.append(
+        f'{diff.added.height} functions added, {diff.removed.height} removed, '
+        f'{diff.changed.height} changed'
+    )
+    # stores collected with some metrics only lack the others, the
+    # changed functions having the metrics of both sides
+    shown = [
+        (col, label) for col, label in (('max_stmt_depth', 'depth'), ('n_codelines', 'lines'))
+        if f'{col}_base' in diff.changed.columns
+    ]
+    shown_cols = [col for col, _ in shown]
+
+    if 'max_stmt_depth' in shown_cols:
+        n_deeper = diff.crossed_above('max_stmt_depth', depth_high)
+        n_shallower = diff.crossed_below('max_stmt_depth', depth_high)
+        if n_deeper or n_shallower:
+            lines.append(
+                f'- functions with depth ≥ {depth_high}: '
+                f'{n_deeper} more, {n_shallower} fewer'
+            )
+
+    added = diff.added
+    if shown_cols:
+        added = added.sort(shown_cols[0], descending=True, maintain_order=True)
+    if added.height:
+        order = f' ({_SORT_LABELS[shown_cols[0]]} first)' if shown else ''
+        lines += ['', f'**Added**{order}', '']
+        lines += [
+            f'- `{row["fpath"]}` `{_qualname(row)}`'
+            + _details([_ADDED_DETAILS[col].format(row[col]) for col in shown_cols])
+            for row in added.head(max_listed).iter_rows(named=True)
+        ]
+
+    grown = diff.changed.with_columns(
+        # unsigned counts, widened so that shrinking yields negative deltas
+        (pl.col(f'{col}_head').cast(pl.Int64) - pl.col(f'{col}_base')).alias(f'{col}_delta')
+        for col in shown_cols
+    )
+    if shown_cols:
+        grown = grown.sort([f'{col}_delta' for col in shown_cols], descending=True, maintain_order=True)
+    if grown.height:
+        order = ' (most grown first)' if shown else ''
+        lines += ['', f'**Changed**{order}', '']
+        lines += [
+            f'- `{row["fpath"]}` `{_qualname(row)}`'
+            + _details([
+                f'{label} {row[f"{col}_base"]} → {row[f"{col}_head"]}' for col, label in shown
+            ])
+            for row in grown.head(max_listed).iter_rows(named=True)
+        ]
+
+    if diff.removed.height:
+        lines += ['', '**Removed**', '']
+        lines += [
+            f'- `{row["fpath"]}` `{_qualname(row)}`'
+            for row in diff.removed.head(max_listed).iter_rows(named=True)
+        ]
+
+    return '\n'.join(lines)
+
+
+# metric -> how added functions are described and sorted by it
+_ADDED_DETAILS = {'max_stmt_depth': 'depth {}', 'n_codelines': '{} lines'}
+_SORT_LABELS = {'max_stmt_depth': 'deepest', 'n_codelines': 'longest'}
+
+
+def _details(parts: list[str]) -> str:
+    return f': {", ".join(parts)}' if parts else ''
+
+
+def _qualname(row: dict) -> str:
+    if row.get('qualname'):
+        return row['qualname']
+    if row['parent_name']:
+        return f'{row["parent_name"]}.{row["name"]}'
+    return row['name']
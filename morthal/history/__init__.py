@@ -4,7 +4,7 @@ from pathlib import Path
 
 from git import Repo
 
-from morthal.analyze.collect import collect_codebase_data
+from morthal.analyze.collect import CodebaseData, FuncCache, collect_codebase_data
 from morthal.analyze.recap import Commit, RepoHistory, build_repo_recap
 
 
@@ -12,6 +12,9 @@ def walk_commit_history(repo_path: Path) -> RepoHistory:
     repo = Repo(repo_path)
     history = RepoHistory(history=[])
     py_commits = list(iter_pyfile_commits(repo))
+    # most functions are the same from a commit to the next one, so
+    # their stats are collected once for the whole walk
+    cache = FuncCache()
 
     for i, git_commit in enumerate(reversed(py_commits)):
         commit = Commit(
@@ -21,11 +24,9 @@ def walk_commit_history(repo_path: Path) -> RepoHistory:
             message=git_commit.message.strip(),
         )
 
-        with tempfile.TemporaryDirectory(prefix="morthal_extract_") as xtmp:
-            extract_py_files(repo, git_commit.hexsha, Path(xtmp))
-            cd = collect_codebase_data(Path(xtmp))
-            cr = build_repo_recap(cd)
-            history.history.append((commit, cr))
+        cd = collect_at_rev(repo, git_commit.hexsha, cache)
+        cr = build_repo_recap(cd)
+        history.history.append((commit, cr))
 
         if (i + 1) % 50 == 0:
             print(f"  Processed {i + 1}/{len(py_commits)} commits")
@@ -34,6 +35,16 @@ def walk_commit_history(repo_path: Path) -> RepoHistory:
     return history
 
 
+def collect_at_rev(repo: Repo, rev: str, cache: FuncCache | None = None) -> CodebaseData:
+    '''
+    collects the python files of the repo as they are at the given
+    revision (anything git understands: hash, branch, tag, HEAD~2...)
+    '''
+    with tempfile.TemporaryDirectory(prefix="morthal_extract_") as xtmp:
+        extract_py_files(repo, rev, Path(xtmp))
+        return collect_codebase_data(Path(xtmp), cache=cache)
+
+
 def clone_repo(url: str, dest: Path) -> Repo:
     dest.mkdir(parents=True, exist_ok=True)
     return Repo.clone_from(url, dest)
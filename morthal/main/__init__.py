@@ -1,7 +1,15 @@
-from morthal.analyze.collect import collect_codebase_data
-from morthal.analyze.recap import build_repo_recap
-from morthal.history import walk_commit_history
-from morthal.reporter import HTMLReporter
+'''
+entry points of the cli commands
+
+the analysis, the reporter and the history walk pull in polars, pydantic
+and git, so they are imported by the code paths using them. this way a
+run which finds everything in the store, or just prints the help, does
+not pay for importing any of them
+'''
+
+from pathlib import Path
+
+from morthal.query import Query, format_result
 from morthal.utils.codebase import Codebase
 from morthal.utils.store import Store
 
@@ -11,22 +19,130 @@ def handle(
     store: Store,
     report: bool,
     history: bool,
+    sharded: bool = False,
+    workers: int | None = None,
+    rules_path: Path | None = None,
+    sample: float | None = None,
+    time_budget: float | None = None,
+    metrics: list[str] | None = None,
+    plugins: list[str] | None = None,
+    docstrings: bool = False,
 ) -> None:
 
-    if store.has_cached_recap:
-        recap = store.load_recap()
-    else:
-        repo_data = collect_codebase_data(target.path)
+    if report and metrics is not None:
+        raise SystemExit("The report needs every metric, drop --metrics to generate it")
+
+    plugin_set = None
+    if plugins:
+        from morthal.analyze.plugin import load_plugins
+
+        try:
+            plugin_set = load_plugins(plugins)
+        except ValueError as e:
+            raise SystemExit(str(e))
+
+    if sample is not None or time_budget is not None:
+        # estimates are printed rather than stored, so that they are
+        # never mistaken for the results of a full analysis
+        from morthal.analyze.collect import collect_codebase_data
+        from morthal.analyze.recap.estimate import estimate_recap, format_estimate
+        from morthal.analyze.sample import SampleSpec
+
+        spec = SampleSpec(fraction=sample if sample is not None else 1.0, time_budget=time_budget)
+        repo_data = collect_codebase_data(
+            target.path, sample=spec, metrics=metrics, plugins=plugin_set
+        )
+        print(format_estimate(estimate_recap(repo_data)))
+        return
+
+    recap = None
+    if not store.has_cached_recap:
+        from morthal.analyze.collect import collect_codebase_data
+        from morthal.analyze.recap import build_repo_recap
+        from morthal.analyze.rollup import build_rollups
+
+        repo_data = collect_codebase_data(
+            target.path, metrics=metrics, plugins=plugin_set, docstrings=docstrings
+        )
         recap = build_repo_recap(repo_data)
         store.save_recap(recap)
-
-    if report:
-        reporter = HTMLReporter(recap)
-        reporter.generate(store.path / "report.html")
+        if repo_data.docstrings_df is not None:
+            store.save_docstrings(repo_data.docstrings_df)
+        store.save_rollups(build_rollups(repo_data))
 
     if history:
+        from morthal.history import walk_commit_history
+
         print("Walking commit history ...")
         history = walk_commit_history(target.path)
         csv_path = store.path / "commit_history.csv"
         history.to_csv(csv_path)
-        print(f"Commit history saved to: {csv_path.resolve()}")
\ No newline at end of file
+        print(f"Commit history saved to: {csv_path.resolve()}")
+
+    # the report draws the trends of the stored history, if any
+    history_df = store.load_history() if report and store.has_history else None
+
+    rules = None
+    if report and rules_path is not None:
+        from morthal.rules import load_rules
+
+        rules = load_rules(rules_path)
+
+    if report and sharded:
+        from morthal.reporter import ShardedReporter
+
+        if recap is None:
+            recap = store.load_recap()
+        rollups = store.load_rollups()
+        if rollups is None:
+            raise SystemExit(
+                f"No rollups in {store.path}, run morthal again with --force"
+            )
+        reporter = ShardedReporter(recap, rollups, history_df, rules)
+        reporter.generate(store.path / "report", workers=workers)
+    elif report:
+        from morthal.reporter import HTMLReporter
+
+        if recap is None:
+            recap = store.load_recap()
+        reporter = HTMLReporter(recap, history_df, rules)
+        reporter.generate(store.path / "report.html")
+
+
+def handle_query(
+    store: Store,
+    query: Query,
+    fmt: str,
+    rules_path: Path | None = None,
+    findings: bool = False,
+) -> None:
+    if not store.has_cached_recap:
+        raise SystemExit(
+            f"No stored results in {store.path}, run morthal on the target first"
+        )
+
+    lf = store.scan_funcs()
+    if findings:
+        # the query runs over the findings of the rules, rather than
+        # over the functions
+        from morthal.rules import evaluate_rules, load_rules
+
+        lf = evaluate_rules(load_rules(rules_path), lf)
+
+    result = query.run(lf)
+    print(format_result(result, fmt))
+
+
+def handle_diff(
+    base: str,
+    head: str,
+    repo_path: Path,
+    fmt: str,
+) -> None:
+    from morthal.diff import diff_funcs, format_diff, load_snapshot
+
+    diff = diff_funcs(
+        load_snapshot(base, repo_path),
+        load_snapshot(head, repo_path),
+    )
+    print(format_diff(diff, fmt))
@@ -0,0 +1,21 @@
+'''
+choices of the command line options, shared with the modules handling
+them. nothing is imported here, as the cli builds its parser out of
+this module on every run
+'''
+
+DIFF_FORMATS = ['markdown', 'json']
+# snapshot spec standing for the files currently on disk
+WORKTREE = 'worktree'
+
+# metric -> the fields of the collected functions it yields (see
+# morthal.analyze.collect.FuncStats)
+METRICS: dict[str, list[str]] = {
+    'name_len': ['name_len'],
+    'node_depth': ['max_node_depth', 'avg_node_depth', 'n_nodes', 'node_depth_hist'],
+    'stmt_depth': ['max_stmt_depth', 'avg_stmt_depth', 'n_exprs', 'stmt_depth_hist'],
+    'lines': ['n_codelines'],
+    'args': ['n_func_args', 'n_func_args_annotated'],
+    'returns': ['return_annotated'],
+    'docstring': ['has_docstring', 'docstring_len', 'docstring_hash'],
+}
@@ -0,0 +1,170 @@
+'''
+ad-hoc queries over stored results
+
+queries are built on top of a lazy scan of the store, so polars only
+reads the columns the query touches (projection pushdown) and can
+skip data that the filter rules out (predicate pushdown). filters and
+aggregations are written as SQL expressions, like:
+
+    --where "n_nodes > 200 and not return_annotated"
+    --group-by dir --agg "avg(n_codelines) as avg_lines" --top 20
+
+polars is imported on use, as the cli builds its parser out of this
+module on every run
+'''
+
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import polars as pl
+
+
+OUTPUT_FORMATS = ['table', 'csv', 'json']
+
+# aggregations used when grouping without specifying any
+DEFAULT_AGGS: list[str] = [
+    'count(*) as n_funcs',
+    'avg(n_codelines) as avg_lines',
+    'avg(max_stmt_depth) as avg_depth',
+    'max(max_stmt_depth) as max_depth',
+    'sum(n_nodes) as n_nodes',
+]
+
+
+@dataclass
+class Query:
+    where: str | None = None
+    group_by: list[str] = field(default_factory=lambda:[])
+    aggs: list[str] = field(default_factory=lambda:[])
+    sort: str | None = None
+    ascending: bool = False
+    top: int | None = None
+    columns: list[str] = field(default_factory=lambda:[])
+
+    def apply(self, lf: pl.LazyFrame) -> pl.LazyFrame:
+        import polars as pl
+        import polars.selectors as cs
+
+        from morthal.utils.df import decode_strings
+
+        # paths and names are stored dictionary encoded, which string
+        # functions of the filters don't take
+        lf = decode_strings(lf)
+        lf = lf.with_columns(
+            expr.alias(name) for name, expr in derived_columns().items()
+        )
+        # counts are stored as narrow unsigned integers, on which the
+        # arithmetic of the expressions (differences, sums) would wrap
+        # around. they are widened within the expressions, as filters
+        # on columns cast beforehand aren't pushed down to the scan
+        narrow = set(lf.select(cs.by_dtype(pl.UInt8, pl.UInt16, pl.UInt32)).collect_schema().names())
+
+        if self.where:
+            lf = lf.filter(pl.sql_expr(widen_narrow(self.where, narrow)))
+
+        if self.group_by:
+            aggs = self.aggs or DEFAULT_AGGS
+            lf = lf.group_by(self.group_by).agg(pl.sql_expr(widen_narrow(agg, narrow)) for agg in aggs)
+
+        if self.columns:
+            lf = lf.select(self.columns)
+
+        sort = self.sort
+        if sort is None and self.group_by and self.top is not None:
+            # without anything else, the biggest groups come first
+            sort = lf.collect_schema().names()[len(self.group_by)]
+
+        if sort is not None and self.top is not None:
+            if self.ascending:
+                lf = lf.bottom_k(self.top, by=sort)
+            else:
+                lf = lf.top_k(self.top, by=sort)
+            lf = lf.sort(sort, descending=not self.ascending, maintain_order=True)
+        elif sort is not None:
+            lf = lf.sort(sort, descending=not self.ascending, maintain_order=True)
+        elif self.top is not None:
+            lf = lf.head(self.top)
+
+        return lf
+
+    def run(self, lf: pl.LazyFrame) -> pl.DataFrame:
+        return self.apply(lf).collect()
+
+
+# string literals, quoted and bare identifiers, numbers, anything else
+_SQL_TOKEN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|[A-Za-z_]\w*|\d+(?:\.\d*)?|\S")
+_ARITHMETIC = {'+', '-', '*', '/', '%'}
+# words followed by parentheses which aren't function calls
+_SQL_KEYWORDS = {'and', 'or', 'not', 'in', 'is', 'between', 'like', 'case', 'when', 'then', 'else'}
+
+
+def widen_narrow(sql: str, narrow: set[str]) -> str:
+    '''
+    the sql expression with the columns of narrow cast to BIGINT where
+    they are operands of arithmetic or arguments of functions (like
+    sum), plain comparisons keeping the stored dtype, which the
+    statistics of the stored row groups are about
+    '''
+    tokens = list(_SQL_TOKEN.finditer(sql))
+    # whether every open parenthesis is a function call
+    calls: list[bool] = []
+    parts: list[str] = []
+    end = 0
+    for i, match in enumerate(tokens):
+        tok = match.group()
+        prev = tokens[i - 1].group() if i > 0 else ''
+        next_ = tokens[i + 1].group() if i + 1 < len(tokens) else ''
+        parts.append(sql[end:match.start()])
+        end = match.end()
+
+        if tok == '(':
+            calls.append(
+                bool(re.fullmatch(r'[A-Za-z_]\w*', prev)) and prev.lower() not in _SQL_KEYWORDS
+            )
+        elif tok == ')' and calls:
+            calls.pop()
+        elif (
+            tok.strip('"') in narrow and next_ != '(' and prev.lower() != 'as'
+            and (any(calls) or prev in _ARITHMETIC or next_ in _ARITHMETIC)
+        ):
+            tok = f'CAST({tok} AS BIGINT)'
+        parts.append(tok)
+
+    parts.append(sql[end:])
+    return ''.join(parts)
+
+
+def derived_columns() -> dict[str, pl.Expr]:
+    '''
+    columns which are not stored but can be used like any other column
+    '''
+    import polars as pl
+
+    return {
+        'dir': pl.when(pl.col('fpath').str.contains('/'))
+            .then(pl.col('fpath').str.replace(r'/[^/]*$', ''))
+            .otherwise(pl.lit('.')),
+    }
+
+
+def format_result(df: pl.DataFrame, fmt: str = 'table') -> str:
+    if fmt == 'csv':
+        import polars as pl
+        import polars.selectors as cs
+
+        # csv has no nested values, the depth histograms are written
+        # as their space separated counts
+        df = df.with_columns(cs.array().arr.eval(pl.element().cast(pl.Utf8)).arr.join(' '))
+        return df.write_csv().rstrip('\n')
+    if fmt == 'json':
+        return df.write_json()
+    if fmt == 'table':
+        import polars as pl
+
+        with pl.Config(tbl_rows=-1, tbl_cols=-1, fmt_str_lengths=120):
+            return str(df)
+    raise ValueError(f'unknown output format {fmt!r}, expected one of {OUTPUT_FORMATS}')
@@ -3,5 +3,6 @@ Morthal reporter module - Generate reports from code analysis data
 """
 
 from .html_reporter import HTMLReporter
+from .sharded import ShardedReporter
 
-__all__ = ['HTMLReporter']
+__all__ = ['HTMLReporter', 'ShardedReporter']
@@ -3,15 +3,19 @@ HTML Reporter for Morthal code analysis
 Generates interactive HTML reports from function statistics
 """
 
+import json
 from datetime import datetime
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
 import polars as pl
 
 from morthal.analyze.recap import CodeRecap
-from .plotting import gen_plots
-from .templates import get_html_template
+from morthal.rules import Rule, default_rules, evaluate_rules
+from morthal.utils.df import decode_strings
+from .markup import html_escape, iter_gzip_base64, render_rows, series_json
+from .plotting import gen_plots, gen_trend_plots
+from .templates import iter_html_template
 
 
 class HTMLReporter:
@@ -23,18 +27,32 @@ class HTMLReporter:
     LINES_LONG = 50
     COMPLEXITY_HIGH = 100  # n_nodes threshold
     
-    def __init__(self, recap: CodeRecap):
+    def __init__(
+        self,
+        recap: CodeRecap,
+        history_df: pl.DataFrame | None = None,
+        rules: list[Rule] | None = None,
+    ):
         """
         Initialize reporter with a Polars DataFrame and summary statistics
         
         Args:
             df: DataFrame containing function statistics
             recap: RepoRecap with pre-calculated summary statistics
+            history_df: Optional commit history (as saved by RepoHistory.to_csv),
+                drawn as trend charts
+            rules: Tech debt rules, the defaults are built on the class thresholds
         """
-        self.df = recap.funcs_df
+        self.df = decode_strings(recap.funcs_df)
         self.recap = recap
+        self.history_df = history_df
+        if rules is None:
+            rules = default_rules(self.DEPTH_HIGH, self.LINES_LONG, self.COMPLEXITY_HIGH)
+        self.rules = rules
         # Determine which depth column to use
         self.depth_col = 'max_stmt_depth'
+        # Precomputed sort orders, when the recap comes with them
+        self.index = recap.funcs_index
         
     @classmethod
     def from_csv(cls, csv_path: str | Path, recap: CodeRecap | None = None) -> 'HTMLReporter':
@@ -63,7 +81,9 @@ class HTMLReporter:
     
     def _generate_summary_cards(self) -> str:
         """Generate HTML for summary statistics cards using pre-calculated RepoRecap data"""
-        r = self.recap  # shorthand for easier access
+        r = self.recap.funcs_recap  # shorthand for easier access
+        deep_funcs = self.df.filter(pl.col(self.depth_col) >= self.DEPTH_HIGH).height
+        long_funcs = self.df.filter(pl.col('n_codelines') > self.LINES_LONG).height
         
         cards = f"""
         <div class="summary-card">
@@ -98,14 +118,14 @@ class HTMLReporter:
         
         <div class="summary-card">
             <h3>Deep Nesting</h3>
-            <div class="value">{r.deep_funcs}</div>
-            <div class="subtext">depth ≥ {r.depth_threshold}</div>
+            <div class="value">{deep_funcs}</div>
+            <div class="subtext">depth ≥ {self.DEPTH_HIGH}</div>
         </div>
         
         <div class="summary-card">
             <h3>Long Functions</h3>
-            <div class="value">{r.long_funcs}</div>
-            <div class="subtext">&gt; {r.lines_threshold} lines</div>
+            <div class="value">{long_funcs}</div>
+            <div class="subtext">&gt; {self.LINES_LONG} lines</div>
         </div>
         
         <div class="summary-card">
@@ -118,127 +138,97 @@ class HTMLReporter:
         return cards
     
     def _generate_tech_debt_items(self) -> str:
-        """Generate HTML for technical debt indicators"""
-        items = []
-        
-        # Critical: Deep nesting AND long functions
-        critical = self.df.filter(
-            (pl.col(self.depth_col) >= self.DEPTH_HIGH) & 
-            (pl.col('n_codelines') > self.LINES_LONG)
-        ).sort(self.depth_col, descending=True).head(10)
-        
-        for row in critical.iter_rows(named=True):
-            depth_value = row.get('max_depth', row.get('max_stmt_depth'))
-            items.append(f"""
-            <li class="tech-debt-item critical">
-                <strong>🔴 Critical: {row['name']}</strong>
-                Deep nesting ({depth_value}) + Long function ({row['n_codelines']} lines)
-                <div class="file-path">{row['fpath']}</div>
-            </li>
-            """)
-        
-        # High complexity functions
-        complex_funcs = self.df.filter(
-            pl.col('n_nodes') > self.COMPLEXITY_HIGH
-        ).sort('n_nodes', descending=True).head(5)
-        
-        for row in complex_funcs.iter_rows(named=True):
-            items.append(f"""
-            <li class="tech-debt-item">
-                <strong>⚠️ High Complexity: {row['name']}</strong>
-                {row['n_nodes']} AST nodes, {row['n_exprs']} expressions
-                <div class="file-path">{row['fpath']}</div>
+        """Generate HTML for technical debt indicators, as found by the rules"""
+        findings = evaluate_rules(self.rules, self.df.lazy()).collect()
+        
+        items = render_rows(findings, """
+            <li class="tech-debt-item {}">
+                <strong>{} {}: {}</strong>
+                {}
+                <div class="file-path">{}</div>
             </li>
-            """)
-        
-        # Functions with no type hints at all
-        no_hints = self.df.filter(
-            ~pl.col('return_annotated') & 
-            (pl.col('n_func_args_annotated') == 0) &
-            (pl.col('n_func_args') > 0)
-        ).head(5)
-        
-        for row in no_hints.iter_rows(named=True):
-            items.append(f"""
-            <li class="tech-debt-item">
-                <strong>📝 No Type Hints: {row['name']}</strong>
-                {row['n_func_args']} arguments, 0 annotations
-                <div class="file-path">{row['fpath']}</div>
-            </li>
-            """)
+            """,
+            pl.col('severity'),
+            pl.col('icon'),
+            html_escape(pl.col('title')),
+            html_escape(pl.col('name')),
+            html_escape(pl.col('message')),
+            html_escape(pl.col('fpath')),
+        )
         
         if not items:
             return '<p style="color: #28a745; font-weight: bold;">✅ No significant technical debt detected!</p>'
         
         return f'<ul class="tech-debt-list">{"".join(items)}</ul>'
     
-    def _get_depth_badge(self, depth: int) -> str:
-        """Get HTML badge for depth level"""
-        if depth >= self.DEPTH_HIGH:
-            css_class = "depth-high"
-        elif depth >= self.DEPTH_MEDIUM:
-            css_class = "depth-medium"
-        else:
-            css_class = "depth-low"
-        
-        return f'<span class="depth-badge {css_class}">{depth}</span>'
-    
-    def _get_annotation_indicator(self, args_annotated: int, total_args: int, return_annotated: bool) -> str:
-        """Get HTML indicator for annotation status"""
-        if total_args == 0:
-            indicator_class = "annotation-good" if return_annotated else "annotation-bad"
-        elif args_annotated == total_args and return_annotated:
-            indicator_class = "annotation-good"
-        elif args_annotated > 0 or return_annotated:
-            indicator_class = "annotation-partial"
-        else:
-            indicator_class = "annotation-bad"
-        
-        return_symbol = "✓" if return_annotated else "✗"
-        annotation_text = f"{args_annotated}/{total_args} args, return {return_symbol}"
-        
-        return f'<span class="annotation-indicator {indicator_class}"></span>{annotation_text}'
-    
-    def _generate_table_rows(self) -> str:
-        """Generate HTML table rows for all functions"""
-        # Sort by depth by default
-        sorted_df = self.df.sort(self.depth_col, descending=True)
-        
-        rows = []
-        for row in sorted_df.iter_rows(named=True):
-            depth_value = row.get('max_depth', row.get('max_stmt_depth', 0))
-            depth_badge = self._get_depth_badge(int(depth_value))
-            annotation = self._get_annotation_indicator(
-                row['n_func_args_annotated'],
-                row['n_func_args'],
-                row['return_annotated']
-            )
-            
-            # Truncate file path for display
-            file_path = str(row['fpath'])
-            display_path = file_path if len(file_path) < 80 else "..." + file_path[-77:]
-            
-            rows.append(f"""
-            <tr data-name="{row['name']}" 
-                data-max_depth="{depth_value}" 
-                data-n_codelines="{row['n_codelines']}"
-                data-n_exprs="{row['n_exprs']}"
-                data-n_nodes="{row['n_nodes']}"
-                data-n_func_args="{row['n_func_args']}"
-                data-n_func_args_annotated="{row['n_func_args_annotated']}"
-                data-return_annotated="{str(row['return_annotated']).lower()}">
-                <td><strong>{row['name']}</strong></td>
-                <td>{depth_badge}</td>
-                <td>{row['n_codelines']}</td>
-                <td>{row['n_exprs']}</td>
-                <td>{row['n_nodes']}</td>
-                <td>{row['n_func_args']}</td>
-                <td>{annotation}</td>
-                <td class="file-path" title="{file_path}">{display_path}</td>
-            </tr>
-            """)
-        
-        return "".join(rows)
+    # Columns shipped to the browser, in table order (name -> column)
+    TABLE_COLUMNS = {
+        'max_depth': 'max_stmt_depth',
+        'n_codelines': 'n_codelines',
+        'n_exprs': 'n_exprs',
+        'n_nodes': 'n_nodes',
+        'n_func_args': 'n_func_args',
+        'n_func_args_annotated': 'n_func_args_annotated',
+    }
+    STRING_COLUMNS = ['name', 'fpath']
+    SORTABLE_COLUMNS = ['name', 'max_depth', 'n_codelines', 'n_exprs', 'n_nodes', 'n_func_args']
+
+    def _sorted_table_df(self) -> pl.DataFrame:
+        """Functions listed in the table, sorted by depth by default"""
+        if self.index is not None:
+            return self.index.top_k(self.df, self.depth_col, len(self.df))
+        return self.df.sort(self.depth_col, descending=True)
+
+    def _generate_navigation(self) -> str:
+        """HTML for the links to other pages, a single page report has none"""
+        return ''
+
+    def _iter_table_json(self) -> Iterator[bytes]:
+        """
+        Generate the functions table as columnar JSON, one piece at a time
+
+        Strings are dictionary encoded (the dictionary is sorted, so codes
+        sort like the strings they stand for), numbers are plain arrays
+        that the browser turns into typed arrays, and the ascending row
+        order of every sortable column is precomputed here. The browser
+        then only renders the rows that are scrolled into view.
+        """
+        sorted_df = self._sorted_table_df()
+
+        columns = sorted_df.select(
+            [
+                (pl.col(col).rank('dense') - 1).cast(pl.UInt32).alias(col)
+                for col in self.STRING_COLUMNS
+            ] + [
+                pl.col(col).cast(pl.Int64).alias(name)
+                for name, col in self.TABLE_COLUMNS.items()
+            ] + [
+                pl.col('return_annotated').cast(pl.UInt8)
+            ]
+        )
+        orders = columns.select(
+            pl.arg_sort_by(col, maintain_order=True).alias(col)
+            for col in self.SORTABLE_COLUMNS
+        )
+        strings = [
+            sorted_df[col].cast(pl.Utf8).unique().sort()
+            for col in self.STRING_COLUMNS
+        ]
+
+        header = {
+            'n': len(columns),
+            'thresholds': {
+                'depth_high': self.DEPTH_HIGH,
+                'depth_medium': self.DEPTH_MEDIUM,
+            },
+        }
+        yield json.dumps(header, separators=(',', ':'))[:-1].encode('utf-8')
+        for key, frame in (('strings', strings), ('columns', columns), ('orders', orders)):
+            yield f',"{key}":{{'.encode('utf-8')
+            for i, series in enumerate(frame):
+                yield ((',' if i else '') + series_json(series)).encode('utf-8')
+            yield b'}'
+        yield b'}'
     
     def generate(self, output_path: str | Path, **kwargs: Any) -> None:
         """
@@ -248,27 +238,33 @@ class HTMLReporter:
             output_path: Path where HTML report will be saved
             **kwargs: Additional configuration options (reserved for future use)
         """
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        output_path = Path(output_path)
+        self._write(output_path)
         
-        # while we're here let's generate some dumb dist plots
-        gen_plots(self.recap.funcs_df)
+        print(f"✅ Report generated: {output_path.absolute()}")
+        print(f"📊 Analyzed {len(self.df)} functions")
 
+    def _write(self, output_path: Path) -> None:
+        """Render the report and stream it to output_path"""
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
         # Generate all components
         summary_cards = self._generate_summary_cards()
         tech_debt_items = self._generate_tech_debt_items()
-        table_rows = self._generate_table_rows()
-        
-        # Get template with all values filled
-        html_content = get_html_template(
-            timestamp=timestamp,
-            summary_cards=summary_cards,
-            tech_debt_items=tech_debt_items,
-            table_rows=table_rows
-        )
-        
-        # Write to file
-        output_path = Path(output_path)
-        output_path.write_text(html_content, encoding='utf-8')
-        
-        print(f"✅ Report generated: {output_path.absolute()}")
-        print(f"📊 Analyzed {len(self.df)} functions")
+        charts = gen_plots(self.df)
+        trends = gen_trend_plots(self.history_df) if self.history_df is not None else ""
+        table_data = iter_gzip_base64(self._iter_table_json())
+        
+        # Stream the template with all values filled to the file, the
+        # table data being encoded while it is written
+        with output_path.open('w', encoding='utf-8') as out:
+            for chunk in iter_html_template(
+                timestamp=timestamp,
+                summary_cards=summary_cards,
+                tech_debt_items=tech_debt_items,
+                charts=charts,
+                table_data=table_data,
+                trends=trends,
+                navigation=self._generate_navigation(),
+            ):
+                out.write(chunk)
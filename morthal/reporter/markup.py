@@ -0,0 +1,82 @@
+"""
+Vectorized markup and streaming helpers for the reporter
+
+Markup for many rows is produced by Polars string expressions instead of
+a Python loop over rows, and the big embedded payloads are encoded
+piece by piece so that the report can be streamed to disk.
+"""
+
+import base64
+import zlib
+from typing import Iterable, Iterator
+
+import polars as pl
+
+
+_HTML_ESCAPES = {
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#39;',
+}
+
+
+def html_escape(expr: pl.Expr) -> pl.Expr:
+    """HTML-escape a string expression (all patterns are replaced in one pass)"""
+    return expr.cast(pl.Utf8).str.replace_many(
+        list(_HTML_ESCAPES.keys()),
+        list(_HTML_ESCAPES.values()),
+    )
+
+
+def render_rows(df: pl.DataFrame, template: str, *exprs: pl.Expr) -> list[str]:
+    """
+    Render one markup snippet per row
+
+    Args:
+        df: Rows to render
+        template: Markup with one "{}" placeholder per expression
+        exprs: Expressions filling the placeholders, escape strings with html_escape
+
+    Returns:
+        The rendered snippets, in row order
+    """
+    if df.height == 0:
+        return []
+    return df.select(pl.format(template, *exprs).alias('markup'))['markup'].to_list()
+
+
+def series_json(series: pl.Series) -> str:
+    """
+    JSON member '"name":[...]' for a series, encoded by Polars rather than
+    by going through a Python list
+    """
+    line = pl.select(series.implode()).write_ndjson()
+    # strips the surrounding '{' and '}\n' of the single ndjson object
+    return line.strip()[1:-1]
+
+
+def iter_gzip_base64(pieces: Iterable[bytes], chunk_size: int = 1 << 16) -> Iterator[str]:
+    """
+    Gzip and base64 encode a stream of bytes, yielding text chunks as soon
+    as they are available so that nothing but the current chunk is held
+    in memory
+    """
+    compressor = zlib.compressobj(wbits=31)  # gzip container, mtime 0
+    pending = b''
+
+    def drain(final: bool = False) -> Iterator[str]:
+        nonlocal pending
+        # base64 works on groups of 3 bytes, leftovers wait for more data
+        cut = len(pending) if final else len(pending) - len(pending) % 3
+        if cut >= chunk_size or (final and cut):
+            yield base64.b64encode(pending[:cut]).decode('ascii')
+            pending = pending[cut:]
+
+    for piece in pieces:
+        pending += compressor.compress(piece)
+        yield from drain()
+
+    pending += compressor.flush()
+    yield from drain(final=True)
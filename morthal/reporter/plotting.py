@@ -1,16 +1,230 @@
 '''
-here it would be nice if I was to just think about some stupid plots from the dataframe
+distribution and trend charts for the report
+
+histograms are binned by polars and drawn as inline svg, so the report
+stays self contained and no plotting library (nor a conversion to
+pandas) is needed to produce them. trends of the commit history are
+downsampled before being drawn, so a long history doesn't weigh on the
+report
 '''
 
+from dataclasses import dataclass
+from html import escape
+
 import polars as pl
-import seaborn as sns
-from matplotlib import pyplot as plt
 
-def gen_plots(funcs_df: pl.DataFrame):
-    
+from morthal.utils.downsample import downsample
+
+
+# column -> chart title
+PLOTTED_COLUMNS: dict[str, str] = {
+    'n_nodes': 'AST nodes per function',
+    'n_exprs': 'Expressions per function',
+    'n_codelines': 'Lines per function',
+    'max_stmt_depth': 'Max depth per function',
+}
+
+# history column -> chart title
+TREND_COLUMNS: dict[str, str] = {
+    'total_funcs': 'Functions',
+    'avg_depth': 'Average depth',
+    'avg_lines': 'Average lines',
+    'return_coverage': 'Return annotation coverage (%)',
+}
+# points drawn at most per trend, way more than the pixels of a chart
+TREND_POINTS = 2000
+
+
+@dataclass
+class Histogram:
+    # left edge of every bin, bins being [start, start + width)
+    starts: list[int]
+    counts: list[int]
+    width: int
+    # count of the values beyond the last bin, if the tail was cut
+    overflow: int = 0
+
+
+def histogram(
+    series: pl.Series,
+    n_bins: int = 30,
+    tail_quantile: float = 0.99,
+) -> Histogram:
+    '''
+    integer bins over [min, quantile], the values beyond the quantile
+    are counted in an overflow bin so that a handful of huge functions
+    doesn't squash every other bar
+    '''
+    values = series.drop_nulls()
+    if len(values) == 0:
+        return Histogram(starts=[], counts=[], width=1)
+
+    lo = int(values.min())
+    hi = int(values.quantile(tail_quantile, 'higher'))
+    width = max(1, -(-(hi - lo + 1) // n_bins))
+    n_bins = -(-(hi - lo + 1) // width)
+
+    binned = (
+        values.to_frame('value')
+        .select(((pl.col('value') - lo) // width).cast(pl.Int64).alias('bin'))
+        .group_by('bin')
+        .len()
+    )
+    counts = [0] * n_bins
+    overflow = 0
+    for b, count in binned.iter_rows():
+        if b < n_bins:
+            counts[b] = count
+        else:
+            overflow += count
+
+    return Histogram(
+        starts=[lo + i * width for i in range(n_bins)],
+        counts=counts,
+        width=width,
+        overflow=overflow,
+    )
+
+
+def svg_histogram(
+    hist: Histogram,
+    title: str,
+    width: int = 420,
+    height: int = 200,
+) -> str:
+    pad_left, pad_bottom, pad_top = 40, 24, 8
+    plot_w = width - pad_left - 8
+    plot_h = height - pad_bottom - pad_top
+
+    bars = list(zip(hist.starts, hist.counts))
+    if hist.overflow:
+        bars.append((None, hist.overflow))
+    if not bars:
+        return f'<figure class="chart"><figcaption>{escape(title)}</figcaption><p>No data</p></figure>'
+
+    peak = max(count for _, count in bars) or 1
+    bar_w = plot_w / len(bars)
+
+    rects = []
+    for i, (start, count) in enumerate(bars):
+        bar_h = count / peak * plot_h
+        if start is None:
+            label = f'&gt; {hist.starts[-1] + hist.width - 1}'
+            css_class = 'bar overflow'
+        elif hist.width == 1:
+            label = f'{start}'
+            css_class = 'bar'
+        else:
+            label = f'{start}–{start + hist.width - 1}'
+            css_class = 'bar'
+        rects.append(
+            f'<rect class="{css_class}" x="{pad_left + i * bar_w:.1f}" '
+            f'y="{pad_top + plot_h - bar_h:.1f}" width="{max(bar_w - 1, 1):.1f}" '
+            f'height="{bar_h:.1f}"><title>{label}: {count}</title></rect>'
+        )
+
+    last = hist.starts[-1] + hist.width - 1 if hist.starts else 0
+    axis = (
+        f'<line class="axis" x1="{pad_left}" y1="{pad_top + plot_h}" '
+        f'x2="{width - 8}" y2="{pad_top + plot_h}"/>'
+        f'<text x="{pad_left}" y="{height - 6}">{hist.starts[0] if hist.starts else 0}</text>'
+        f'<text x="{width - 8}" y="{height - 6}" text-anchor="end">'
+        f'{"&gt; " if hist.overflow else ""}{last}</text>'
+        f'<text x="{pad_left - 4}" y="{pad_top + 10}" text-anchor="end">{peak}</text>'
+        f'<text x="{pad_left - 4}" y="{pad_top + plot_h}" text-anchor="end">0</text>'
+    )
+
+    return (
+        f'<figure class="chart"><figcaption>{escape(title)}</figcaption>'
+        f'<svg viewBox="0 0 {width} {height}" width="100%" role="img" '
+        f'aria-label="{escape(title)}">{axis}{"".join(rects)}</svg></figure>'
+    )
+
+
+def gen_plots(funcs_df: pl.DataFrame) -> str:
+    '''
+    markup of the histogram of every plotted column found in funcs_df
+    '''
+    return ''.join(
+        svg_histogram(histogram(funcs_df[col]), title)
+        for col, title in PLOTTED_COLUMNS.items()
+        if col in funcs_df.columns
+    )
+
+
+def svg_line_chart(
+    xs: list[float],
+    ys: list[float],
+    title: str,
+    x_labels: tuple[str, str],
+    width: int = 420,
+    height: int = 200,
+) -> str:
+    pad_left, pad_bottom, pad_top = 40, 24, 8
+    plot_w = width - pad_left - 8
+    plot_h = height - pad_bottom - pad_top
+
+    if not xs:
+        return f'<figure class="chart"><figcaption>{escape(title)}</figcaption><p>No data</p></figure>'
+
+    x_lo, x_hi = min(xs), max(xs)
+    y_lo, y_hi = min(ys), max(ys)
+    x_span = (x_hi - x_lo) or 1
+    y_span = (y_hi - y_lo) or 1
+
+    points = ' '.join(
+        f'{pad_left + (x - x_lo) / x_span * plot_w:.1f},'
+        f'{pad_top + plot_h - (y - y_lo) / y_span * plot_h:.1f}'
+        for x, y in zip(xs, ys)
+    )
+    axis = (
+        f'<line class="axis" x1="{pad_left}" y1="{pad_top + plot_h}" '
+        f'x2="{width - 8}" y2="{pad_top + plot_h}"/>'
+        f'<text x="{pad_left}" y="{height - 6}">{escape(x_labels[0])}</text>'
+        f'<text x="{width - 8}" y="{height - 6}" text-anchor="end">{escape(x_labels[1])}</text>'
+        f'<text x="{pad_left - 4}" y="{pad_top + 10}" text-anchor="end">{y_hi:g}</text>'
+        f'<text x="{pad_left - 4}" y="{pad_top + plot_h}" text-anchor="end">{y_lo:g}</text>'
+    )
+
+    return (
+        f'<figure class="chart"><figcaption>{escape(title)}</figcaption>'
+        f'<svg viewBox="0 0 {width} {height}" width="100%" role="img" '
+        f'aria-label="{escape(title)}">{axis}'
+        f'<polyline class="line" points="{points}"/></svg></figure>'
+    )
+
+
+def gen_trend_plots(
+    history_df: pl.DataFrame,
+    n_points: int = TREND_POINTS,
+    method: str = 'minmax',
+) -> str:
+    '''
+    markup of the trend of every TREND_COLUMNS column found in the
+    commit history (as stored by RepoHistory.to_csv), each one
+    downsampled to n_points at most
+    '''
+    if history_df.height == 0:
+        return ''
 
-    sns.displot(funcs_df.to_pandas(), x = 'n_nodes', kind='kde')
-    plt.savefig('n_nodes_dist.png')
+    history_df = history_df.with_columns(
+        pl.col('datetime').str.to_datetime()
+        if history_df['datetime'].dtype == pl.Utf8 else pl.col('datetime')
+    ).sort('datetime')
+    x_labels = (
+        history_df['datetime'][0].strftime('%Y-%m-%d'),
+        history_df['datetime'][-1].strftime('%Y-%m-%d'),
+    )
 
-    sns.displot(funcs_df.to_pandas(), x = 'n_exprs', kind='kde')
-    plt.savefig('n_exprs_dist.png')
+    charts = []
+    for col, title in TREND_COLUMNS.items():
+        if col not in history_df.columns:
+            continue
+        points = downsample(history_df.select('datetime', col), 'datetime', col, n_points, method)
+        charts.append(svg_line_chart(
+            xs=points['datetime'].dt.epoch('s').to_list(),
+            ys=points[col].cast(pl.Float64).to_list(),
+            title=title,
+            x_labels=x_labels,
+        ))
+    return ''.join(charts)
@@ -0,0 +1,314 @@
+"""
+Sharded HTML report, made of an index page plus one page per directory
+
+Every page has the summary cards, the tech-debt list and the charts of
+its whole subtree, links to its parent and child directories, and a
+table of the functions defined right in its directory, so that no page
+has to embed the whole codebase. Pages are rendered by a pool of worker
+processes, and a page is written again only if the data it is made of
+changed since the previous run.
+"""
+
+import hashlib
+import json
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from html import escape
+from pathlib import Path
+
+import polars as pl
+
+from morthal.analyze.recap import CodeRecap
+from morthal.analyze.rollup import ROOT_PREFIX, Rollups, with_prefixes
+from morthal.rules import Rule
+from morthal.utils.df import decode_strings
+from .html_reporter import HTMLReporter
+from .markup import html_escape, render_rows
+from .templates import get_css, get_javascript
+
+
+INDEX_PAGE = "index.html"
+# of the pages of the directories
+PAGE_SUFFIX = ".dir.html"
+# page name -> hash of the data the page was rendered from
+PAGES_MANIFEST = ".pages.json"
+
+
+def page_name(prefix: str) -> str:
+    """
+    File name of the page of a directory, like "pkg.sub.dir.html" for pkg/sub
+
+    Pages are all written in the same directory so that links between
+    them are plain file names. Dots (and the "~" escaping them) in the
+    directory names are escaped, so that "a.b" and "a/b" get pages of
+    their own, and the suffix keeps a directory named "index" off the
+    index page.
+    """
+    if prefix == ROOT_PREFIX:
+        return INDEX_PAGE
+    parts = [part.replace("~", "~7E").replace(".", "~2E") for part in prefix.split("/")]
+    return ".".join(parts) + PAGE_SUFFIX
+
+
+def page_name_expr(prefix: pl.Expr) -> pl.Expr:
+    """Same as page_name, for a column of prefixes other than the root"""
+    return (
+        prefix.str.replace_all("~", "~7E", literal=True)
+        .str.replace_all(".", "~2E", literal=True)
+        .str.replace_all("/", ".", literal=True)
+        + PAGE_SUFFIX
+    )
+
+
+class PageReporter(HTMLReporter):
+    """Report page of one directory, see ShardedReporter"""
+
+    def __init__(
+        self,
+        recap: CodeRecap,
+        table_df: pl.DataFrame,
+        navigation: str,
+        history_df: pl.DataFrame | None = None,
+        rules: list[Rule] | None = None,
+    ):
+        """
+        Args:
+            recap: Recap and functions of the whole subtree of the directory
+            table_df: Functions defined right in the directory
+            navigation: HTML of the links to the other pages
+            history_df: Optional commit history, drawn as trend charts
+            rules: Tech debt rules, see HTMLReporter
+        """
+        super().__init__(recap, history_df, rules)
+        self.table_df = table_df
+        self.navigation = navigation
+
+    def _sorted_table_df(self) -> pl.DataFrame:
+        return self.table_df.sort(self.depth_col, descending=True, maintain_order=True)
+
+    def _generate_navigation(self) -> str:
+        return self.navigation
+
+
+@dataclass
+class PageJob:
+    """Everything needed to render a page, sent over to a worker"""
+    recap: CodeRecap
+    table_df: pl.DataFrame
+    navigation: str
+    output_path: Path
+    history_df: pl.DataFrame | None = None
+    rules: list[Rule] | None = None
+
+
+def _render_page(job: PageJob) -> None:
+    PageReporter(
+        job.recap, job.table_df, job.navigation, job.history_df, job.rules
+    )._write(job.output_path)
+
+
+class ShardedReporter:
+    """Generate a multi-page HTML report out of the per directory rollups"""
+
+    def __init__(
+        self,
+        recap: CodeRecap,
+        rollups: Rollups,
+        history_df: pl.DataFrame | None = None,
+        rules: list[Rule] | None = None,
+    ):
+        """
+        Args:
+            recap: Recap of the codebase, with all of its functions
+            rollups: Per directory rollups of the same codebase
+            history_df: Optional commit history, drawn on the index page
+            rules: Tech debt rules, see HTMLReporter
+        """
+        self.df = decode_strings(recap.funcs_df)
+        self.rollups = rollups
+        self.history_df = history_df
+        self.rules = rules
+
+    def _generate_navigation(self, prefix: str) -> str:
+        """HTML for the breadcrumb up to the root and the table of subdirectories"""
+        parts = [] if prefix == ROOT_PREFIX else prefix.split("/")
+        crumbs = [f'<a href="{INDEX_PAGE}">(root)</a>']
+        for i, part in enumerate(parts):
+            crumbs.append(
+                f'<a href="{escape(page_name("/".join(parts[:i + 1])))}">{escape(part)}</a>'
+            )
+        navigation = f'<nav class="breadcrumb">{" / ".join(crumbs)}</nav>'
+
+        children = self.rollups.children(prefix).with_columns(
+            # the root being nobody's child
+            page_name_expr(pl.col("prefix")).alias("page"),
+            pl.col("prefix").str.replace(r"^.*/", "").alias("dirname"),
+        )
+        rows = render_rows(children, """
+                        <tr>
+                            <td><a href="{}">{}</a></td>
+                            <td>{}</td>
+                            <td>{}</td>
+                            <td>{}</td>
+                            <td>{}</td>
+                            <td>{}</td>
+                            <td>{}%</td>
+                        </tr>""",
+            html_escape(pl.col("page")),
+            html_escape(pl.col("dirname")),
+            pl.col("kind"),
+            pl.col("n_files"),
+            pl.col("total_funcs"),
+            pl.col("avg_depth").round(1),
+            pl.col("avg_lines").round(0),
+            pl.col("return_coverage").round(0),
+        )
+        if rows:
+            navigation += f"""
+            <section class="subdirs">
+                <h2>Subdirectories</h2>
+                <table>
+                    <thead>
+                        <tr>
+                            <th>Directory</th>
+                            <th>Kind</th>
+                            <th>Files</th>
+                            <th>Functions</th>
+                            <th>Avg Depth</th>
+                            <th>Avg Lines</th>
+                            <th>Return Annotations</th>
+                        </tr>
+                    </thead>
+                    <tbody>{"".join(rows)}
+                    </tbody>
+                </table>
+            </section>"""
+        return navigation
+
+    def _page_hashes(self, navigations: dict[str, str]) -> dict[str, str]:
+        """
+        Hash of the data every page is rendered from: the rows of the
+        functions in its subtree, its rollup and its navigation, plus the
+        reporter's settings and assets (and the history for the index page)
+        """
+        # every function row is hashed once, the hashes are then summed
+        # over each subtree (in 32 bit halves, so that sums don't overflow)
+        row_hashes = self.df.hash_rows(seed=0)
+        sums = (
+            with_prefixes(
+                self.df.lazy().select(
+                    "fpath",
+                    (row_hashes % (1 << 32)).alias("lo"),
+                    (row_hashes // (1 << 32)).alias("hi"),
+                )
+            )
+            .group_by("prefix")
+            .agg(pl.col("lo").sum(), pl.col("hi").sum())
+            .collect()
+        )
+        sums = {row["prefix"]: (row["lo"], row["hi"]) for row in sums.iter_rows(named=True)}
+
+        settings = json.dumps([
+            pl.__version__,
+            HTMLReporter.DEPTH_HIGH,
+            HTMLReporter.DEPTH_MEDIUM,
+            HTMLReporter.LINES_LONG,
+            HTMLReporter.COMPLEXITY_HIGH,
+            [rule.model_dump() for rule in self.rules or []],
+            get_css(),
+            get_javascript(),
+        ])
+
+        history = None
+        if self.history_df is not None:
+            history = self.history_df.hash_rows(seed=0).to_list()
+
+        hashes = {}
+        for row in self.rollups.df.iter_rows(named=True):
+            prefix = row["prefix"]
+            data = [settings, sums.get(prefix), row, navigations[prefix]]
+            if prefix == ROOT_PREFIX:
+                data.append(history)
+            data = json.dumps(data, default=str)
+            hashes[page_name(prefix)] = hashlib.sha256(data.encode("utf-8")).hexdigest()
+        return hashes
+
+    def generate(self, output_dir: str | Path, workers: int | None = None) -> list[str]:
+        """
+        Generate the pages whose data changed, and remove stale ones
+
+        Args:
+            output_dir: Directory where the pages are written
+            workers: Number of worker processes, defaults to the number of CPUs
+
+        Returns:
+            The names of the pages which were (re)generated
+        """
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        manifest_path = output_dir / PAGES_MANIFEST
+        try:
+            previous = json.loads(manifest_path.read_text())
+        except (FileNotFoundError, json.JSONDecodeError):
+            previous = {}
+
+        prefixes = self.rollups.df["prefix"].to_list()
+        navigations = {prefix: self._generate_navigation(prefix) for prefix in prefixes}
+        hashes = self._page_hashes(navigations)
+
+        stale = [
+            prefix for prefix in prefixes
+            if previous.get(page_name(prefix)) != hashes[page_name(prefix)]
+            or not (output_dir / page_name(prefix)).exists()
+        ]
+
+        for name in previous.keys() - hashes.keys():
+            (output_dir / name).unlink(missing_ok=True)
+
+        jobs = self._iter_jobs(stale, navigations, output_dir)
+        if workers == 1 or len(stale) <= 1:
+            for job in jobs:
+                _render_page(job)
+        else:
+            # polars is multithreaded, so forking it is not safe
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+                for _ in pool.map(_render_page, jobs):
+                    pass
+
+        manifest_path.write_text(json.dumps(hashes, indent=1))
+
+        print(f"✅ Report generated: {(output_dir / INDEX_PAGE).absolute()}")
+        print(f"📄 {len(stale)} of {len(prefixes)} pages regenerated")
+        return [page_name(prefix) for prefix in stale]
+
+    def _iter_jobs(self, prefixes: list[str], navigations: dict[str, str], output_dir: Path):
+        if not prefixes:
+            return
+
+        # the functions of every stale page, split by directory in one go
+        subtrees = (
+            with_prefixes(self.df.lazy())
+            .with_columns(
+                # the deepest prefix of a file is its own directory
+                (pl.col("level") == pl.col("level").max().over("fpath")).alias("_own")
+            )
+            .filter(pl.col("prefix").is_in(prefixes))
+            .collect()
+            .partition_by("prefix", as_dict=True, include_key=False)
+        )
+
+        for prefix in prefixes:
+            subtree = subtrees[(prefix,)]
+            table_df = subtree.filter(pl.col("_own"))
+            funcs_df = subtree.drop("level", "_own")
+            yield PageJob(
+                recap=CodeRecap(funcs_recap=self.rollups.get(prefix), funcs_df=funcs_df),
+                table_df=table_df.drop("level", "_own"),
+                navigation=navigations[prefix],
+                output_path=output_dir / page_name(prefix),
+                history_df=self.history_df if prefix == ROOT_PREFIX else None,
+                rules=self.rules,
+            )
+
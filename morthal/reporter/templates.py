@@ -2,6 +2,9 @@
 HTML templates for the code analysis reporter
 """
 
+from typing import Iterable, Iterator
+
+
 def get_css() -> str:
     """Returns the CSS styling (no template variables)"""
     return """
@@ -198,12 +201,45 @@ def get_css() -> str:
             background-color: #f8f9fa;
         }
         
-        tbody tr.hidden {
-            display: none;
+        .table-scroll {
+            max-height: 70vh;
+            overflow-y: auto;
+            border-radius: 8px;
+            box-shadow: 0 2px 8px rgba(0,0,0,0.1);
+        }
+        
+        .table-scroll table {
+            table-layout: fixed;
+            box-shadow: none;
+        }
+        
+        .table-scroll thead th:first-child { width: 20%; }
+        .table-scroll thead th:last-child { width: 25%; }
+        
+        .table-scroll thead th {
+            position: sticky;
+            top: 0;
+            z-index: 1;
+            background: #6f72d6;
         }
         
         tbody td {
-            padding: 12px 15px;
+            padding: 0 15px;
+            height: 44px;
+            white-space: nowrap;
+            overflow: hidden;
+            text-overflow: ellipsis;
+        }
+        
+        tbody tr.spacer td {
+            padding: 0;
+            height: auto;
+        }
+        
+        .table-status {
+            margin-top: 10px;
+            color: #666;
+            font-size: 0.9em;
         }
         
         .depth-badge {
@@ -264,6 +300,31 @@ def get_css() -> str:
             margin-top: 5px;
         }
         
+        .chart-grid {
+            display: grid;
+            grid-template-columns: repeat(auto-fit, minmax(360px, 1fr));
+            gap: 20px;
+        }
+        
+        .chart {
+            background: #f8f9fa;
+            border-radius: 8px;
+            padding: 15px;
+        }
+        
+        .chart figcaption {
+            color: #667eea;
+            font-weight: 600;
+            margin-bottom: 10px;
+        }
+        
+        .chart .bar { fill: #667eea; }
+        .chart .bar.overflow { fill: #764ba2; }
+        .chart .bar:hover { fill: #4a4fc4; }
+        .chart .axis { stroke: #999; }
+        .chart .line { fill: none; stroke: #667eea; stroke-width: 1.5; }
+        .chart text { font-size: 10px; fill: #666; }
+        
         .metric-bar {
             background: #e9ecef;
             height: 24px;
@@ -285,6 +346,24 @@ def get_css() -> str:
             font-weight: 600;
         }
         
+        .breadcrumb {
+            margin-bottom: 20px;
+            color: #666;
+        }
+        
+        .breadcrumb a, .subdirs a {
+            color: #667eea;
+            text-decoration: none;
+        }
+        
+        .breadcrumb a:hover, .subdirs a:hover {
+            text-decoration: underline;
+        }
+        
+        .subdirs {
+            margin-bottom: 40px;
+        }
+        
         footer {
             text-align: center;
             padding: 20px;
@@ -311,115 +390,260 @@ def get_css() -> str:
 def get_javascript() -> str:
     """Returns the JavaScript code (no template variables)"""
     return """
-        // Table sorting functionality
+        // The functions table is embedded as gzipped columnar JSON and
+        // only the rows scrolled into view are ever turned into DOM
+        // nodes, so the report stays responsive however many functions
+        // it holds. Sorting and filtering work on typed arrays of row
+        // indexes, using the sort orders precomputed at generation time.
+        const ROW_HEIGHT = 44;
+        const OVERSCAN = 10;
+        
+        const COLUMNS = ['max_depth', 'n_codelines', 'n_exprs', 'n_nodes', 'n_func_args', 'n_func_args_annotated', 'return_annotated'];
+        
+        const scroller = document.getElementById('tableScroll');
+        const tbody = document.querySelector('#functionsTable tbody');
+        const status = document.getElementById('tableStatus');
+        const searchBox = document.getElementById('searchBox');
+        
+        let data = null;
+        let order = null;        // Uint32Array, current sort order of all rows
+        let view = null;         // Uint32Array, rows passing search and filter
+        let activeFilter = 'all';
+        let searchTerm = '';
+        let sortColumn = null;
         let sortDirection = {};
+        let renderPending = false;
+        
+        function escapeHtml(value) {
+            return value
+                .replace(/&/g, '&amp;')
+                .replace(/</g, '&lt;')
+                .replace(/>/g, '&gt;')
+                .replace(/"/g, '&quot;')
+                .replace(/'/g, '&#39;');
+        }
+        
+        async function loadData() {
+            const encoded = document.getElementById('funcsData').textContent.trim();
+            const bytes = Uint8Array.from(atob(encoded), c => c.charCodeAt(0));
+            const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+            const raw = await new Response(stream).json();
+            
+            const columns = {};
+            for (const name of ['name', 'fpath']) {
+                columns[name] = Uint32Array.from(raw.columns[name]);
+            }
+            for (const name of COLUMNS) {
+                columns[name] = Int32Array.from(raw.columns[name]);
+            }
+            const orders = {};
+            for (const [name, values] of Object.entries(raw.orders)) {
+                orders[name] = Uint32Array.from(values);
+            }
+            
+            return {
+                n: raw.n,
+                thresholds: raw.thresholds,
+                strings: raw.strings,
+                escaped: {
+                    name: raw.strings.name.map(escapeHtml),
+                    fpath: raw.strings.fpath.map(escapeHtml),
+                },
+                columns: columns,
+                orders: orders,
+            };
+        }
+        
+        function rowPasses(row, nameMatches, pathMatches) {
+            const c = data.columns;
+            if (nameMatches !== null && !nameMatches[c.name[row]] && !pathMatches[c.fpath[row]]) {
+                return false;
+            }
+            if (activeFilter === 'deep') {
+                return c.max_depth[row] >= 3;
+            } else if (activeFilter === 'long') {
+                return c.n_codelines[row] > 30;
+            } else if (activeFilter === 'unannotated') {
+                return !c.return_annotated[row] || c.n_func_args_annotated[row] < c.n_func_args[row];
+            }
+            return true;
+        }
         
-        document.querySelectorAll('thead th.sortable').forEach(header => {
-            header.addEventListener('click', () => {
-                const column = header.dataset.column;
-                const table = document.getElementById('functionsTable');
-                const tbody = table.querySelector('tbody');
-                const rows = Array.from(tbody.querySelectorAll('tr:not(.hidden)'));
-                
-                // Toggle sort direction
-                const isAsc = sortDirection[column] === 'asc';
-                sortDirection[column] = isAsc ? 'desc' : 'asc';
-                
-                // Update header styling
-                document.querySelectorAll('thead th').forEach(th => {
-                    th.classList.remove('sorted-asc', 'sorted-desc');
-                });
-                header.classList.add(isAsc ? 'sorted-desc' : 'sorted-asc');
-                
-                // Sort rows
-                rows.sort((a, b) => {
-                    const aValue = a.dataset[column];
-                    const bValue = b.dataset[column];
+        function matchDictionary(strings) {
+            // every distinct string is tested once, rows just look it up
+            const matches = new Uint8Array(strings.length);
+            strings.forEach((value, i) => {
+                matches[i] = value.toLowerCase().includes(searchTerm) ? 1 : 0;
+            });
+            return matches;
+        }
+        
+        function rebuildView() {
+            const nameMatches = searchTerm ? matchDictionary(data.strings.name) : null;
+            const pathMatches = searchTerm ? matchDictionary(data.strings.fpath) : null;
+            const descending = sortColumn !== null && sortDirection[sortColumn] === 'desc';
+            
+            const rows = new Uint32Array(data.n);
+            let count = 0;
+            for (let i = 0; i < data.n; i++) {
+                const row = order[descending ? data.n - 1 - i : i];
+                if (rowPasses(row, nameMatches, pathMatches)) {
+                    rows[count++] = row;
+                }
+            }
+            view = rows.subarray(0, count);
+            
+            status.textContent = `Showing ${count} of ${data.n} functions`;
+            scroller.scrollTop = 0;
+            scheduleRender();
+        }
+        
+        function depthBadge(depth) {
+            let cssClass = 'depth-low';
+            if (depth >= data.thresholds.depth_high) {
+                cssClass = 'depth-high';
+            } else if (depth >= data.thresholds.depth_medium) {
+                cssClass = 'depth-medium';
+            }
+            return `<span class="depth-badge ${cssClass}">${depth}</span>`;
+        }
+        
+        function annotationIndicator(argsAnnotated, totalArgs, returnAnnotated) {
+            let indicatorClass;
+            if (totalArgs === 0) {
+                indicatorClass = returnAnnotated ? 'annotation-good' : 'annotation-bad';
+            } else if (argsAnnotated === totalArgs && returnAnnotated) {
+                indicatorClass = 'annotation-good';
+            } else if (argsAnnotated > 0 || returnAnnotated) {
+                indicatorClass = 'annotation-partial';
+            } else {
+                indicatorClass = 'annotation-bad';
+            }
+            const returnSymbol = returnAnnotated ? '✓' : '✗';
+            return `<span class="annotation-indicator ${indicatorClass}"></span>${argsAnnotated}/${totalArgs} args, return ${returnSymbol}`;
+        }
+        
+        function renderRow(row) {
+            const c = data.columns;
+            const name = data.escaped.name[c.name[row]];
+            const path = data.escaped.fpath[c.fpath[row]];
+            return `<tr>
+                <td title="${name}"><strong>${name}</strong></td>
+                <td>${depthBadge(c.max_depth[row])}</td>
+                <td>${c.n_codelines[row]}</td>
+                <td>${c.n_exprs[row]}</td>
+                <td>${c.n_nodes[row]}</td>
+                <td>${c.n_func_args[row]}</td>
+                <td>${annotationIndicator(c.n_func_args_annotated[row], c.n_func_args[row], c.return_annotated[row] === 1)}</td>
+                <td class="file-path" title="${path}">${path}</td>
+            </tr>`;
+        }
+        
+        function render() {
+            renderPending = false;
+            const first = Math.max(0, Math.floor(scroller.scrollTop / ROW_HEIGHT) - OVERSCAN);
+            const visible = Math.ceil(scroller.clientHeight / ROW_HEIGHT) + 2 * OVERSCAN;
+            const last = Math.min(view.length, first + visible);
+            
+            const parts = [`<tr class="spacer"><td colspan="8" style="height: ${first * ROW_HEIGHT}px"></td></tr>`];
+            for (let i = first; i < last; i++) {
+                parts.push(renderRow(view[i]));
+            }
+            parts.push(`<tr class="spacer"><td colspan="8" style="height: ${(view.length - last) * ROW_HEIGHT}px"></td></tr>`);
+            tbody.innerHTML = parts.join('');
+        }
+        
+        function scheduleRender() {
+            if (!renderPending) {
+                renderPending = true;
+                requestAnimationFrame(render);
+            }
+        }
+        
+        function setupControls() {
+            scroller.addEventListener('scroll', scheduleRender);
+            window.addEventListener('resize', scheduleRender);
+            
+            // Table sorting functionality
+            document.querySelectorAll('thead th.sortable').forEach(header => {
+                header.addEventListener('click', () => {
+                    const column = header.dataset.column;
                     
-                    // Try to parse as number
-                    const aNum = parseFloat(aValue);
-                    const bNum = parseFloat(bValue);
+                    // Toggle sort direction
+                    const isAsc = sortDirection[column] === 'asc';
+                    sortDirection[column] = isAsc ? 'desc' : 'asc';
+                    sortColumn = column;
+                    order = data.orders[column];
                     
-                    let comparison = 0;
-                    if (!isNaN(aNum) && !isNaN(bNum)) {
-                        comparison = aNum - bNum;
-                    } else {
-                        comparison = aValue.localeCompare(bValue);
-                    }
+                    // Update header styling
+                    document.querySelectorAll('thead th').forEach(th => {
+                        th.classList.remove('sorted-asc', 'sorted-desc');
+                    });
+                    header.classList.add(isAsc ? 'sorted-desc' : 'sorted-asc');
                     
-                    return isAsc ? -comparison : comparison;
+                    rebuildView();
                 });
-                
-                // Re-append sorted rows
-                rows.forEach(row => tbody.appendChild(row));
             });
-        });
-        
-        // Search functionality
-        const searchBox = document.getElementById('searchBox');
-        searchBox.addEventListener('input', (e) => {
-            const searchTerm = e.target.value.toLowerCase();
-            const rows = document.querySelectorAll('#functionsTable tbody tr');
             
-            rows.forEach(row => {
-                const text = row.textContent.toLowerCase();
-                if (text.includes(searchTerm)) {
-                    row.classList.remove('hidden');
-                } else {
-                    row.classList.add('hidden');
-                }
+            // Search functionality
+            searchBox.addEventListener('input', (e) => {
+                searchTerm = e.target.value.toLowerCase();
+                rebuildView();
             });
-        });
-        
-        // Filter functionality
-        document.querySelectorAll('.filter-btn').forEach(btn => {
-            btn.addEventListener('click', () => {
-                // Update active state
-                document.querySelectorAll('.filter-btn').forEach(b => b.classList.remove('active'));
-                btn.classList.add('active');
-                
-                const filter = btn.dataset.filter;
-                const rows = document.querySelectorAll('#functionsTable tbody tr');
-                
-                rows.forEach(row => {
-                    const depth = parseInt(row.dataset.max_depth);
-                    const lines = parseInt(row.dataset.n_codelines);
-                    const argsAnnotated = parseInt(row.dataset.n_func_args_annotated);
-                    const totalArgs = parseInt(row.dataset.n_func_args);
-                    const returnAnnotated = row.dataset.return_annotated === 'true';
-                    
-                    let show = true;
+            
+            // Filter functionality
+            document.querySelectorAll('.filter-btn').forEach(btn => {
+                btn.addEventListener('click', () => {
+                    // Update active state
+                    document.querySelectorAll('.filter-btn').forEach(b => b.classList.remove('active'));
+                    btn.classList.add('active');
                     
-                    if (filter === 'deep') {
-                        show = depth >= 3;
-                    } else if (filter === 'long') {
-                        show = lines > 30;
-                    } else if (filter === 'unannotated') {
-                        show = !returnAnnotated || argsAnnotated < totalArgs;
-                    }
+                    activeFilter = btn.dataset.filter;
                     
-                    if (show) {
-                        row.classList.remove('hidden');
-                    } else {
-                        row.classList.add('hidden');
-                    }
+                    // Clear search when filtering
+                    searchBox.value = '';
+                    searchTerm = '';
+                    rebuildView();
                 });
-                
-                // Clear search when filtering
-                searchBox.value = '';
             });
-        });
+            
+            // Set "All" filter as active by default
+            document.querySelector('.filter-btn[data-filter="all"]').classList.add('active');
+        }
         
-        // Set "All" filter as active by default
-        document.querySelector('.filter-btn[data-filter="all"]').classList.add('active');
+        loadData().then(loaded => {
+            data = loaded;
+            // rows come already sorted by depth, descending
+            order = new Uint32Array(data.n);
+            for (let i = 0; i < data.n; i++) {
+                order[i] = i;
+            }
+            setupControls();
+            rebuildView();
+        });
     """
 
-def get_html_template(timestamp: str, summary_cards: str, tech_debt_items: str, table_rows: str) -> str:
+def get_html_template(timestamp: str, summary_cards: str, tech_debt_items: str, charts: str, table_data: str) -> str:
     """Returns the complete HTML document"""
+    return "".join(iter_html_template(timestamp, summary_cards, tech_debt_items, charts, [table_data]))
+
+
+def iter_html_template(timestamp: str, summary_cards: str, tech_debt_items: str, charts: str, table_data: Iterable[str], navigation: str = "", trends: str = "") -> Iterator[str]:
+    """Yields the complete HTML document in chunks, table_data being streamed in between"""
     css = get_css()
     js = get_javascript()
+    if trends:
+        trends = f"""
+            <!-- Trends Section -->
+            <section id="trends">
+                <h2>Trends</h2>
+                <div class="chart-grid">
+                    {trends}
+                </div>
+            </section>
+            """
     
-    return f"""<!DOCTYPE html>
+    yield f"""<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -436,6 +660,7 @@ def get_html_template(timestamp: str, summary_cards: str, tech_debt_items: str,
         </header>
         
         <div class="content">
+            {navigation}
             <!-- Summary Section -->
             <section id="summary">
                 <h2>Summary Statistics</h2>
@@ -450,6 +675,14 @@ def get_html_template(timestamp: str, summary_cards: str, tech_debt_items: str,
                 {tech_debt_items}
             </section>
             
+            <!-- Distributions Section -->
+            <section id="distributions">
+                <h2>Distributions</h2>
+                <div class="chart-grid">
+                    {charts}
+                </div>
+            </section>
+            {trends}
             <!-- Functions Table -->
             <section id="functions">
                 <h2>All Functions</h2>
@@ -460,6 +693,7 @@ def get_html_template(timestamp: str, summary_cards: str, tech_debt_items: str,
                     <button class="filter-btn" data-filter="long">Long Functions</button>
                     <button class="filter-btn" data-filter="unannotated">Missing Annotations</button>
                 </div>
+                <div class="table-scroll" id="tableScroll">
                 <table id="functionsTable">
                     <thead>
                         <tr>
@@ -473,10 +707,13 @@ def get_html_template(timestamp: str, summary_cards: str, tech_debt_items: str,
                             <th>File Path</th>
                         </tr>
                     </thead>
-                    <tbody>
-                        {table_rows}
-                    </tbody>
+                    <tbody></tbody>
                 </table>
+                </div>
+                <div class="table-status" id="tableStatus"></div>
+                <script type="application/octet-stream" id="funcsData">"""
+    yield from table_data
+    yield f"""</script>
             </section>
         </div>
         
@@ -0,0 +1,207 @@
+'''
+declarative tech-debt rules
+
+a rule is a SQL filter over the functions, plus how to rank what it
+finds and how many findings to keep. rules are read from a TOML file
+like:
+
+    [[rules]]
+    name = "critical"
+    title = "Critical"
+    severity = "critical"
+    icon = "🔴"
+    where = "max_stmt_depth >= 5 and n_codelines > 50"
+    rank_by = "max_stmt_depth"
+    limit = 10
+    message = "Deep nesting ({max_stmt_depth}) + Long function ({n_codelines} lines)"
+
+all the rules are compiled into a single lazy plan, which scans the
+functions once and ranks the findings of every rule with a top_k (no
+full sort), so adding rules doesn't add passes over the data. the
+findings come out as one dataframe shared by the reporter and the
+query subcommand
+'''
+
+import string
+import tomllib
+from pathlib import Path
+from typing import Literal
+
+import polars as pl
+from pydantic import BaseModel
+
+from morthal.utils.df import decode_strings
+
+
+class Rule(BaseModel):
+    name: str
+    # SQL filter expression over the functions columns
+    where: str
+    title: str
+    # "{column}" placeholders are filled with the values of the finding
+    message: str = ''
+    # findings with the highest (or lowest) values come first, in the
+    # order of the source when not ranked
+    rank_by: str | None = None
+    descending: bool = True
+    limit: int = 10
+    severity: Literal['critical', 'warning', 'info'] = 'warning'
+    icon: str = '⚠️'
+
+
+FINDINGS_SCHEMA = {
+    'rule': pl.Utf8,
+    'severity': pl.Utf8,
+    'icon': pl.Utf8,
+    'title': pl.Utf8,
+    'name': pl.Utf8,
+    'fpath': pl.Utf8,
+    'message': pl.Utf8,
+    'value': pl.Float64,
+}
+
+
+def default_rules(
+    depth_high: int = 5,
+    lines_long: int = 50,
+    complexity_high: int = 100,
+) -> list[Rule]:
+    return [
+        Rule(
+            name='critical',
+            title='Critical',
+            severity='critical',
+            icon='🔴',
+            where=f'max_stmt_depth >= {depth_high} and n_codelines > {lines_long}',
+            rank_by='max_stmt_depth',
+            limit=10,
+            message='Deep nesting ({max_stmt_depth}) + Long function ({n_codelines} lines)',
+        ),
+        Rule(
+            name='high_complexity',
+            title='High Complexity',
+            where=f'n_nodes > {complexity_high}',
+            rank_by='n_nodes',
+            limit=5,
+            message='{n_nodes} AST nodes, {n_exprs} expressions',
+        ),
+        Rule(
+            name='no_type_hints',
+            title='No Type Hints',
+            icon='📝',
+            where='not return_annotated and n_func_args_annotated = 0 and n_func_args > 0',
+            limit=5,
+            message='{n_func_args} arguments, 0 annotations',
+        ),
+    ]
+
+
+def load_rules(path: Path | None = None) -> list[Rule]:
+    '''
+    the rules of a TOML file, the default ones without a file
+    '''
+    if path is None:
+        return default_rules()
+    data = tomllib.loads(Path(path).read_text(encoding='utf-8'))
+    return [Rule(**rule) for rule in data.get('rules', [])]
+
+
+def evaluate_rules(rules: list[Rule], lf: pl.LazyFrame) -> pl.LazyFrame:
+    '''
+    the findings of all the rules, one row per rule and function, as
+    a single lazy plan over lf
+
+    the rows matching any rule are selected in one filter (pushed down
+    to the scan), paired with the rules they match, and each rule keeps
+    its top findings through a top_k over a ranking key which is
+    computed per rule, so that lf is scanned once however many rules
+    there are
+    '''
+    if not rules:
+        return pl.LazyFrame(schema=FINDINGS_SCHEMA)
+
+    matches = [pl.sql_expr(rule.where) for rule in rules]
+    rule_idx = pl.col('_rule')
+
+    def per_rule(exprs: list[pl.Expr]) -> pl.Expr:
+        expr = pl.when(rule_idx == 0).then(exprs[0])
+        for i, e in enumerate(exprs[1:], start=1):
+            expr = expr.when(rule_idx == i).then(e)
+        return expr
+
+    # the higher the key the earlier the finding, unranked rules keep
+    # the order of lf
+    keys = [
+        pl.lit(0.0) if rule.rank_by is None
+        else pl.col(rule.rank_by).cast(pl.Float64) * (1 if rule.descending else -1)
+        for rule in rules
+    ]
+    limits = [rule.limit for rule in rules]
+    # only the columns shown by the findings go through the ranking
+    columns = {'name', 'fpath'}
+    for rule in rules:
+        columns.update(_message_fields(rule.message))
+        if rule.rank_by is not None:
+            columns.add(rule.rank_by)
+
+    return (
+        decode_strings(lf)
+        .filter(pl.any_horizontal(matches))
+        # numbered after the filter, which would not be pushed down
+        # otherwise. the order of the rows is the same
+        .with_row_index('_row')
+        .with_columns(
+            pl.concat_list(
+                pl.when(match).then(pl.lit(i, dtype=pl.UInt32)) for i, match in enumerate(matches)
+            ).list.drop_nulls().alias('_rule')
+        )
+        .explode('_rule')
+        .select('_rule', '_row', per_rule(keys).alias('_key'), *sorted(columns))
+        .group_by('_rule')
+        .agg(pl.all().top_k_by(['_key', '_row'], k=max(limits), reverse=[False, True]))
+        .explode(pl.all().exclude('_rule'))
+        .filter(pl.int_range(pl.len()).over('_rule') < per_rule([pl.lit(limit) for limit in limits]))
+        .sort('_rule', '_key', '_row', descending=[False, True, False])
+        .select(
+            per_rule([pl.lit(rule.name) for rule in rules]).alias('rule'),
+            per_rule([pl.lit(rule.severity) for rule in rules]).alias('severity'),
+            per_rule([pl.lit(rule.icon) for rule in rules]).alias('icon'),
+            per_rule([pl.lit(rule.title) for rule in rules]).alias('title'),
+            pl.col('name').cast(pl.Utf8),
+            pl.col('fpath').cast(pl.Utf8),
+            per_rule([_message_expr(rule.message) for rule in rules]).alias('message'),
+            per_rule([
+                pl.lit(None, dtype=pl.Float64) if rule.rank_by is None
+                else pl.col(rule.rank_by).cast(pl.Float64)
+                for rule in rules
+            ]).alias('value'),
+        )
+    )
+
+
+def _parse_message(message: str) -> list[tuple[str, str | None]]:
+    '''
+    (literal text, column name or None) pairs of a message template
+    '''
+    parts = []
+    for literal, field, spec, conversion in string.Formatter().parse(message):
+        if field is not None and (not field or spec or conversion):
+            raise ValueError(f'only plain {{column}} placeholders are supported, got {message!r}')
+        parts.append((literal, field))
+    return parts
+
+
+def _message_fields(message: str) -> list[str]:
+    return [field for _, field in _parse_message(message) if field is not None]
+
+
+def _message_expr(message: str) -> pl.Expr:
+    parts: list[pl.Expr] = []
+    for literal, field in _parse_message(message):
+        if literal:
+            parts.append(pl.lit(literal))
+        if field is not None:
+            parts.append(pl.col(field).cast(pl.Utf8))
+    if not parts:
+        return pl.lit('')
+    return pl.concat_str(parts)
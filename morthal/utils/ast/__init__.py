@@ -1,5 +1,11 @@
+from __future__ import annotations
+
 import ast
 from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Callable
+
+if TYPE_CHECKING:
+    from morthal.analyze.plugin import PluginSet
 
 
 @dataclass
@@ -78,6 +84,10 @@ def enrich(
     depth: int = 0,
     node_sink: NodeSink | None = None,
     cpf: ModCounts | None = None,
+    node_depths: bool = True,
+    stmt_depths: bool = True,
+    plugins: PluginSet | None = None,
+    prune: Callable[[ast.AST], bool] | None = None,
 ):
     '''
     enrich shall augment an abstract syntax tree with several
@@ -102,6 +112,25 @@ def enrich(
     anyways a second node traversal is necessary to then retrieve
     the eldens, so maybe it could become smart at one point to just
     store theme in a buffer passed on from invocation to invocation
+
+    node_depths and stmt_depths turn off the tracking of the
+    relative depths of the nodes and of the statements, for when the
+    metrics computed from them are not wanted: eldens then get no
+    depth lists at all
+
+    plugins get every node dispatched to their hooks, with the
+    accumulators of the function the node belongs to. those are
+    attached to the functions as the plugin_scopes attribute
+
+    prune is asked about every function, once the function node itself
+    is enriched: when it returns True the body of the function is not
+    visited, which is how the stats of functions already known are
+    reused. the functions which are visited get the subtree_counts
+    attribute, the (nodes, statements) below them as counted in cpf
+
+    classes and functions get the qualname attribute, their qualified
+    name inside the module as in __qualname__ ("C.f", "f.<locals>.g"),
+    made from the one of their elden
     '''
     if not skip_depth_aug(ast_node=ast_node, parent=parent):
         depth += 1
@@ -121,22 +150,32 @@ def enrich(
     # updating elden depths in case there is actually an elden
     if elden:
         relative_depth = depth - elden.depth
-        elden.relative_node_depths.append(relative_depth)
-        if isinstance(ast_node, ast.stmt):
+        if node_depths:
+            elden.relative_node_depths.append(relative_depth)
+        if stmt_depths and isinstance(ast_node, ast.stmt):
             elden.relative_expr_depths.append(relative_depth)
             
             elden_col_offset = 0 if isinstance(elden, ast.Module) else elden.col_offset
 
             elden.relative_stmt_depths.append(ast_node.col_offset - elden_col_offset)
 
+    if plugins is not None and elden is not None and hasattr(elden, 'plugin_scopes'):
+        plugins.visit(ast_node, elden.plugin_scopes)
+
     # updating elden in case the node type is of type elden
     if any(isinstance(ast_node, elden_type) for elden_type in ELDEN_TYPES):
         # make ast_node an elden, which basically means
         # adding some list attributes to let depths be appended
         # to it
-        ast_node.relative_node_depths = []
-        ast_node.relative_expr_depths = []
-        ast_node.relative_stmt_depths = []
+        if node_depths:
+            ast_node.relative_node_depths = []
+        if stmt_depths:
+            ast_node.relative_expr_depths = []
+            ast_node.relative_stmt_depths = []
+        if plugins is not None and isinstance(ast_node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            ast_node.plugin_scopes = plugins.new_scopes()
+        if not isinstance(ast_node, ast.Module):
+            ast_node.qualname = scope_qualname(ast_node.name, elden)
         # set elden to the ast_node
         elden = ast_node
 
@@ -159,6 +198,12 @@ def enrich(
             cpf.total_stmt_depth += ast_node.col_offset#  - elden_col_offset
 
 
+    is_func = isinstance(ast_node, (ast.FunctionDef, ast.AsyncFunctionDef))
+    if is_func and prune is not None and prune(ast_node):
+        return
+    if is_func and cpf is not None:
+        n_nodes_before, n_stmts_before = cpf.n_nodes, cpf.n_stmts
+
     # recursive step: for every child of the current node, invoke
     # enrich on it
     for ast_child in ast.iter_child_nodes(ast_node):
@@ -170,8 +215,27 @@ def enrich(
             depth=depth,
             node_sink=node_sink,
             cpf=cpf,
+            node_depths=node_depths,
+            stmt_depths=stmt_depths,
+            plugins=plugins,
+            prune=prune,
         )
 
+    if is_func and cpf is not None:
+        ast_node.subtree_counts = (cpf.n_nodes - n_nodes_before, cpf.n_stmts - n_stmts_before)
+
+
+def scope_qualname(name: str, elden: ast.AST | None) -> str:
+    '''
+    qualified name of the class or function called name, whose elden is
+    the given one: functions hold their nested scopes in "<locals>"
+    '''
+    if elden is None or isinstance(elden, ast.Module):
+        return name
+    if isinstance(elden, ast.ClassDef):
+        return f'{elden.qualname}.{name}'
+    return f'{elden.qualname}.<locals>.{name}'
+
 
 def identify_tab_offset(ast_expr: ast.stmt) -> int:
     '''
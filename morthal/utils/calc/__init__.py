@@ -8,4 +8,18 @@ def max_and_avg(l: list[int]) -> tuple[int, float]:
     
     avg = sm / len(l)
 
-    return mx, avg
\ No newline at end of file
+    return mx, avg
+
+
+def histogram(l: list[int], n_bins: int, scale: int = 1) -> list[int]:
+    '''
+    counts of the values of l divided by scale, the last bin also
+    counting everything beyond it
+    '''
+    counts = [0] * n_bins
+    last = n_bins - 1
+
+    for elem in l:
+        counts[min(elem // scale, last)] += 1
+
+    return counts
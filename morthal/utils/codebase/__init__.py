@@ -3,7 +3,6 @@ import tempfile
 from pathlib import Path
 from typing import Protocol
 
-from morthal.history import clone_repo
 from morthal.utils.url import normalize_url
 
 
@@ -51,7 +50,9 @@ class GitCodebase:
         self._tmpdir = tempfile.mkdtemp(prefix='morthal_')
         self._target_path = Path(self._tmpdir) / 'repo'
         
-        clone_repo(normalize_url(url), self._target_path)
+        # git is only needed, and thus imported, when cloning
+        from morthal.history import clone_repo
+        clone_repo(self._url, self._target_path)
 
     def dispose(self) -> None:
         shutil.rmtree(self._tmpdir, ignore_errors=True)
@@ -1,21 +1,39 @@
 import datetime
 import types
 import typing
-from typing import get_args, get_origin
+from typing import Annotated, get_args, get_origin
 
 import polars as pl
 from pydantic import BaseModel
 
 
 def pydantic_to_polars_schema(model: type[BaseModel]) -> dict[str, pl.DataType]:
-    """Build a Polars schema dict from a Pydantic BaseModel class."""
+    """Build a Polars schema dict from a Pydantic BaseModel class.
+
+    A field may narrow its dtype with a width hint, a Polars dtype in its
+    Annotated metadata, e.g. ``depth: Annotated[int, pl.UInt8]``.
+    """
     schema = {}
     for name, field in model.model_fields.items():
-        schema[name] = _map_type(field.annotation)
+        hint = _width_hint(field.metadata)
+        schema[name] = hint if hint is not None else _map_type(field.annotation)
     return schema
 
 
+def _width_hint(metadata: list) -> pl.DataType | None:
+    for meta in metadata:
+        if isinstance(meta, pl.DataType) or (isinstance(meta, type) and issubclass(meta, pl.DataType)):
+            return meta
+    return None
+
+
 def _map_type(annotation) -> pl.DataType:
+    # Annotated[X, <polars dtype>] nested in a union or a list
+    if get_origin(annotation) is Annotated:
+        base, *metadata = get_args(annotation)
+        hint = _width_hint(metadata)
+        return hint if hint is not None else _map_type(base)
+
     # Unwrap Optional[X] / X | None
     origin = get_origin(annotation)
     if origin is typing.Union or origin is types.UnionType:
@@ -54,4 +72,36 @@ def _map_type(annotation) -> pl.DataType:
 
 
 def empty_df_from_model(model: type[BaseModel]) -> pl.DataFrame:
-    return pl.DataFrame(schema=pydantic_to_polars_schema(model))
\ No newline at end of file
+    return pl.DataFrame(schema=pydantic_to_polars_schema(model))
+
+
+def decode_strings(frame: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame | pl.LazyFrame:
+    """Dictionary encoded (Categorical/Enum) columns as plain strings.
+
+    String operations, ranks and hashes of dictionary encoded columns
+    work on the codes, which depend on the order the strings were met.
+    """
+    import polars.selectors as cs
+
+    return frame.with_columns((cs.categorical() | cs.enum()).cast(pl.Utf8))
+
+
+def hist_quantile(hist: str | pl.Expr, q: float) -> pl.Expr:
+    """Quantile of the values counted by a histogram column.
+
+    Args:
+        hist: Array (or List) column of counts, or its name, bin i
+            counting the value i.
+        q: Quantile, between 0 and 1.
+
+    Returns:
+        The lowest bin whose cumulative count reaches q of the total,
+        0 for empty histograms.
+    """
+    if isinstance(hist, str):
+        hist = pl.col(hist)
+    return (
+        hist.cast(pl.List(pl.UInt32))
+        .list.eval((pl.element().cum_sum() >= q * pl.element().sum()).arg_max())
+        .list.first()
+    )
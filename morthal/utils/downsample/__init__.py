@@ -0,0 +1,111 @@
+'''
+downsampling of time series for charts
+
+a chart a few hundred pixels wide can't show 50k points anyway, so
+series are reduced to a few thousand points at most before being drawn.
+both methods return the indexes of the points to keep (sorted, first
+and last point always included), so that any column of the series can
+be picked with them:
+
+- minmax keeps the lowest and the highest point of every bucket, so no
+  spike is ever lost. vectorized by polars
+- lttb (largest triangle three buckets) keeps from every bucket the
+  point forming the largest triangle with the previously kept point
+  and the average of the next bucket, which follows the visual shape
+  of the series with a single point per bucket
+'''
+
+import polars as pl
+
+
+DOWNSAMPLE_METHODS = ['minmax', 'lttb']
+
+
+def minmax_indexes(y: pl.Series, n_out: int) -> list[int]:
+    '''
+    indexes of the min and max point of n_out // 2 buckets of equal
+    size, at most n_out indexes are returned
+    '''
+    n = len(y)
+    if n <= n_out or n_out < 4:
+        return list(range(n))
+
+    n_buckets = (n_out - 2) // 2
+    kept = (
+        pl.DataFrame({'y': y})
+        .with_row_index('i')
+        .slice(1, n - 2)
+        .with_columns(((pl.col('i') - 1) * n_buckets // (n - 2)).alias('bucket'))
+        .group_by('bucket')
+        .agg(
+            pl.col('i').get(pl.col('y').arg_min()).alias('lo'),
+            pl.col('i').get(pl.col('y').arg_max()).alias('hi'),
+        )
+        .select(pl.concat_list('lo', 'hi').explode().unique().sort())
+    )
+    return [0] + kept.to_series().drop_nulls().to_list() + [n - 1]
+
+
+def lttb_indexes(x: pl.Series, y: pl.Series, n_out: int) -> list[int]:
+    '''
+    indexes of the n_out points chosen by the largest triangle three
+    buckets algorithm (Steinarsson, 2013). x must be sorted
+    '''
+    n = len(y)
+    if n <= n_out or n_out < 3:
+        return list(range(n))
+
+    xs = x.to_physical().cast(pl.Float64).to_list()
+    ys = y.cast(pl.Float64).fill_null(0.0).to_list()
+
+    # the first and last points are kept, the others are split in
+    # n_out - 2 buckets
+    bucket_size = (n - 2) / (n_out - 2)
+    kept = [0]
+    a = 0
+    for b in range(n_out - 2):
+        start = int(b * bucket_size) + 1
+        end = int((b + 1) * bucket_size) + 1
+
+        # average point of the next bucket (the last point for the last one)
+        next_start = end
+        next_end = min(int((b + 2) * bucket_size) + 1, n)
+        if next_start >= n - 1:
+            avg_x, avg_y = xs[n - 1], ys[n - 1]
+        else:
+            span = next_end - next_start
+            avg_x = sum(xs[next_start:next_end]) / span
+            avg_y = sum(ys[next_start:next_end]) / span
+
+        ax, ay = xs[a], ys[a]
+        best, best_area = start, -1.0
+        for i in range(start, end):
+            # twice the triangle area, which compares the same
+            area = abs((ax - avg_x) * (ys[i] - ay) - (ax - xs[i]) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = i, area
+        kept.append(best)
+        a = best
+
+    kept.append(n - 1)
+    return kept
+
+
+def downsample(
+    df: pl.DataFrame,
+    x: str,
+    y: str,
+    n_out: int,
+    method: str = 'minmax',
+) -> pl.DataFrame:
+    '''
+    the rows of df (sorted by x) which are kept when reducing y to
+    n_out points
+    '''
+    if method == 'minmax':
+        indexes = minmax_indexes(df[y], n_out)
+    elif method == 'lttb':
+        indexes = lttb_indexes(df[x], df[y], n_out)
+    else:
+        raise ValueError(f'unknown downsampling method {method!r}, expected one of {DOWNSAMPLE_METHODS}')
+    return df[indexes]
@@ -2,7 +2,7 @@
 utilities for path
 '''
 
-from pathlib import Path
+from pathlib import Path, PurePath
 from typing import Generator
 
 
@@ -12,4 +12,22 @@ def iter_pyfiles(root_path: Path) -> Generator[Path, None, None]:
             for pyfile in iter_pyfiles(elem):
                 yield pyfile
         elif elem.is_file() and elem.name.endswith('.py'):
-            yield elem
\ No newline at end of file
+            yield elem
+
+def module_name(local_path: str | PurePath) -> str:
+    '''
+    dotted name of the module at the given path, relative to the root
+    of the codebase: "pkg/mod.py" is "pkg.mod" and "pkg/__init__.py"
+    is "pkg". the __init__.py at the root gets an empty name
+    '''
+    parts = list(PurePath(local_path).with_suffix('').parts)
+    if parts and parts[-1] == '__init__':
+        parts.pop()
+    return '.'.join(parts)
+
+
+def qualify(module: str, qualname: str) -> str:
+    '''
+    fully qualified name of something called qualname inside module
+    '''
+    return f'{module}.{qualname}' if module else qualname
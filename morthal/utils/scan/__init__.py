@@ -0,0 +1,308 @@
+'''
+token based scanner of python modules
+
+when only the lines and the statement indentation of the functions
+are wanted, building the abstract syntax tree and enriching every node
+of it is mostly wasted work: all of that can be read from the token
+stream. scan_module walks the tokens once, logical line by logical
+line, and yields for every function the same values enrich and
+identify_tab_offset would yield from the tree:
+
+- lineno and end_lineno, end_lineno being the last line holding a
+  token of the function body, and the first line of its decorators
+- the column offsets of the statements whose elden is the function,
+  relative to the column of the function itself
+- the qualified name of the function inside the module, as the
+  qualname enrich attaches to it
+- the number of statements and the tab offset of the module
+
+statements are found at the start of the logical lines, after the
+colon of a compound statement header and after semicolons. anything
+the token stream can't tell for sure (soft keywords like match, form
+feeds, columns of non-ascii lines) raises AmbiguousSource, upon which
+the caller is expected to fall back to the tree
+'''
+
+import io
+import tokenize
+from dataclasses import dataclass, field
+
+
+class AmbiguousSource(Exception):
+    pass
+
+
+@dataclass
+class ScannedFunc:
+    name: str
+    parent_name: str | None
+    lineno: int
+    end_lineno: int
+    col_offset: int
+    # line of the first decorator, lineno when there are none
+    first_lineno: int
+    # as in __qualname__, like "C.f" or "f.<locals>.g"
+    qualname: str
+    # same as the relative_stmt_depths enrich attaches to eldens
+    relative_stmt_depths: list[int] = field(default_factory=lambda:[])
+
+
+@dataclass
+class ScannedModule:
+    # in order of appearance, as in NodeSink.funcs
+    funcs: list[ScannedFunc]
+    n_stmts: int
+    tab_offset: int
+
+
+# keywords starting a compound statement, which has a header ending
+# with a colon and a body
+COMPOUND_KEYWORDS = {'if', 'elif', 'while', 'for', 'with', 'try', 'def', 'class', 'async'}
+# keywords of the clauses of compound statements, which aren't
+# statements on their own (elif is, as it stands for a nested if)
+CLAUSE_KEYWORDS = {'else', 'except', 'finally'}
+# soft keywords, which can start a statement or be plain names
+SOFT_KEYWORDS = {'match', 'case', 'type'}
+
+_SKIPPED_TOKENS = {
+    tokenize.NL,
+    tokenize.COMMENT,
+    tokenize.INDENT,
+    tokenize.DEDENT,
+    tokenize.ENCODING,
+}
+
+
+@dataclass
+class _Scope:
+    # "def" or "class", the eldens being tracked
+    kind: str
+    name: str
+    qualname: str
+    col: int
+    func: ScannedFunc | None = None
+
+
+def scan_module(source: str) -> ScannedModule:
+    if '\f' in source:
+        raise AmbiguousSource('form feed')
+
+    scanner = _Scanner()
+    line: list[tokenize.TokenInfo] = []
+    try:
+        for tok in tokenize.generate_tokens(io.StringIO(source).readline):
+            if tok.type in _SKIPPED_TOKENS:
+                continue
+            if tok.type in (tokenize.NEWLINE, tokenize.ENDMARKER):
+                if line:
+                    scanner.logical_line(line)
+                    line = []
+                continue
+            line.append(tok)
+    except (tokenize.TokenError, SyntaxError) as e:
+        raise AmbiguousSource(str(e)) from e
+
+    scanner.close_scopes(-1)
+    return ScannedModule(
+        funcs=scanner.funcs,
+        n_stmts=scanner.n_stmts,
+        tab_offset=scanner.tab_offset or 0,
+    )
+
+
+class _Scanner:
+    def __init__(self) -> None:
+        self.funcs: list[ScannedFunc] = []
+        self.scopes: list[_Scope] = []
+        self.n_stmts = 0
+        self.tab_offset: int | None = None
+        # set after the header of the first compound statement of the
+        # module, whose first child statement gives the tab offset
+        self.awaiting_tab_offset = False
+        # last line holding a token, which ends the scopes closed by
+        # the next logical line
+        self.last_row = 0
+        # first line of the decorators of the next def or class
+        self.decorator_row: int | None = None
+
+    def close_scopes(self, col: int) -> None:
+        '''
+        a logical line starting at col ends the bodies of the scopes
+        whose header is at col or deeper
+        '''
+        while self.scopes and self.scopes[-1].col >= col:
+            scope = self.scopes.pop()
+            if scope.func is not None:
+                scope.func.end_lineno = self.last_row
+
+    def logical_line(self, tokens: list[tokenize.TokenInfo]) -> None:
+        first = tokens[0]
+        self.close_scopes(first.start[1])
+
+        if self.awaiting_tab_offset:
+            self.tab_offset = first.start[1]
+            self.awaiting_tab_offset = False
+
+        if first.type == tokenize.NAME and first.string in SOFT_KEYWORDS \
+                and not _is_plain_name(tokens):
+            raise AmbiguousSource(f'line {first.start[0]} starts with {first.string!r}')
+
+        # decorators belong to the following def or class
+        if first.string == '@':
+            if self.decorator_row is None:
+                self.decorator_row = first.start[0]
+        else:
+            self.statements(tokens, 0)
+
+        self.last_row = tokens[-1].end[0]
+
+    def statements(self, tokens: list[tokenize.TokenInfo], i: int) -> None:
+        '''
+        the statements of tokens[i:], which are either a compound
+        statement header (plus its inline body) or simple statements
+        separated by semicolons
+        '''
+        while i < len(tokens):
+            tok = tokens[i]
+            is_line_start = i == 0
+            keyword = tok.string if tok.type == tokenize.NAME else None
+
+            if keyword not in CLAUSE_KEYWORDS:
+                self.statement(tok, is_line_start)
+
+            if keyword in COMPOUND_KEYWORDS or keyword in CLAUSE_KEYWORDS:
+                self.compound(tokens, i, is_line_start)
+                return
+
+            i = _next_statement(tokens, i)
+
+    def statement(self, tok: tokenize.TokenInfo, is_line_start: bool) -> None:
+        self.n_stmts += 1
+        col = tok.start[1] if is_line_start else _byte_col(tok)
+
+        # statements are counted by their elden, which is the innermost
+        # def or class (the module when there is none)
+        if self.scopes and self.scopes[-1].func is not None:
+            func = self.scopes[-1].func
+            func.relative_stmt_depths.append(col - func.col_offset)
+
+    def compound(self, tokens: list[tokenize.TokenInfo], i: int, is_line_start: bool) -> None:
+        tok = tokens[i]
+        col = tok.start[1] if is_line_start else _byte_col(tok)
+        keyword = tok.string
+        if keyword == 'async':
+            keyword = tokens[i + 1].string if i + 1 < len(tokens) else keyword
+
+        scope = None
+        if keyword in ('def', 'class'):
+            name_tok = tokens[i + 2] if tok.string == 'async' else tokens[i + 1]
+            parent = self.scopes[-1] if self.scopes else None
+            parent_name = parent.name if parent is not None else None
+            qualname = _scope_qualname(name_tok.string, parent)
+            first_lineno = self.decorator_row or tok.start[0]
+            self.decorator_row = None
+            func = None
+            if keyword == 'def':
+                func = ScannedFunc(
+                    name=name_tok.string,
+                    parent_name=parent_name,
+                    lineno=tok.start[0],
+                    end_lineno=tok.start[0],
+                    col_offset=col,
+                    first_lineno=first_lineno,
+                    qualname=qualname,
+                )
+                self.funcs.append(func)
+            scope = _Scope(kind=keyword, name=name_tok.string, qualname=qualname, col=col, func=func)
+            self.scopes.append(scope)
+
+        # the first compound statement of the module gives the tab
+        # offset, through the column of its first child statement
+        gives_tab_offset = (
+            self.tab_offset is None and not self.awaiting_tab_offset
+            and is_line_start and col == 0
+        )
+        colon = _header_colon(tokens, i)
+
+        if colon + 1 < len(tokens):
+            # inline body, which ends with the line
+            if gives_tab_offset:
+                self.tab_offset = _byte_col(tokens[colon + 1])
+            self.statements(tokens, colon + 1)
+            if scope is not None:
+                self.scopes.remove(scope)
+                if scope.func is not None:
+                    scope.func.end_lineno = tokens[-1].end[0]
+        elif gives_tab_offset:
+            self.awaiting_tab_offset = True
+
+
+def _scope_qualname(name: str, parent: _Scope | None) -> str:
+    # the same as morthal.utils.ast.scope_qualname
+    if parent is None:
+        return name
+    if parent.kind == 'class':
+        return f'{parent.qualname}.{name}'
+    return f'{parent.qualname}.<locals>.{name}'
+
+
+def _is_plain_name(tokens: list[tokenize.TokenInfo]) -> bool:
+    '''
+    whether the soft keyword starting the line is used as a name, as in
+    "match = ..." or "type.mro()". an operator which could start an
+    expression, as in "match (x):" or "case [y]:", doesn't tell
+    '''
+    if len(tokens) == 1:
+        return True
+    second = tokens[1]
+    return second.type == tokenize.OP and second.string not in ('(', '[', '{', '-', '+', '~', '*')
+
+
+def _next_statement(tokens: list[tokenize.TokenInfo], i: int) -> int:
+    '''
+    index of the token after the semicolon ending the simple statement
+    starting at i, len(tokens) when it ends the line
+    '''
+    depth = 0
+    for j in range(i, len(tokens)):
+        tok = tokens[j]
+        if tok.type != tokenize.OP:
+            continue
+        if tok.string in '([{':
+            depth += 1
+        elif tok.string in ')]}':
+            depth -= 1
+        elif tok.string == ';' and depth == 0:
+            return j + 1
+    return len(tokens)
+
+
+def _header_colon(tokens: list[tokenize.TokenInfo], i: int) -> int:
+    '''
+    index of the colon ending the compound statement header starting
+    at i, skipping the colons of brackets and lambdas
+    '''
+    depth = 0
+    lambdas = 0
+    for j in range(i, len(tokens)):
+        tok = tokens[j]
+        if tok.type == tokenize.NAME and tok.string == 'lambda' and depth == 0:
+            lambdas += 1
+        if tok.type != tokenize.OP:
+            continue
+        if tok.string in '([{':
+            depth += 1
+        elif tok.string in ')]}':
+            depth -= 1
+        elif tok.string == ':' and depth == 0:
+            if lambdas == 0:
+                return j
+            lambdas -= 1
+    raise AmbiguousSource(f'no colon ending the header at line {tokens[i].start[0]}')
+
+
+def _byte_col(tok: tokenize.TokenInfo) -> int:
+    # the tree counts columns in utf-8 bytes, tokens in characters
+    if not tok.line.isascii():
+        raise AmbiguousSource(f'non ascii line {tok.start[0]}')
+    return tok.start[1]
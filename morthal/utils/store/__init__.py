@@ -1,33 +1,98 @@
+from __future__ import annotations
+
 import json
 from datetime import datetime
 from pathlib import Path
+from typing import TYPE_CHECKING
+
+# a store is opened on every run, while its content is loaded only by
+# some of them, so polars, pyarrow and the models are imported on use
+if TYPE_CHECKING:
+    import polars as pl
+
+    from morthal.analyze.index import FuncsIndex, NameIndex
+    from morthal.analyze.recap import CodeRecap
+    from morthal.analyze.rollup import Rollups
+
 
-import polars as pl
+# zstd compresses the narrow integer columns well, and the min/max
+# statistics of row groups of 16k rows let filtered scans skip the
+# groups which can't match. functions are written in file order, so
+# file ids in particular come in tight ranges per group
+PARQUET_OPTIONS = {
+    "compression": "zstd",
+    "compression_level": 3,
+    "statistics": True,
+    "row_group_size": 16_384,
+}
 
-from morthal.analyze.recap import CodeRecap, FuncsRecap
+_CACHE_FILES = ["funcs.parquet", "files.parquet", "docstrings.parquet", "recap.json", "rollups.parquet", "index.parquet", "index.json", "names.parquet", "funcs.arrow", ".manifest.json"]
 
+# the commit history depends on the target alone, so it is kept across
+# forced runs and changes of the metrics, plugins or docstrings
+_HISTORY_FILE = "commit_history.csv"
 
-_CACHE_FILES = ["funcs.parquet", "recap.json", ".manifest.json"]
+# manifest entries of the stores written before they were recorded
+_MANIFEST_DEFAULTS = {"plugins": [], "docstrings": False}
 
 
 class Store:
-    def __init__(self, path: Path, target: str, force: bool = False) -> None:
+    def __init__(
+        self,
+        path: Path,
+        target: str | None = None,
+        force: bool = False,
+        ipc_cache: bool = False,
+        metrics: list[str] | None = None,
+        plugins: list[str] | None = None,
+        docstrings: bool = False,
+    ) -> None:
         self.path = path
+        # when enabled an uncompressed arrow IPC copy of funcs.parquet
+        # is kept as well, which gets memory mapped on load instead of
+        # being decoded and decompressed
+        self.ipc_cache = ipc_cache
         path.mkdir(parents=True, exist_ok=True)
 
-        if force or not self._manifest_matches(target):
+        # without a target the store is just opened for reading
+        # whatever it holds, as done by the query subcommand
+        if target is None:
+            return
+
+        # results collected with other metrics (None being all of
+        # them) or other plugins don't have the columns asked for
+        columns = {
+            "metrics": sorted(metrics) if metrics is not None else None,
+            "plugins": sorted(plugins) if plugins else [],
+            "docstrings": docstrings,
+        }
+        manifest = self._read_manifest()
+        if manifest.get("target") != target:
+            (self.path / _HISTORY_FILE).unlink(missing_ok=True)
+        if force or not self._manifest_matches(manifest, target, columns):
             self._clear_cache()
-            self._write_manifest(target)
+            self._write_manifest(target, columns)
 
-    def _manifest_matches(self, target: str) -> bool:
+    def _read_manifest(self) -> dict:
         try:
-            return json.loads(self._manifest_path.read_text()).get("target") == target
+            return json.loads(self._manifest_path.read_text())
         except (FileNotFoundError, json.JSONDecodeError):
-            return False
+            return {}
 
-    def _write_manifest(self, target: str) -> None:
+    @staticmethod
+    def _manifest_matches(manifest: dict, target: str, columns: dict) -> bool:
+        return manifest.get("target") == target and all(
+            manifest.get(key, _MANIFEST_DEFAULTS.get(key)) == value
+            for key, value in columns.items()
+        )
+
+    def _write_manifest(self, target: str, columns: dict) -> None:
         self._manifest_path.write_text(
-            json.dumps({"target": target, "analyzed_at": datetime.now().isoformat()})
+            json.dumps({
+                "target": target,
+                **columns,
+                "analyzed_at": datetime.now().isoformat(),
+            })
         )
 
     def _clear_cache(self) -> None:
@@ -39,20 +104,183 @@ class Store:
         return (self.path / "funcs.parquet").exists()
 
     def save_recap(self, recap: CodeRecap) -> None:
-        recap.funcs_df.write_parquet(self.path / "funcs.parquet")
+        # paths are stored once, in the file table, and referenced by
+        # the functions through their file_id
+        funcs_df, files_df = _split_paths(recap.funcs_df)
+        files_df.write_parquet(self.path / "files.parquet", **PARQUET_OPTIONS)
+        funcs_df.write_parquet(self.path / "funcs.parquet", **PARQUET_OPTIONS)
+        if self.ipc_cache:
+            self._write_ipc(funcs_df)
         (self.path / "recap.json").write_text(
             json.dumps(recap.funcs_recap.model_dump())
         )
+        if recap.funcs_index is not None:
+            recap.funcs_index.orders.write_parquet(self.path / "index.parquet", **PARQUET_OPTIONS)
+            (self.path / "index.json").write_text(json.dumps(recap.funcs_index.cuts))
+        if recap.name_index is not None:
+            recap.name_index.names.write_parquet(self.path / "names.parquet", **PARQUET_OPTIONS)
 
     def load_recap(self) -> CodeRecap:
-        funcs_df = pl.read_parquet(self.path / "funcs.parquet")
+        from morthal.analyze.recap import CodeRecap, FuncsRecap
+
+        funcs_df = self.load_funcs()
         data = json.loads((self.path / "recap.json").read_text())
-        return CodeRecap(funcs_recap=FuncsRecap(**data), funcs_df=funcs_df)
+        return CodeRecap(
+            funcs_recap=FuncsRecap(**data),
+            funcs_df=funcs_df,
+            funcs_index=self.load_index(),
+            name_index=self.load_name_index(),
+        )
+
+    def load_funcs(self) -> pl.DataFrame:
+        import polars as pl
+
+        if self.ipc_cache and self._has_fresh_ipc:
+            return self._join_paths(_read_ipc_mmap(self._ipc_path))
+
+        funcs_df = pl.read_parquet(self.path / "funcs.parquet")
+        if self.ipc_cache:
+            # warming up the cache for the next time around
+            self._write_ipc(funcs_df)
+        return self._join_paths(funcs_df)
+
+    def scan_funcs(self) -> pl.LazyFrame:
+        import polars as pl
+
+        if self.ipc_cache and self._has_fresh_ipc:
+            return self._join_paths(pl.scan_ipc(self._ipc_path))
+        return self._join_paths(pl.scan_parquet(self.path / "funcs.parquet"))
+
+    def _join_paths(self, funcs: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame | pl.LazyFrame:
+        '''
+        turns the file_id column back into the fpath Enum
+        '''
+        import polars as pl
+
+        if "file_id" not in funcs.collect_schema().names():
+            return funcs
+        files = pl.read_parquet(self.path / "files.parquet")
+        # a mapping of the ids (unlike gathering from the paths) lets the
+        # filters on the other columns be pushed down to the scan
+        return funcs.with_columns(
+            pl.col("file_id").replace_strict(
+                files["file_id"], files["fpath"], return_dtype=pl.Enum(files["fpath"])
+            )
+        ).rename({"file_id": "fpath"})
+
+    def _write_ipc(self, funcs_df: pl.DataFrame) -> None:
+        # written aside and then renamed, so that another process
+        # mapping the previous file never sees a half written one
+        tmp_path = self._ipc_path.with_suffix(".arrow.tmp")
+        funcs_df.write_ipc(tmp_path, compression="uncompressed")
+        tmp_path.replace(self._ipc_path)
+
+    @property
+    def _ipc_path(self) -> Path:
+        return self.path / "funcs.arrow"
+
+    @property
+    def _has_fresh_ipc(self) -> bool:
+        try:
+            return (
+                self._ipc_path.stat().st_mtime
+                >= (self.path / "funcs.parquet").stat().st_mtime
+            )
+        except FileNotFoundError:
+            return False
+
+    def load_index(self) -> FuncsIndex | None:
+        import polars as pl
+
+        from morthal.analyze.index import FuncsIndex
+
+        try:
+            return FuncsIndex(
+                orders=pl.read_parquet(self.path / "index.parquet"),
+                cuts=json.loads((self.path / "index.json").read_text()),
+            )
+        except FileNotFoundError:
+            return None
+
+    def load_name_index(self) -> NameIndex | None:
+        import polars as pl
+
+        from morthal.analyze.index import NameIndex
+
+        try:
+            return NameIndex(names=pl.read_parquet(self.path / "names.parquet"))
+        except FileNotFoundError:
+            return None
+
+    def save_docstrings(self, docstrings_df: pl.DataFrame) -> None:
+        docstrings_df.write_parquet(self.path / "docstrings.parquet", **PARQUET_OPTIONS)
+
+    def scan_docstrings(self) -> pl.LazyFrame | None:
+        '''
+        the full docstrings ("func_id", "docstring"), if they were kept,
+        func_id being the row of the function in load_funcs()
+        '''
+        import polars as pl
+
+        if not (self.path / "docstrings.parquet").exists():
+            return None
+        return pl.scan_parquet(self.path / "docstrings.parquet")
+
+    def save_rollups(self, rollups: Rollups) -> None:
+        rollups.df.write_parquet(self.path / "rollups.parquet", **PARQUET_OPTIONS)
+
+    def load_rollups(self) -> Rollups | None:
+        import polars as pl
+
+        from morthal.analyze.rollup import Rollups
+
+        try:
+            return Rollups(df=pl.read_parquet(self.path / "rollups.parquet"))
+        except FileNotFoundError:
+            return None
 
     @property
     def _manifest_path(self) -> Path:
         return self.path / ".manifest.json"
     
 
+    @property
+    def has_history(self) -> bool:
+        return (self.path / _HISTORY_FILE).exists()
+
     def load_history(self) -> pl.DataFrame:
-        return pl.read_csv(self.path / 'commit_history.csv')
+        import polars as pl
+
+        return pl.read_csv(self.path / _HISTORY_FILE)
+
+
+def _split_paths(funcs_df: pl.DataFrame) -> tuple[pl.DataFrame, pl.DataFrame]:
+    '''
+    the functions with the fpath column replaced by a file_id, and the
+    table of the files ("file_id", "fpath") the ids refer to
+    '''
+    import polars as pl
+
+    if "fpath" not in funcs_df.columns:
+        return funcs_df, pl.DataFrame(schema={"file_id": pl.UInt32, "fpath": pl.Utf8})
+
+    fpath = funcs_df["fpath"]
+    if not isinstance(fpath.dtype, pl.Enum):
+        fpath = fpath.cast(pl.Utf8).cast(pl.Enum(fpath.cast(pl.Utf8).unique(maintain_order=True).drop_nulls()))
+    files_df = pl.DataFrame({"fpath": fpath.dtype.categories}).with_row_index("file_id")
+    funcs_df = funcs_df.with_columns(
+        fpath.to_physical().cast(pl.UInt32).alias("fpath")
+    ).rename({"fpath": "file_id"})
+    return funcs_df, files_df
+
+
+def _read_ipc_mmap(path: Path) -> pl.DataFrame:
+    # pyarrow maps the file and hands its buffers over to polars without
+    # copying them, so the OS page cache is the only copy of the data and
+    # it is shared among all the processes reading the same store
+    # the mapping stays alive as long as the buffers do
+    import polars as pl
+    import pyarrow as pa
+
+    table = pa.ipc.open_file(pa.memory_map(str(path))).read_all()
+    return pl.from_arrow(table, rechunk=False)
@@ -0,0 +1,286 @@
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+from morthal.analyze.collect import (
+    FuncCache,
+    NODE_DEPTH_BINS,
+    SCAN_METRICS,
+    collect_codebase_data,
+    func_fields,
+    iter_collect,
+    iter_func_batches,
+)
+from morthal.analyze.recap import build_repo_recap
+from morthal.analyze.rollup import build_rollups
+
+
+SOURCE = '''
+def f(a: int, b):
+    """doc"""
+    if a:
+        return b
+
+
+class C:
+    def g(self) -> int:
+        return 1
+'''
+
+
+def _codebase(tmpdir) -> Path:
+    root = Path(tmpdir)
+    (root / 'pkg').mkdir()
+    (root / 'pkg' / 'mod.py').write_text(SOURCE)
+    return root
+
+
+def test_collect_selected_metrics_only(tmpdir, monkeypatch):
+    root = _codebase(tmpdir)
+    full = collect_codebase_data(root).funcs_df
+
+    # unselected metrics must not even be computed
+    def fail(*args, **kwargs):
+        raise AssertionError('should not be called')
+    monkeypatch.setattr('morthal.analyze.collect.collect.identify_tab_offset', fail)
+    monkeypatch.setattr('ast.get_docstring', fail)
+
+    metrics = ['lines', 'args', 'returns']
+    funcs_df = collect_codebase_data(root, metrics=metrics).funcs_df
+
+    assert funcs_df.columns == [
+        'name', 'parent_name', 'qualname', 'struct_hash', 'n_codelines', 'n_func_args',
+        'n_func_args_annotated', 'return_annotated', 'fpath',
+    ]
+    assert funcs_df.equals(full.select(funcs_df.columns))
+
+
+def test_recap_of_selected_metrics(tmpdir):
+    root = _codebase(tmpdir)
+    full = build_repo_recap(collect_codebase_data(root)).funcs_recap
+    data = collect_codebase_data(root, metrics=['lines', 'returns'])
+    recap = build_repo_recap(data)
+
+    assert recap.funcs_recap.total_funcs == full.total_funcs == 2
+    assert recap.funcs_recap.avg_lines == full.avg_lines
+    assert recap.funcs_recap.return_coverage == full.return_coverage
+    assert recap.funcs_recap.unannotated_funcs == full.unannotated_funcs
+    # fields of metrics which weren't collected come out as 0
+    assert recap.funcs_recap.avg_depth == 0.0
+    assert recap.funcs_recap.total_args == 0
+    assert list(recap.funcs_index.orders.columns) == ['n_codelines']
+    # no function counts as unannotated when returns weren't collected
+    assert build_repo_recap(
+        collect_codebase_data(root, metrics=['lines'])
+    ).funcs_recap.unannotated_funcs == 0
+
+    rollups = build_rollups(data)
+    assert rollups.get('pkg').avg_lines == full.avg_lines
+    assert rollups.get('pkg').p90_depth == 0.0
+
+
+def test_collect_empty_with_metrics(tmpdir):
+    funcs_df = collect_codebase_data(Path(tmpdir), metrics=['args']).funcs_df
+    assert funcs_df.columns == [
+        'name', 'parent_name', 'qualname', 'struct_hash', 'n_func_args', 'n_func_args_annotated', 'fpath',
+    ]
+
+
+def test_func_fields():
+    assert func_fields(['node_depth']) == [
+        'name', 'parent_name', 'qualname', 'struct_hash', 'max_node_depth', 'avg_node_depth', 'n_nodes',
+        'node_depth_hist',
+    ]
+    with pytest.raises(ValueError):
+        func_fields(['complexity'])
+
+
+def test_collect_scanned_matches_tree(tmpdir, monkeypatch):
+    root = _codebase(tmpdir)
+    # a file the scanner can't tell about, collected with the tree
+    (root / 'pkg' / 'other.py').write_text('match x:\n    case _:\n        def h():\n            pass\n')
+    full = collect_codebase_data(root)
+
+    metrics = ['name_len', 'lines', 'stmt_depth']
+    assert set(metrics) == SCAN_METRICS
+    scanned = collect_codebase_data(root, metrics=metrics)
+
+    assert scanned.funcs_df.equals(full.funcs_df.select(scanned.funcs_df.columns))
+    assert scanned.files_df['n_startements'].to_list() == full.files_df['n_startements'].to_list()
+    assert scanned.files_df['n_nodes'].null_count() == 2
+
+
+def test_collect_encodes_paths_and_names(tmpdir):
+    root = _codebase(tmpdir)
+    (root / 'pkg' / 'other.py').write_text(SOURCE)
+    data = collect_codebase_data(root)
+
+    paths = data.files_df['fpath']
+    assert isinstance(paths.dtype, pl.Enum)
+    assert data.files_df['file_id'].to_list() == list(range(2))
+    assert data.funcs_df['fpath'].dtype == paths.dtype
+    assert data.funcs_df['name'].dtype == pl.Categorical
+    assert data.funcs_df['parent_name'].dtype == pl.Categorical
+
+
+def test_collect_qualified_names(tmpdir):
+    root = _codebase(tmpdir)
+    (root / 'pkg' / '__init__.py').write_text(NESTING_SOURCE)
+    recap = build_repo_recap(collect_codebase_data(root))
+
+    assert sorted(recap.funcs_df['qualname'].cast(pl.Utf8).to_list()) == [
+        'pkg.mod.C.g', 'pkg.mod.f', 'pkg.outer', 'pkg.outer.<locals>.inner',
+    ]
+    index = recap.name_index
+    assert index.lookup(recap.funcs_df, 'pkg.mod.C.g')['name'].to_list() == ['g']
+    assert index.subtree(recap.funcs_df, 'pkg.outer')['name'].to_list() == ['outer', 'inner']
+    assert index.subtree(recap.funcs_df, 'pkg.mod').height == 2
+
+
+def test_collect_narrow_dtypes(tmpdir):
+    data = collect_codebase_data(_codebase(tmpdir))
+
+    assert data.funcs_df['max_stmt_depth'].dtype == pl.UInt32
+    assert data.funcs_df['n_codelines'].dtype == pl.UInt32
+    assert data.funcs_df['n_func_args'].dtype == pl.UInt16
+    assert data.files_df['n_startements'].dtype == pl.UInt32
+    assert build_repo_recap(data).funcs_recap.total_args == 3
+
+
+def test_collect_statements_after_long_lines(tmpdir):
+    root = Path(tmpdir)
+    items = ', '.join(['1'] * 700)
+    (root / 'long.py').write_text(f'def f():\n    x = [{items}]; y = 2\n')
+
+    funcs_df = collect_codebase_data(root).funcs_df
+    assert funcs_df['max_stmt_depth'].to_list() == [(4 + len(f'x = [{items}]; ')) // 4]
+
+
+def test_collect_docstrings_out_of_line(tmpdir):
+    root = _codebase(tmpdir)
+    funcs_df = collect_codebase_data(root).funcs_df
+
+    assert 'docstring' not in funcs_df.columns
+    assert funcs_df['has_docstring'].to_list() == [True, False]
+    assert funcs_df['docstring_len'].to_list() == [3, 0]
+    assert funcs_df['docstring_hash'][1] is None
+    assert collect_codebase_data(root).docstrings_df is None
+
+    data = collect_codebase_data(root, docstrings=True)
+    assert data.funcs_df.equals(funcs_df)
+    assert data.docstrings_df.rows() == [(0, 'doc')]
+
+
+def test_collect_depth_histograms(tmpdir):
+    funcs_df = collect_codebase_data(_codebase(tmpdir)).funcs_df
+
+    assert funcs_df['node_depth_hist'].dtype == pl.Array(pl.UInt32, NODE_DEPTH_BINS)
+    for row in funcs_df.iter_rows(named=True):
+        assert sum(row['node_depth_hist']) == row['n_nodes']
+        assert sum(row['stmt_depth_hist']) == row['n_exprs']
+        assert max(i for i, n in enumerate(row['stmt_depth_hist']) if n) == row['max_stmt_depth']
+    # f has its docstring and if at the first level, the return at the second
+    assert funcs_df['stmt_depth_hist'][0].to_list()[:3] == [0, 2, 1]
+
+
+NESTING_SOURCE = '''
+@decorator
+def outer(x):
+    def inner(y):
+        return y
+    return inner(x)
+'''
+
+
+def test_collect_reuses_cached_copies(tmpdir, monkeypatch):
+    root = _codebase(tmpdir)
+    (root / 'pkg' / 'copy.py').write_text(SOURCE + NESTING_SOURCE)
+    # the same functions, as methods
+    indented = ''.join('    ' + line if line else line for line in NESTING_SOURCE.splitlines(True))
+    (root / 'pkg' / 'methods.py').write_text('class K:\n' + indented + '\nclass L:\n' + indented)
+
+    cache = FuncCache()
+    data = collect_codebase_data(root, cache=cache)
+    # the module is collected first, then either copy.py or methods.py
+    assert cache.hits == 4
+    funcs_df = data.funcs_df
+
+    monkeypatch.setattr(FuncCache, 'get', lambda self, key: None)
+    uncached = collect_codebase_data(root)
+    assert funcs_df.equals(uncached.funcs_df)
+    assert data.files_df.equals(uncached.files_df)
+
+    copies = funcs_df.filter(pl.col('name') == 'outer')
+    assert copies['struct_hash'].n_unique() == 1
+    assert copies['parent_name'].cast(pl.Utf8).sort(nulls_last=True).to_list() == ['K', 'L', None]
+    # the names of the copies (and of their nested functions) are their own
+    assert funcs_df.filter(pl.col('name') == 'inner')['qualname'].cast(pl.Utf8).sort().to_list() == [
+        'pkg.copy.outer.<locals>.inner',
+        'pkg.methods.K.outer.<locals>.inner',
+        'pkg.methods.L.outer.<locals>.inner',
+    ]
+
+
+def test_bounded_cache(tmpdir):
+    root = _codebase(tmpdir)
+    (root / 'pkg' / 'copy.py').write_text(NESTING_SOURCE + NESTING_SOURCE)
+    full = collect_codebase_data(root)
+
+    cache = FuncCache(max_entries=1)
+    bounded = collect_codebase_data(root, cache=cache)
+    assert len(cache.entries) == 1
+    # the copy in the same file is found all the same
+    assert cache.hits == 1
+    assert bounded.funcs_df.equals(full.funcs_df)
+
+
+def test_cache_shared_between_collections(tmpdir):
+    root = _codebase(tmpdir)
+    cache = FuncCache()
+    first = collect_codebase_data(root, cache=cache)
+    assert cache.hits == 0
+    again = collect_codebase_data(root, cache=cache)
+    assert cache.hits == 2
+    assert again.funcs_df.equals(first.funcs_df)
+
+    # what is collected is part of the key
+    collect_codebase_data(root, metrics=['lines'], cache=cache)
+    assert cache.hits == 2
+
+
+def test_iter_collect_matches_collection(tmpdir):
+    root = _codebase(tmpdir)
+    (root / 'pkg' / 'copy.py').write_text(SOURCE + NESTING_SOURCE)
+    data = collect_codebase_data(root)
+
+    records = list(iter_collect([root]))
+    assert [record.file for record in records] == data.files_df.drop('file_id').cast({'fpath': pl.Utf8}).to_dicts()
+    batches = list(iter_func_batches(records, batch_size=4))
+    assert [batch.height for batch in batches] == [4, 2]
+    streamed = pl.concat(batches)
+    assert streamed.equals(data.funcs_df.cast({'fpath': pl.Utf8}))
+
+
+def test_iter_collect_sources(tmpdir):
+    root = _codebase(tmpdir)
+    sources = [
+        root / 'pkg' / 'mod.py',
+        ('vendored/latin.py', '# -*- coding: latin-1 -*-\ndef caf\xe9(): pass\n'.encode('latin-1')),
+    ]
+    records = list(iter_collect(sources, metrics=['lines'], docstrings=True))
+
+    assert [record.file['fpath'] for record in records] == [str(root / 'pkg' / 'mod.py'), 'vendored/latin.py']
+    assert [func['qualname'] for func in records[1].funcs] == ['vendored.latin.caf\xe9']
+    assert records[0].docstrings == ['doc', None]
+
+
+def test_iter_collect_workers(tmpdir):
+    root = _codebase(tmpdir)
+    for i in range(10):
+        (root / 'pkg' / f'copy{i}.py').write_text(SOURCE)
+
+    serial = list(iter_collect([root], plugins=['calls']))
+    pooled = list(iter_collect([root], plugins=['calls'], workers=2))
+    assert pooled == serial
+    assert all('n_calls' in func for record in pooled for func in record.funcs)
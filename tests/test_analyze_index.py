@@ -0,0 +1,56 @@
+import polars as pl
+
+from morthal.analyze.index import build_funcs_index, build_name_index
+
+
+funcs_df = pl.DataFrame({
+    'name': ['a', 'b', 'c', 'd', 'e', 'f'],
+    'max_stmt_depth': [1, 6, 2, 5, 6, 3],
+    'n_codelines': [2, 80, 4, 60, 10, 6],
+    'n_nodes': [4, 200, 8, 150, 30, 12],
+})
+
+
+def test_index_top_k():
+    index = build_funcs_index(funcs_df)
+
+    assert index.top_k(funcs_df, 'n_nodes', 2)['name'].to_list() == ['b', 'd']
+    # ties keep the original row order
+    assert index.top_k(funcs_df, 'max_stmt_depth', 3)['name'].to_list() == ['b', 'e', 'd']
+
+
+def test_index_percentile_cuts():
+    index = build_funcs_index(funcs_df)
+
+    assert index.cut('n_codelines', 0.5) == 8.0
+    above = index.above(funcs_df, 'n_codelines', 0.5)
+    assert above['name'].to_list() == ['b', 'd', 'e']
+
+
+def test_index_empty():
+    empty = funcs_df.clear()
+    index = build_funcs_index(empty)
+
+    assert index.top_k(empty, 'n_nodes', 5).height == 0
+    assert index.above(empty, 'n_nodes', 0.95).height == 0
+
+
+def test_name_index():
+    df = pl.DataFrame({
+        'qualname': [
+            'pkg.mod.C.f', 'pkg.mod.C.D.g', 'pkg.mod.Cf', 'pkg.mod.C.f',
+            'pkg.mod.h', 'pkg.mod.h.<locals>.k', 'pkg.mod2.C.f',
+            'pkg.mod-tool.g', 'pkg.mod+x.h', 'pkg.mod x.k',
+        ],
+    }).with_row_index('i')
+    index = build_name_index(df)
+
+    assert index.lookup(df, 'pkg.mod.C.f')['i'].to_list() == [0, 3]
+    assert index.lookup(df, 'pkg.mod.C').height == 0
+    assert sorted(index.subtree(df, 'pkg.mod.C')['i'].to_list()) == [0, 1, 3]
+    assert sorted(index.subtree(df, 'pkg.mod.h')['i'].to_list()) == [4, 5]
+    assert sorted(index.subtree(df, 'pkg.mod')['i'].to_list()) == [0, 1, 2, 3, 4, 5]
+    assert index.subtree(df, 'pkg.nope').height == 0
+    # sibling modules whose names start the same aren't below it
+    assert index.subtree(df, 'pkg.mod-tool')['i'].to_list() == [7]
+    assert sorted(index.subtree(df, 'pkg')['i'].to_list()) == list(range(10))
@@ -0,0 +1,104 @@
+import ast
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+from morthal.analyze.collect import collect_codebase_data
+from morthal.analyze.plugin import Calls, MetricPlugin, PluginSet, load_plugins
+from morthal.utils.ast import NodeSink, enrich
+
+
+SOURCE = '''
+def f(xs):
+    if xs and len(xs) > 1 or not xs:
+        return [x for x in xs if x]
+    for x in xs:
+        try:
+            print(x)
+        except ValueError:
+            pass
+
+    def inner():
+        return g(h())
+
+    return (lambda y: y)(1) if xs else None
+
+
+class C:
+    print('class body')
+
+    def m(self):
+        return {k: v for k, v in self.items()}
+'''
+
+
+class Statements(MetricPlugin):
+    name = 'statements'
+    columns = {'n_statements': pl.Int64, 'kinds': pl.List(pl.Utf8)}
+
+    def hooks(self):
+        return {ast.stmt: lambda node, acc: acc + [type(node).__name__]}
+
+    def new_scope(self):
+        return []
+
+    def finalize(self, acc):
+        return {'n_statements': len(acc), 'kinds': sorted(set(acc))}
+
+
+def _collect(tmpdir, plugins: PluginSet, source: str = SOURCE) -> pl.DataFrame:
+    root = Path(tmpdir)
+    (root / 'mod.py').write_text(source)
+    return collect_codebase_data(root, plugins=plugins).funcs_df
+
+
+def test_builtin_plugins(tmpdir):
+    funcs_df = _collect(tmpdir, load_plugins(['complexity', 'calls', 'comprehensions']))
+    rows = {
+        row['name']: row
+        for row in funcs_df.select(
+            'name', 'cyclomatic_complexity', 'n_calls', 'n_comprehensions'
+        ).iter_rows(named=True)
+    }
+
+    # if, and + or, comprehension loop + filter, for, except, ternary
+    assert rows['f']['cyclomatic_complexity'] == 1 + 1 + 2 + 2 + 1 + 1 + 1
+    # the calls of inner are its own, the lambda belongs to f
+    assert rows['f']['n_calls'] == 3
+    assert rows['inner']['n_calls'] == 2
+    assert rows['f']['n_comprehensions'] == 1
+    assert rows['m'] == {
+        'name': 'm', 'cyclomatic_complexity': 2, 'n_calls': 1, 'n_comprehensions': 1,
+    }
+
+
+def test_abstract_node_types_dispatch_to_subtypes():
+    plugins = PluginSet([Statements()])
+    ast_mod = ast.parse(SOURCE)
+    nsink = NodeSink()
+    enrich(ast_mod, node_sink=nsink, plugins=plugins)
+
+    values = plugins.finalize(nsink.funcs[0].plugin_scopes)
+    assert values['n_statements'] == 8
+    assert values['kinds'] == ['Expr', 'For', 'FunctionDef', 'If', 'Pass', 'Return', 'Try']
+
+
+def test_plugin_columns_have_declared_dtypes(tmpdir):
+    plugins = PluginSet([Statements(), Calls()])
+    funcs_df = _collect(tmpdir, plugins, source='x = 1\n')
+
+    assert funcs_df.height == 0
+    assert funcs_df.schema['n_statements'] == pl.Int64
+    assert funcs_df.schema['kinds'] == pl.List(pl.Utf8)
+    assert funcs_df.schema['n_calls'] == pl.Int64
+
+
+def test_load_plugins():
+    assert load_plugins(['morthal.analyze.plugin.builtin:Calls']).names == ['calls']
+    with pytest.raises(ValueError):
+        load_plugins(['nope'])
+    with pytest.raises(ValueError):
+        load_plugins(['morthal.analyze.plugin.builtin:Nope'])
+    with pytest.raises(ValueError):
+        PluginSet([Calls(), Calls()])
@@ -0,0 +1,85 @@
+import polars as pl
+import pytest
+
+from morthal.analyze.collect import CodebaseData
+from morthal.analyze.recap import RecapState, build_repo_recap
+
+
+funcs_df = pl.DataFrame({
+    'fpath': ['a.py', 'a.py', 'b.py', 'c/d.py', 'c/d.py'],
+    'max_stmt_depth': [1, 3, 2, 5, 2],
+    'n_codelines': [2, 10, 4, 30, 6],
+    'n_nodes': [4, 20, 8, 60, 12],
+    'avg_node_depth': [1.0, 2.5, 2.0, 3.0, 1.5],
+    'n_func_args': [0, 2, 1, 3, 1],
+    'n_func_args_annotated': [0, 2, 0, 1, 1],
+    'return_annotated': [True, True, False, False, True],
+})
+
+
+def test_recap_state_from_df():
+    recap = RecapState.from_df(funcs_df).finalize()
+
+    assert recap.total_funcs == 5
+    assert recap.avg_depth == 2.6
+    assert recap.median_depth == 2.0
+    assert recap.avg_lines == 10.4
+    assert recap.total_args == 7
+    assert recap.annotated_args == 4
+    assert recap.unannotated_funcs == 2
+    assert recap.return_coverage == 60.0
+
+
+def test_recap_state_merge_matches_full_recap():
+    full = build_repo_recap(CodebaseData(files_df=pl.DataFrame(), funcs_df=funcs_df)).funcs_recap
+
+    states = RecapState.partition(funcs_df, by='fpath')
+    assert set(states) == {'a.py', 'b.py', 'c/d.py'}
+
+    merged = RecapState()
+    for state in states.values():
+        merged = merged + state
+
+    assert merged.finalize() == full
+    # associativity, whatever the grouping
+    assert (states['a.py'] + (states['b.py'] + states['c/d.py'])).finalize() == full
+
+
+def test_recap_state_even_median():
+    state = RecapState.from_df(funcs_df.filter(pl.col('fpath') != 'b.py'))
+    assert state.median_depth() == 2.5
+    assert state.min_depth == 1
+    assert state.max_depth == 5
+
+
+def test_recap_state_subtract():
+    states = RecapState.partition(funcs_df, by='fpath')
+    full = RecapState.from_df(funcs_df)
+
+    without_c = full - states['c/d.py']
+    expected = RecapState.from_df(funcs_df.filter(pl.col('fpath') != 'c/d.py'))
+
+    assert without_c.finalize() == expected.finalize()
+    assert without_c.max_depth == 3
+
+    with pytest.raises(ValueError):
+        without_c - states['c/d.py']
+
+
+def test_recap_state_empty():
+    recap = RecapState().finalize()
+    assert recap.total_funcs == 0
+    assert recap.median_depth == 0.0
+
+
+def test_recap_state_percentiles():
+    recap = RecapState.from_df(funcs_df).finalize()
+    assert recap.p90_lines == funcs_df['n_codelines'].quantile(0.9, 'linear')
+    assert recap.p99_nodes == funcs_df['n_nodes'].quantile(0.99, 'linear')
+
+    sketched = RecapState.from_df(funcs_df, exact=False)
+    assert sketched.finalize().median_depth == 2.0
+    assert sketched.max_depth == 5
+
+    with pytest.raises(TypeError):
+        sketched - RecapState.from_df(funcs_df, exact=False)
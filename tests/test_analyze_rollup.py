@@ -0,0 +1,60 @@
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+import morthal
+from morthal.analyze.collect import CodebaseData, collect_codebase_data
+from morthal.analyze.recap import build_repo_recap
+from morthal.analyze.rollup import build_rollups
+
+
+funcs_df = pl.DataFrame({
+    'fpath': ['a.py', 'pkg/__init__.py', 'pkg/b.py', 'pkg/sub/c.py', 'pkg/sub/c.py'],
+    'max_stmt_depth': [1, 3, 2, 5, 2],
+    'n_codelines': [2, 10, 4, 30, 6],
+    'n_nodes': [4, 20, 8, 60, 12],
+    'avg_node_depth': [1.0, 2.5, 2.0, 3.0, 1.5],
+    'n_func_args': [0, 2, 1, 3, 1],
+    'n_func_args_annotated': [0, 2, 0, 1, 1],
+    'return_annotated': [True, True, False, False, True],
+})
+files_df = pl.DataFrame({
+    'fpath': ['a.py', 'pkg/__init__.py', 'pkg/b.py', 'pkg/sub/c.py'],
+})
+repo_data = CodebaseData(files_df=files_df, funcs_df=funcs_df)
+
+
+def test_rollups_levels():
+    rollups = build_rollups(repo_data)
+
+    assert rollups.df['prefix'].to_list() == ['.', 'pkg', 'pkg/sub']
+    assert rollups.df['level'].to_list() == [0, 1, 2]
+    assert rollups.df['kind'].to_list() == ['dir', 'package', 'dir']
+    assert rollups.df['n_files'].to_list() == [4, 3, 1]
+    assert rollups.df['total_funcs'].to_list() == [5, 4, 2]
+
+
+def test_rollups_root_matches_repo_recap():
+    rollups = build_rollups(repo_data)
+    assert rollups.get('.') == build_repo_recap(repo_data).funcs_recap
+
+
+@pytest.mark.parametrize('metrics', [None, ['lines'], ['args', 'returns']])
+def test_rollups_root_matches_recap_of_collected_code(metrics):
+    data = collect_codebase_data(Path(morthal.__file__).parent, metrics=metrics)
+    assert build_rollups(data).get('.') == build_repo_recap(data).funcs_recap
+
+
+def test_rollups_query_by_prefix():
+    rollups = build_rollups(repo_data)
+
+    sub = rollups.get('pkg/sub/')
+    assert sub.total_funcs == 2
+    assert sub.avg_lines == 18.0
+    assert sub.median_depth == 3.5
+
+    assert rollups.get('nope') is None
+    assert rollups.under('pkg')['prefix'].to_list() == ['pkg', 'pkg/sub']
+    assert rollups.children('.')['prefix'].to_list() == ['pkg']
+    assert rollups.children('pkg')['prefix'].to_list() == ['pkg/sub']
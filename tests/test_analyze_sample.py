@@ -0,0 +1,114 @@
+import tempfile
+from pathlib import Path
+
+import polars as pl
+import pytest
+
+from morthal.analyze.collect import collect_codebase_data
+from morthal.analyze.recap import build_repo_recap
+from morthal.analyze.recap.estimate import estimate_recap, format_estimate
+from morthal.analyze.sample import SampleSpec, plan_sample, sample_weights
+from morthal.utils.path import iter_pyfiles
+
+
+def _write_codebase(root: Path) -> None:
+    for pkg in ('alpha', 'beta', 'gamma'):
+        (root / pkg).mkdir()
+        for i in range(12):
+            body = ''.join(
+                f'def f{j}(x: int, y):\n'
+                + ''.join('    ' * (k + 1) + 'if x:\n' for k in range(1 + j % 3))
+                + '    ' * (2 + j % 3) + 'return y\n'
+                for j in range(1 + i % 5)
+            )
+            (root / pkg / f'mod{i}.py').write_text(body)
+
+
+def test_plan_visits_every_stratum_first():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        _write_codebase(root)
+        plan = plan_sample(root, list(iter_pyfiles(root)), seed=1)
+        again = plan_sample(root, list(iter_pyfiles(root)), seed=1)
+
+    n_strata = plan['stratum'].n_unique()
+    assert plan.height == plan['fpath'].n_unique() == 36
+    assert plan.head(n_strata)['stratum'].n_unique() == n_strata
+    assert plan.equals(again)
+
+
+def test_sample_weights_add_up_to_the_files():
+    plan = pl.DataFrame({
+        'fpath': ['a', 'b', 'c', 'd', 'e', 'f'],
+        'stratum': ['x', 'x', 'x', 'x', 'y', 'y'],
+        'size': [1, 1, 1, 1, 1, 1],
+    })
+    weights = sample_weights(plan, ['a', 'e'])
+    assert dict(weights.select('fpath', 'weight').iter_rows()) == {'a': 4.0, 'e': 2.0}
+
+    # strata without samples are spread over the others
+    weights = sample_weights(plan, ['a', 'b'])
+    assert weights['weight'].sum() == pytest.approx(6.0)
+
+
+def test_sample_spec_validates_fraction():
+    with pytest.raises(ValueError):
+        SampleSpec(fraction=0)
+    with pytest.raises(ValueError):
+        SampleSpec(fraction=1.5)
+
+
+@pytest.mark.parametrize('value', ['0', '1.5', '-0.2', 'half'])
+def test_cli_rejects_sample_fractions_out_of_range(value, monkeypatch):
+    import morthal.__main__
+
+    monkeypatch.setattr('sys.argv', ['morthal', '--sample', value])
+    with pytest.raises(SystemExit) as exc:
+        morthal.__main__.main()
+    assert exc.value.code == 2
+
+
+def test_full_sample_estimate_is_exact():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        _write_codebase(root)
+        exact = build_repo_recap(collect_codebase_data(root)).funcs_recap
+        estimate = estimate_recap(collect_codebase_data(root, sample=SampleSpec(seed=3)))
+
+    assert estimate.n_files == estimate.n_sampled_files == 36
+    for name in ('total_funcs', 'total_args', 'annotated_args', 'unannotated_funcs',
+                 'avg_depth', 'avg_lines', 'avg_node_depth', 'arg_coverage',
+                 'return_coverage', 'median_depth'):
+        assert getattr(estimate.recap, name) == pytest.approx(getattr(exact, name)), name
+    assert all(low == high for low, high in estimate.intervals.values())
+
+
+def test_partial_sample_estimate():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        _write_codebase(root)
+        exact = build_repo_recap(collect_codebase_data(root)).funcs_recap
+        data = collect_codebase_data(root, sample=SampleSpec(fraction=0.5, seed=3))
+        estimate = estimate_recap(data, seed=3)
+
+    assert data.files_df.height == 18
+    assert data.files_df['weight'].sum() == pytest.approx(36)
+    assert estimate.n_sampled_files == 18
+    for name, (low, high) in estimate.intervals.items():
+        assert low <= getattr(estimate.recap, name) <= high, name
+    low, high = estimate.intervals['total_funcs']
+    assert low < high
+    assert abs(estimate.recap.total_funcs - exact.total_funcs) < exact.total_funcs / 2
+    assert 'Estimated from 18 of 36 files' in format_estimate(estimate)
+
+
+def test_time_budget_stops_the_collection():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir)
+        _write_codebase(root)
+        data = collect_codebase_data(root, sample=SampleSpec(time_budget=0.0))
+        estimate = estimate_recap(data)
+
+    # at least one file is always collected
+    assert data.files_df.height == 1
+    assert estimate.n_files == 36
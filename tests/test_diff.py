@@ -0,0 +1,154 @@
+import json
+import tempfile
+import zipfile
+from pathlib import Path
+
+import polars as pl
+
+from morthal.diff import WORKTREE, diff_funcs, format_diff, load_snapshot
+
+
+def _funcs(rows: list[tuple]) -> pl.DataFrame:
+    return pl.DataFrame(
+        rows,
+        schema={
+            'fpath': pl.Utf8,
+            'parent_name': pl.Utf8,
+            'name': pl.Utf8,
+            'max_stmt_depth': pl.Int64,
+            'n_codelines': pl.Int64,
+            'n_nodes': pl.Int64,
+            'avg_node_depth': pl.Float64,
+            'n_func_args': pl.Int64,
+            'n_func_args_annotated': pl.Int64,
+            'return_annotated': pl.Boolean,
+        },
+        orient='row',
+    )
+
+
+base_df = _funcs([
+    ('a.py', None, 'f', 1, 3, 10, 1.0, 1, 1, True),
+    ('a.py', 'C', 'f', 2, 5, 20, 1.5, 1, 0, False),
+    ('a.py', 'C', 'prop', 1, 2, 5, 1.0, 0, 0, True),
+    ('a.py', 'C', 'prop', 1, 2, 5, 1.0, 1, 1, True),
+    ('b.py', None, 'gone', 6, 40, 200, 3.0, 2, 0, False),
+])
+head_df = _funcs([
+    ('a.py', None, 'f', 1, 3, 10, 1.0, 1, 1, True),
+    ('a.py', 'C', 'f', 5, 30, 120, 2.5, 1, 0, False),
+    ('a.py', 'C', 'prop', 1, 2, 5, 1.0, 0, 0, True),
+    ('a.py', 'C', 'prop', 1, 2, 5, 1.0, 1, 1, True),
+    ('c.py', None, 'new', 7, 60, 300, 3.5, 0, 0, False),
+])
+
+
+def test_diff_funcs():
+    diff = diff_funcs(base_df, head_df)
+
+    assert diff.added['name'].to_list() == ['new']
+    assert diff.removed['name'].to_list() == ['gone']
+    # same named functions are told apart by their occurrence
+    assert diff.changed.select('parent_name', 'name').rows() == [('C', 'f')]
+    assert diff.changed['max_stmt_depth_base'].to_list() == [2]
+    assert diff.changed['max_stmt_depth_head'].to_list() == [5]
+
+    assert diff.crossed_above('max_stmt_depth', 5) == 2
+    assert diff.crossed_below('max_stmt_depth', 5) == 1
+
+    base, head, delta = diff.recap_deltas()['total_funcs']
+    assert (base, head, delta) == (5, 5, 0)
+
+
+def _qualified(rows: list[tuple]) -> pl.DataFrame:
+    return pl.DataFrame(
+        rows,
+        schema={
+            'fpath': pl.Utf8,
+            'parent_name': pl.Categorical,
+            'name': pl.Categorical,
+            'qualname': pl.Categorical,
+            'struct_hash': pl.UInt64,
+            'max_stmt_depth': pl.UInt8,
+            'n_codelines': pl.UInt32,
+        },
+        orient='row',
+    )
+
+
+def test_diff_matches_qualified_names():
+    base = _qualified([
+        ('m.py', 'Inner', 'f', 'm.A.Inner.f', 1, 1, 3),
+        ('m.py', 'Inner', 'f', 'm.B.Inner.f', 2, 2, 5),
+        ('m.py', 'outer', 'helper', 'm.outer.<locals>.helper', 3, 1, 2),
+        ('m.py', 'other', 'helper', 'm.other.<locals>.helper', 4, 1, 2),
+        ('m.py', None, 'g', 'm.g', 5, 1, 2),
+    ])
+    # the classes and the closures swapped places, B.Inner.f grew, the
+    # source of g changed (a comment, say) but not its metrics
+    head = _qualified([
+        ('m.py', 'Inner', 'f', 'm.B.Inner.f', 6, 4, 9),
+        ('m.py', 'Inner', 'f', 'm.A.Inner.f', 1, 1, 3),
+        ('m.py', 'other', 'helper', 'm.other.<locals>.helper', 4, 1, 2),
+        ('m.py', 'outer', 'helper', 'm.outer.<locals>.helper', 3, 1, 2),
+        ('m.py', None, 'g', 'm.g', 7, 1, 2),
+    ])
+    diff = diff_funcs(base, head)
+
+    assert diff.added.height == diff.removed.height == 0
+    assert diff.changed['qualname'].to_list() == ['m.B.Inner.f', 'm.g']
+    assert diff.changed['max_stmt_depth_head'].to_list() == [4, 1]
+    assert '`m.py` `m.B.Inner.f`: depth 2 → 4, lines 5 → 9' in format_diff(diff)
+
+    # snapshots without qualified names are matched the old way
+    legacy = diff_funcs(base.drop('qualname'), head)
+    assert legacy.changed.select('parent_name', 'name').rows() == [('Inner', 'f'), ('Inner', 'f'), (None, 'g')]
+
+
+def test_format_diff():
+    diff = diff_funcs(base_df, head_df)
+
+    markdown = format_diff(diff, 'markdown')
+    assert '1 functions added, 1 removed, 1 changed' in markdown
+    assert 'functions with depth ≥ 5: 2 more, 1 fewer' in markdown
+    assert '`a.py` `C.f`: depth 2 → 5, lines 5 → 30' in markdown
+
+    data = json.loads(format_diff(diff, 'json'))
+    assert [row['name'] for row in data['added']] == ['new']
+    assert data['recap']['avg_depth']['delta'] == diff.head_recap.avg_depth - diff.base_recap.avg_depth
+
+
+def test_format_diff_of_selected_metrics():
+    # as stored when collecting with --metrics args
+    columns = ['fpath', 'parent_name', 'name', 'n_func_args', 'n_func_args_annotated']
+    diff = diff_funcs(
+        base_df.select(columns),
+        head_df.select(columns).with_columns(n_func_args=pl.lit(3, dtype=pl.Int64)),
+    )
+
+    markdown = format_diff(diff, 'markdown')
+    assert '1 functions added, 1 removed, 4 changed' in markdown
+    assert 'depth' not in markdown.split('functions added')[1]
+    assert '- `c.py` `new`\n' in markdown
+    assert '- `a.py` `C.f`\n' in markdown
+
+
+def test_diff_against_empty_snapshot():
+    empty = base_df.clear().drop('fpath')
+    diff = diff_funcs(empty, head_df)
+    assert diff.added.height == head_df.height
+    assert diff.removed.height == 0
+
+
+def test_load_snapshot_from_revisions():
+    extract_dir = tempfile.mkdtemp()
+    with zipfile.ZipFile('tests/examples/test_repo.zip', 'r') as zref:
+        zref.extractall(extract_dir)
+    repo_path = Path(extract_dir) / 'morthal_test_repo'
+
+    head = load_snapshot('HEAD', repo_path)
+    worktree = load_snapshot(WORKTREE, repo_path)
+    assert sorted(head['name'].to_list()) == sorted(worktree['name'].to_list())
+
+    diff = diff_funcs(load_snapshot('HEAD~1', repo_path), head)
+    assert diff.added.height + diff.removed.height + diff.changed.height > 0
@@ -0,0 +1,65 @@
+import subprocess
+import sys
+import zipfile
+from pathlib import Path
+
+from morthal.main import handle
+from morthal.utils.codebase import LocalCodebase
+from morthal.utils.store import Store
+
+
+REPO_ROOT = Path(__file__).parent.parent
+
+# modules which only the paths actually analyzing or rendering need
+HEAVY_MODULES = ['polars', 'pyarrow', 'pydantic', 'git', 'morthal.reporter', 'morthal.analyze']
+
+# microseconds, for everything imported by the process (interpreter
+# startup included)
+IMPORT_BUDGET_US = 300_000
+
+
+def _run_importtime(*args: str) -> list[tuple[str, int, bool]]:
+    '''
+    runs the cli with -X importtime, returning the name, the cumulative
+    import time and whether it is nested of every module it imported
+    '''
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-m', 'morthal', *args],
+        cwd=REPO_ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imported = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumul, name = line.split('|')
+        imported.append((name.strip(), int(cumul), name.startswith('  ')))
+    return imported
+
+
+def _assert_light(imported: list[tuple[str, int, bool]]):
+    for module, _, _ in imported:
+        for heavy in HEAVY_MODULES:
+            assert module != heavy and not module.startswith(heavy + '.'), module
+    # nested imports are already accounted in their parent
+    assert sum(cumul for _, cumul, nested in imported if not nested) < IMPORT_BUDGET_US
+
+
+def test_help_is_light():
+    _assert_light(_run_importtime('--help'))
+    _assert_light(_run_importtime('query', '--help'))
+
+
+def test_cache_hit_is_light(tmp_path):
+    with zipfile.ZipFile(REPO_ROOT / 'tests/examples/test_repo.zip', 'r') as zref:
+        zref.extractall(tmp_path)
+    target_path = tmp_path / 'morthal_test_repo'
+    store_path = tmp_path / 'store'
+
+    codebase = LocalCodebase(target_path)
+    store = Store(path=store_path, target=codebase.name, force=True)
+    handle(target=codebase, store=store, report=False, history=False)
+
+    _assert_light(_run_importtime('--path', str(target_path), '--support-dir', str(store_path)))
@@ -0,0 +1,165 @@
+import json
+from pathlib import Path
+
+import polars as pl
+
+from morthal.main import handle_query
+from morthal.query import Query, format_result, widen_narrow
+from morthal.utils.store import Store
+
+
+funcs_df = pl.DataFrame({
+    'name': ['a', 'b', 'c', 'd', 'e'],
+    'fpath': ['a.py', 'pkg/b.py', 'pkg/b.py', 'pkg/sub/c.py', 'pkg/sub/c.py'],
+    'max_stmt_depth': [1, 3, 2, 5, 2],
+    'n_codelines': [2, 10, 4, 30, 6],
+    'n_nodes': [4, 250, 8, 600, 12],
+})
+
+
+def test_query_where_sort_top():
+    result = Query(
+        where='n_nodes > 5',
+        sort='n_codelines',
+        top=2,
+        columns=['name', 'n_codelines'],
+    ).run(funcs_df.lazy())
+
+    assert result.columns == ['name', 'n_codelines']
+    assert result['name'].to_list() == ['d', 'b']
+
+
+def test_query_ascending():
+    result = Query(sort='n_nodes', ascending=True, top=2).run(funcs_df.lazy())
+    assert result['name'].to_list() == ['a', 'c']
+
+
+def test_query_group_by_dir():
+    result = Query(group_by=['dir'], top=2).run(funcs_df.lazy())
+
+    assert result['dir'].to_list() == ['pkg', 'pkg/sub']
+    assert result['n_funcs'].to_list() == [2, 2]
+
+    result = Query(
+        group_by=['dir'],
+        aggs=['max(n_nodes) as max_nodes'],
+        sort='max_nodes',
+    ).run(funcs_df.lazy())
+    assert result['dir'].to_list() == ['pkg/sub', 'pkg', '.']
+    assert result['max_nodes'].to_list() == [600, 250, 4]
+
+
+def test_query_arithmetic_on_narrow_counts():
+    narrow = funcs_df.cast({'max_stmt_depth': pl.UInt8, 'n_codelines': pl.UInt32})
+    result = Query(where='n_codelines - 5 < 0', sort='name', ascending=True, top=5).run(narrow.lazy())
+
+    assert result['name'].to_list() == ['a', 'c']
+
+
+def test_query_sums_narrow_counts():
+    narrow = funcs_df.cast({'max_stmt_depth': pl.UInt8}).with_columns(pl.lit(200, dtype=pl.UInt8).alias('max_stmt_depth'))
+    result = Query(group_by=['dir'], aggs=['sum(max_stmt_depth) as depth'], sort='dir', ascending=True).run(narrow.lazy())
+
+    assert result['depth'].to_list() == [200, 400, 400]
+
+
+def test_widen_narrow():
+    narrow = {'n_nodes', 'n_exprs'}
+    assert widen_narrow('n_nodes > 200 and (n_exprs < 3)', narrow) == 'n_nodes > 200 and (n_exprs < 3)'
+    assert widen_narrow('n_nodes - n_exprs > 0', narrow) == \
+        'CAST(n_nodes AS BIGINT) - CAST(n_exprs AS BIGINT) > 0'
+    assert widen_narrow("sum(n_nodes) as n_nodes", narrow) == 'sum(CAST(n_nodes AS BIGINT)) as n_nodes'
+    assert widen_narrow("name = 'n_nodes' or -\"n_exprs\" < 0", narrow) == \
+        "name = 'n_nodes' or -CAST(\"n_exprs\" AS BIGINT) < 0"
+
+
+def test_query_filter_is_pushed_to_the_scan(tmpdir):
+    from morthal.analyze.recap import CodeRecap, FuncsRecap
+
+    store = Store(Path(tmpdir), 'some/target')
+    store.save_recap(CodeRecap(
+        funcs_recap=FuncsRecap(
+            total_funcs=5, avg_depth=0.0, median_depth=0.0, avg_lines=0.0,
+            avg_node_depth_per_func=0.0, avg_node_depth=0.0, total_args=0,
+            annotated_args=0, arg_coverage=0.0, return_coverage=0.0,
+            unannotated_funcs=0,
+        ),
+        funcs_df=funcs_df.cast({'n_nodes': pl.UInt32, 'n_codelines': pl.UInt32}),
+    ))
+
+    for where in ('n_nodes > 200', 'n_nodes - n_codelines > 200'):
+        plan = Query(where=where).apply(store.scan_funcs()).explain()
+        assert 'FILTER' not in plan
+        scan = plan[plan.index('Parquet SCAN'):]
+        assert 'SELECTION' in scan and 'n_nodes' in scan.split('SELECTION', 1)[1]
+        assert Query(where=where).run(store.scan_funcs())['name'].to_list() == ['b', 'd']
+
+
+def test_format_result():
+    df = pl.DataFrame({'name': ['a'], 'n': [1]})
+
+    assert format_result(df, 'csv') == 'name,n\na,1'
+    assert json.loads(format_result(df, 'json')) == [{'name': 'a', 'n': 1}]
+    assert 'name' in format_result(df, 'table')
+
+
+def test_format_result_csv_histograms():
+    df = pl.DataFrame({'name': ['a'], 'hist': [[0, 2, 1]]}, schema={'name': pl.Utf8, 'hist': pl.Array(pl.UInt32, 3)})
+    assert format_result(df, 'csv') == 'name,hist\na,0 2 1'
+
+
+def test_handle_query_reads_store(tmpdir, capsys):
+    from morthal.analyze.recap import CodeRecap, FuncsRecap
+
+    store = Store(Path(tmpdir), 'some/target')
+    store.save_recap(CodeRecap(
+        funcs_recap=FuncsRecap(
+            total_funcs=5, avg_depth=0.0, median_depth=0.0, avg_lines=0.0,
+            avg_node_depth_per_func=0.0, avg_node_depth=0.0, total_args=0,
+            annotated_args=0, arg_coverage=0.0, return_coverage=0.0,
+            unannotated_funcs=0,
+        ),
+        funcs_df=funcs_df,
+    ))
+
+    # opening without a target must not clear anything
+    handle_query(Store(Path(tmpdir)), Query(where="name = 'd'", columns=['name']), 'csv')
+    assert capsys.readouterr().out == 'name\nd\n'
+
+
+def test_handle_query_over_findings(tmpdir, capsys):
+    from morthal.analyze.recap import CodeRecap, FuncsRecap
+
+    store = Store(Path(tmpdir), 'some/target')
+    store.save_recap(CodeRecap(
+        funcs_recap=FuncsRecap(
+            total_funcs=5, avg_depth=0.0, median_depth=0.0, avg_lines=0.0,
+            avg_node_depth_per_func=0.0, avg_node_depth=0.0, total_args=0,
+            annotated_args=0, arg_coverage=0.0, return_coverage=0.0,
+            unannotated_funcs=0,
+        ),
+        funcs_df=funcs_df,
+    ))
+    rules_path = Path(tmpdir) / 'rules.toml'
+    rules_path.write_text('''
+[[rules]]
+name = "complex"
+title = "Complex"
+where = "n_nodes > 100"
+rank_by = "n_nodes"
+
+[[rules]]
+name = "deep"
+title = "Deep"
+where = "max_stmt_depth > 2"
+rank_by = "max_stmt_depth"
+''')
+
+    handle_query(
+        Store(Path(tmpdir)),
+        Query(where="rule = 'complex'", columns=['name', 'value']),
+        'csv',
+        rules_path=rules_path,
+        findings=True,
+    )
+    assert capsys.readouterr().out == 'name,value\nd,600.0\nb,250.0\n'
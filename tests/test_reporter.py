@@ -0,0 +1,174 @@
+import base64
+import gzip
+import json
+
+import polars as pl
+
+from morthal.analyze.collect import CodebaseData
+from morthal.analyze.recap import build_repo_recap
+from morthal.analyze.rollup import build_rollups
+from morthal.reporter import HTMLReporter, ShardedReporter
+from morthal.reporter.markup import html_escape, iter_gzip_base64, render_rows
+
+
+funcs_df = pl.DataFrame({
+    'name': ['b_func', 'a_func', '<evil>'],
+    'fpath': ['pkg/b.py', 'a.py', 'pkg/b.py'],
+    'max_stmt_depth': [1, 6, 3],
+    'n_codelines': [2, 80, 10],
+    'n_exprs': [1, 40, 5],
+    'n_nodes': [4, 300, 20],
+    'avg_node_depth': [1.0, 2.5, 2.0],
+    'n_func_args': [0, 2, 1],
+    'n_func_args_annotated': [0, 2, 0],
+    'return_annotated': [True, True, False],
+})
+
+
+def _reporter() -> HTMLReporter:
+    return HTMLReporter(build_repo_recap(CodebaseData(files_df=pl.DataFrame(), funcs_df=funcs_df)))
+
+
+def test_table_data_is_columnar():
+    encoded = ''.join(iter_gzip_base64(_reporter()._iter_table_json(), chunk_size=3))
+    payload = json.loads(gzip.decompress(base64.b64decode(encoded)))
+
+    assert payload['n'] == 3
+    # dictionary encoded strings, rows sorted by depth descending
+    names = [payload['strings']['name'][code] for code in payload['columns']['name']]
+    assert names == ['a_func', '<evil>', 'b_func']
+    assert payload['columns']['max_depth'] == [6, 3, 1]
+    assert payload['columns']['return_annotated'] == [1, 0, 1]
+
+    # precomputed ascending orders
+    assert payload['orders']['n_nodes'] == [2, 1, 0]
+    assert [names[i] for i in payload['orders']['name']] == ['<evil>', 'a_func', 'b_func']
+
+
+def test_render_rows_escapes():
+    df = pl.DataFrame({'name': ['a&b', '<x>'], 'n': [1, 2]})
+    rows = render_rows(df, '<li>{} ({})</li>', html_escape(pl.col('name')), pl.col('n'))
+    assert rows == ['<li>a&amp;b (1)</li>', '<li>&lt;x&gt; (2)</li>']
+
+
+def test_tech_debt_items_are_escaped():
+    items = _reporter()._generate_tech_debt_items()
+    assert 'High Complexity: a_func' in items
+    assert 'No Type Hints: &lt;evil&gt;' in items
+    assert '<evil>' not in items
+
+
+def test_generate_streams_report(tmp_path):
+    output_path = tmp_path / 'report.html'
+    _reporter().generate(output_path)
+
+    html = output_path.read_text(encoding='utf-8')
+    assert html.startswith('<!DOCTYPE html>')
+    assert html.rstrip().endswith('</html>')
+    encoded = html.split('id="funcsData">')[1].split('</script>')[0]
+    assert json.loads(gzip.decompress(base64.b64decode(encoded)))['n'] == 3
+
+
+def test_histogram_bins_and_overflow():
+    from morthal.reporter.plotting import histogram, svg_histogram
+
+    hist = histogram(pl.Series(list(range(100)) + [10_000]), n_bins=10)
+    assert hist.width == 10
+    assert hist.starts[0] == 0
+    assert sum(hist.counts) + hist.overflow == 101
+    assert hist.overflow == 1
+
+    svg = svg_histogram(hist, 'Lines & more')
+    assert svg.count('<rect') == len(hist.counts) + 1
+    assert 'Lines &amp; more' in svg
+
+
+def test_report_has_inline_charts(tmp_path):
+    output_path = tmp_path / 'report.html'
+    _reporter().generate(output_path)
+
+    html = output_path.read_text(encoding='utf-8')
+    assert html.count('<svg') == 4
+
+
+def _sharded_reporter(df: pl.DataFrame) -> ShardedReporter:
+    repo_data = CodebaseData(files_df=pl.DataFrame({'fpath': df['fpath'].unique()}), funcs_df=df)
+    return ShardedReporter(build_repo_recap(repo_data), build_rollups(repo_data))
+
+
+def test_sharded_report_pages(tmp_path):
+    written = _sharded_reporter(funcs_df).generate(tmp_path, workers=1)
+    assert sorted(written) == ['index.html', 'pkg.dir.html']
+
+    index = (tmp_path / 'index.html').read_text(encoding='utf-8')
+    assert '<a href="pkg.dir.html">pkg</a>' in index
+    pkg = (tmp_path / 'pkg.dir.html').read_text(encoding='utf-8')
+    assert '<a href="index.html">(root)</a>' in pkg
+    assert 'Subdirectories' not in pkg
+
+
+def test_sharded_report_regenerates_changed_pages(tmp_path):
+    _sharded_reporter(funcs_df).generate(tmp_path, workers=1)
+    assert _sharded_reporter(funcs_df).generate(tmp_path, workers=1) == []
+
+    # a change in the root directory leaves pkg untouched
+    changed = funcs_df.with_columns(
+        pl.when(pl.col('fpath') == 'a.py').then(99).otherwise(pl.col('n_codelines')).alias('n_codelines')
+    )
+    assert _sharded_reporter(changed).generate(tmp_path, workers=1) == ['index.html']
+
+    # pages of directories which are gone are removed
+    _sharded_reporter(funcs_df.filter(pl.col('fpath') == 'a.py')).generate(tmp_path, workers=1)
+    assert not (tmp_path / 'pkg.dir.html').exists()
+
+
+def test_sharded_report_workers(tmp_path):
+    written = _sharded_reporter(funcs_df).generate(tmp_path / 'pool', workers=2)
+    _sharded_reporter(funcs_df).generate(tmp_path / 'serial', workers=1)
+
+    assert sorted(written) == ['index.html', 'pkg.dir.html']
+    for name in written:
+        pooled = (tmp_path / 'pool' / name).read_text(encoding='utf-8')
+        assert pooled == (tmp_path / 'serial' / name).read_text(encoding='utf-8')
+    assert _sharded_reporter(funcs_df).generate(tmp_path / 'pool', workers=2) == []
+
+
+def test_sharded_report_page_names_dont_collide(tmp_path):
+    df = pl.concat([funcs_df] * 2).with_columns(
+        fpath=pl.Series(['index/x.py', 'a.b/y.py', 'a/b/z.py', 'a/b~2Ec/w.py', 'a/b.c/v.py', 'top.py'])
+    )
+    written = _sharded_reporter(df).generate(tmp_path, workers=1)
+
+    assert len(set(written)) == len(written) == 7
+    assert sorted(written) == sorted(p.name for p in tmp_path.glob('*.html'))
+    # every page has the functions of its own directory only
+    index = (tmp_path / 'index.html').read_text(encoding='utf-8')
+    assert 'top.py' in index and 'Subdirectories' in index
+    dotted = (tmp_path / 'a~2Eb.dir.html').read_text(encoding='utf-8')
+    assert 'a.b/y.py' in dotted and 'a/b/z.py' not in dotted
+    # the links to the children are the pages written for them
+    a = (tmp_path / 'a.dir.html').read_text(encoding='utf-8')
+    for child in ('a.b.dir.html', 'a.b~7E2Ec.dir.html', 'a.b~2Ec.dir.html'):
+        assert f'<a href="{child}">' in a
+        assert child in written
+
+
+def test_report_draws_history_trends(tmp_path):
+    history_df = pl.DataFrame({
+        'datetime': [f'2024-01-{day:02}T10:00:00' for day in range(1, 29)],
+        'total_funcs': list(range(28)),
+        'avg_depth': [1.0] * 28,
+    })
+    output_path = tmp_path / 'report.html'
+    HTMLReporter(_reporter().recap, history_df).generate(output_path)
+
+    html = output_path.read_text(encoding='utf-8')
+    assert 'id="trends"' in html
+    assert html.count('<polyline') == 2
+    assert '2024-01-01' in html and '2024-01-28' in html
+
+
+def test_report_without_history_has_no_trends(tmp_path):
+    output_path = tmp_path / 'report.html'
+    _reporter().generate(output_path)
+    assert 'id="trends"' not in output_path.read_text(encoding='utf-8')
@@ -0,0 +1,100 @@
+import polars as pl
+import pytest
+
+from morthal.rules import Rule, default_rules, evaluate_rules, load_rules
+
+
+funcs_df = pl.DataFrame({
+    'name': ['a', 'b', 'c', 'd', 'e', 'f'],
+    'fpath': ['a.py', 'pkg/b.py', 'pkg/b.py', 'pkg/c.py', 'pkg/c.py', 'pkg/c.py'],
+    'max_stmt_depth': [1, 6, 2, 7, 6, 2],
+    'n_codelines': [2, 80, 4, 60, 70, 6],
+    'n_exprs': [1, 30, 2, 40, 20, 3],
+    'n_nodes': [4, 250, 8, 600, 150, 12],
+    'n_func_args': [1, 2, 0, 1, 1, 3],
+    'n_func_args_annotated': [0, 2, 0, 1, 1, 0],
+    'return_annotated': [False, True, True, True, True, False],
+})
+
+
+def test_default_rules():
+    findings = evaluate_rules(default_rules(), funcs_df.lazy()).collect()
+
+    critical = findings.filter(pl.col('rule') == 'critical')
+    # ranked by depth, ties in the order of the source
+    assert critical['name'].to_list() == ['d', 'b', 'e']
+    assert critical['message'][0] == 'Deep nesting (7) + Long function (60 lines)'
+    assert critical['severity'].unique().to_list() == ['critical']
+
+    complexity = findings.filter(pl.col('rule') == 'high_complexity')
+    assert complexity['name'].to_list() == ['d', 'b', 'e']
+    assert complexity['value'].to_list() == [600.0, 250.0, 150.0]
+
+    no_hints = findings.filter(pl.col('rule') == 'no_type_hints')
+    assert no_hints['name'].to_list() == ['a', 'f']
+    assert no_hints['value'].to_list() == [None, None]
+
+    # findings come out in rule order
+    assert findings['rule'].unique(maintain_order=True).to_list() == [
+        'critical', 'high_complexity', 'no_type_hints'
+    ]
+
+
+def test_limits_and_ascending():
+    rules = [
+        Rule(name='top', title='Top', where='n_nodes > 0', rank_by='n_nodes', limit=2),
+        Rule(name='small', title='Small', where='n_nodes > 0', rank_by='n_nodes', descending=False, limit=1),
+    ]
+    findings = evaluate_rules(rules, funcs_df.lazy()).collect()
+
+    assert findings.filter(pl.col('rule') == 'top')['name'].to_list() == ['d', 'b']
+    assert findings.filter(pl.col('rule') == 'small')['name'].to_list() == ['a']
+
+
+def test_rules_scan_once():
+    plan = evaluate_rules(default_rules(), funcs_df.lazy()).explain()
+    assert plan.count('DF [') == 1
+
+
+def test_rules_filter_is_pushed_to_the_scan(tmp_path):
+    funcs_df.write_parquet(tmp_path / 'funcs.parquet')
+    lf = pl.scan_parquet(tmp_path / 'funcs.parquet')
+    plan = evaluate_rules(default_rules(), lf).explain()
+
+    # the only filter left above the scan keeps the top findings
+    assert plan.count('FILTER') == 1 and 'int_range' in plan.split('FILTER')[1].split('\n')[0]
+    assert 'n_nodes") > 100' in plan.split('SELECTION:')[1]
+    assert evaluate_rules(default_rules(), lf).collect().equals(
+        evaluate_rules(default_rules(), funcs_df.lazy()).collect()
+    )
+
+
+def test_no_rules():
+    findings = evaluate_rules([], funcs_df.lazy()).collect()
+    assert findings.height == 0
+    assert 'message' in findings.columns
+
+
+def test_load_rules(tmp_path):
+    assert load_rules() == default_rules()
+
+    path = tmp_path / 'rules.toml'
+    path.write_text('''
+[[rules]]
+name = "huge"
+title = "Huge"
+where = "n_codelines >= 70"
+rank_by = "n_codelines"
+message = "{n_codelines} lines in {fpath}"
+''', encoding='utf-8')
+    rules = load_rules(path)
+    assert [rule.name for rule in rules] == ['huge']
+
+    findings = evaluate_rules(rules, funcs_df.lazy()).collect()
+    assert findings['message'].to_list() == ['80 lines in pkg/b.py', '70 lines in pkg/c.py']
+
+
+def test_message_placeholders():
+    rule = Rule(name='x', title='X', where='true', message='{n_nodes:.1f}')
+    with pytest.raises(ValueError):
+        evaluate_rules([rule], funcs_df.lazy())
@@ -292,3 +292,50 @@ def test_elden_types():
     assert ast.ClassDef in ELDEN_TYPES
     assert ast.FunctionDef in ELDEN_TYPES
     assert ast.AsyncFunctionDef in ELDEN_TYPES
+
+
+def test_enrich_without_depths():
+    ast_mod = ast.parse('''
+def a_func():
+    if True:
+        return None''')
+    nsink = NodeSink()
+    enrich(ast_mod, node_sink=nsink, node_depths=False, stmt_depths=False)
+
+    func_ast = nsink.funcs[0]
+    assert func_ast.elden is ast_mod
+    assert not hasattr(func_ast, 'relative_node_depths')
+    assert not hasattr(func_ast, 'relative_stmt_depths')
+
+
+def test_enrich_qualnames():
+    source = '''
+def a_func():
+    class Local:
+        def method(self):
+            def inner():
+                pass
+
+class Outer:
+    class Inner:
+        async def method(self):
+            pass
+
+    @property
+    def prop(self):
+        lambda: None
+'''
+    nsink = NodeSink()
+    enrich(ast.parse(source), node_sink=nsink)
+
+    # the same as the __qualname__ of the functions
+    namespace: dict = {}
+    exec(source, namespace)
+    outer = namespace['Outer']
+    assert [f.qualname for f in nsink.funcs] == [
+        namespace['a_func'].__qualname__,
+        'a_func.<locals>.Local.method',
+        'a_func.<locals>.Local.method.<locals>.inner',
+        outer.Inner.method.__qualname__,
+        outer.prop.fget.__qualname__,
+    ]
@@ -1,7 +1,10 @@
+from typing import Annotated
+
 import polars as pl
+from pydantic import BaseModel
 
-from morthal.analyze.collect import FuncStats
-from morthal.utils.df import empty_df_from_model
+from morthal.analyze.collect import FuncStats, dicts_to_df
+from morthal.utils.df import empty_df_from_model, hist_quantile, pydantic_to_polars_schema
 
 def test_empty_db_from_model() -> pl.DataFrame:
     empty_df = empty_df_from_model(FuncStats)
@@ -9,4 +12,39 @@ def test_empty_db_from_model() -> pl.DataFrame:
     assert empty_df.shape[0] == 0
     assert 'name' in empty_df.columns
     assert 'n_exprs' in empty_df.columns
-    assert 'n_nodes' in empty_df.columns
\ No newline at end of file
+    assert 'n_nodes' in empty_df.columns
+
+class Hinted(BaseModel):
+    depth: Annotated[int, pl.UInt8]
+    size: Annotated[int, pl.UInt32] | None
+    name: Annotated[str, pl.Categorical]
+    count: int
+
+
+def test_schema_width_hints():
+    assert pydantic_to_polars_schema(Hinted) == {
+        'depth': pl.UInt8,
+        'size': pl.UInt32,
+        'name': pl.Categorical,
+        'count': pl.Int64,
+    }
+
+
+def test_dicts_to_df_applies_the_schema():
+    df = dicts_to_df([{'depth': 3, 'size': None, 'name': 'f', 'count': 1, 'extra': 1.5}], Hinted)
+    assert dict(df.schema) == {
+        'depth': pl.UInt8,
+        'size': pl.UInt32,
+        'name': pl.Categorical,
+        'count': pl.Int64,
+        'extra': pl.Float64,
+    }
+
+
+def test_hist_quantile():
+    df = pl.DataFrame(
+        {'hist': [[0, 2, 3, 5], [0, 0, 0, 0], [9, 1, 0, 0]]},
+        schema={'hist': pl.Array(pl.UInt32, 4)},
+    )
+    assert df.select(hist_quantile('hist', 0.5))['hist'].to_list() == [2, 0, 0]
+    assert df.select(hist_quantile(pl.col('hist'), 0.95))['hist'].to_list() == [3, 0, 1]
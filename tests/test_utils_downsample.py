@@ -0,0 +1,44 @@
+import math
+
+import polars as pl
+import pytest
+
+from morthal.utils.downsample import downsample, lttb_indexes, minmax_indexes
+
+
+n = 10_000
+spike = 7_321
+ys = pl.Series([math.sin(i / 100) + (100.0 if i == spike else 0.0) for i in range(n)])
+xs = pl.Series(range(n))
+
+
+def test_minmax_keeps_spikes():
+    indexes = minmax_indexes(ys, 500)
+    assert len(indexes) <= 500
+    assert indexes == sorted(set(indexes))
+    assert indexes[0] == 0 and indexes[-1] == n - 1
+    assert spike in indexes
+
+
+def test_lttb_keeps_spikes():
+    indexes = lttb_indexes(xs, ys, 500)
+    assert len(indexes) == 500
+    assert indexes == sorted(set(indexes))
+    assert indexes[0] == 0 and indexes[-1] == n - 1
+    assert spike in indexes
+
+
+def test_short_series_are_untouched():
+    assert minmax_indexes(pl.Series([3, 1, 2]), 10) == [0, 1, 2]
+    assert lttb_indexes(pl.Series([0, 1, 2]), pl.Series([3, 1, 2]), 10) == [0, 1, 2]
+
+
+def test_downsample_rows():
+    df = pl.DataFrame({'x': xs, 'y': ys})
+    for method in ('minmax', 'lttb'):
+        sampled = downsample(df, 'x', 'y', 100, method)
+        assert sampled.height <= 100
+        assert sampled['y'].max() == ys.max()
+
+    with pytest.raises(ValueError):
+        downsample(df, 'x', 'y', 100, 'nope')
@@ -0,0 +1,116 @@
+import ast
+
+import pytest
+
+from morthal.utils.ast import ModCounts, NodeSink, enrich, identify_tab_offset
+from morthal.utils.scan import AmbiguousSource, scan_module
+
+
+def _from_tree(source: str) -> tuple:
+    ast_mod = ast.parse(source)
+    nsink = NodeSink()
+    mcounts = ModCounts()
+    enrich(ast_mod, node_sink=nsink, cpf=mcounts)
+    funcs = [
+        (
+            f.name, getattr(f.elden, 'name', None), f.lineno, f.end_lineno,
+            f.decorator_list[0].lineno if f.decorator_list else f.lineno,
+            f.qualname, f.relative_stmt_depths,
+        )
+        for f in nsink.funcs
+    ]
+    return funcs, mcounts.n_stmts, identify_tab_offset(ast_mod)
+
+
+def _from_scan(source: str) -> tuple:
+    scanned = scan_module(source)
+    funcs = [
+        (
+            f.name, f.parent_name, f.lineno, f.end_lineno, f.first_lineno,
+            f.qualname, f.relative_stmt_depths,
+        )
+        for f in scanned.funcs
+    ]
+    return funcs, scanned.n_stmts, scanned.tab_offset
+
+
+SOURCES = [
+    # blocks, clauses and nested eldens
+    '''
+import os
+
+@decorator(
+    arg=1,
+)
+def a_func(x: int = 1, *args, **kwargs) -> dict[str, int]:
+    """docstring"""
+    if x:
+        y = {1: 2}[1]
+    elif x > 2:
+        pass
+    else:
+        try:
+            z = (1,
+                 2)
+        except ValueError:
+            raise
+        finally:
+            pass
+
+    class Inner:
+        attr: int = 1
+
+        def method(self):
+            return self.attr
+
+    # a comment
+
+    return Inner
+''',
+    # inline bodies, semicolons and lambdas in headers
+    '''
+def b_func(): return 1
+class C: x = 1; y = 2
+if (lambda: True)(): z = 1; w = 2
+async def c_func():
+  async with ctx() as c: await c
+  for i in range(3): print(i); print(i * 2)
+  while True: break
+  f = lambda a: a
+  match = 3
+@dec
+class D:
+    @staticmethod
+    @other(1)
+    def s(): pass
+    def t(): pass
+''',
+    # a module without compound statements
+    '''
+x = 1
+y = x + 1
+''',
+]
+
+
+@pytest.mark.parametrize('source', SOURCES)
+def test_scan_matches_tree(source):
+    assert _from_scan(source) == _from_tree(source)
+
+
+def test_scan_tab_offset():
+    assert scan_module('if x:\n  y = 1\n').tab_offset == 2
+    assert scan_module('if x: y = 1\n').tab_offset == 6
+    assert scan_module('x = 1\n').tab_offset == 0
+
+
+@pytest.mark.parametrize('source', [
+    'match x:\n    case 1:\n        pass\n',
+    'type Alias = int\n',
+    'if x: y = "é"\n',
+    'x = 1\n\fy = 2\n',
+    'def f(:\n    pass\n    (',
+])
+def test_scan_ambiguous(source):
+    with pytest.raises(AmbiguousSource):
+        scan_module(source)
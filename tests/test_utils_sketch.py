@@ -0,0 +1,69 @@
+import bisect
+import random
+
+import pytest
+
+from morthal.utils.sketch import ExactQuantiles, KLLSketch
+
+
+def test_exact_quantiles():
+    eq = ExactQuantiles()
+    eq.update([1, 2, 2, 3, 10])
+
+    assert eq.n == 5
+    assert eq.quantile(0.5) == 2
+    assert eq.quantile(0.0) == 1
+    assert eq.quantile(1.0) == 10
+    # linear interpolation between the 4th and 5th values
+    assert eq.quantile(0.9) == pytest.approx(3 + 0.6 * 7)
+
+    other = ExactQuantiles()
+    other.add(4, count=3)
+    merged = eq.merge(other)
+    assert merged.n == 8
+    assert merged.subtract(other) == eq
+
+    with pytest.raises(ValueError):
+        eq.subtract(other)
+
+
+def test_exact_quantiles_empty():
+    assert ExactQuantiles().quantile(0.5) == 0.0
+
+
+def test_kll_rank_error_within_bound():
+    rng = random.Random(42)
+    values = [int(rng.paretovariate(1.5) * 5) for _ in range(50_000)]
+    svalues = sorted(values)
+
+    shards = [KLLSketch(seed=i) for i in range(4)]
+    for i, value in enumerate(values):
+        shards[i % 4].add(value)
+    sketch = shards[0]
+    for shard in shards[1:]:
+        sketch = sketch.merge(shard)
+
+    assert sketch.n == len(values)
+    assert sketch.min == svalues[0]
+    assert sketch.max == svalues[-1]
+
+    for q in (0.1, 0.5, 0.9, 0.99):
+        value = sketch.quantile(q)
+        lo = bisect.bisect_left(svalues, value) / len(svalues)
+        hi = bisect.bisect_right(svalues, value) / len(svalues)
+        assert lo - 0.017 <= q <= hi + 0.017
+
+
+def test_kll_repeated_values_are_cheap():
+    sketch = KLLSketch()
+    sketch.add(3, count=1_000_000)
+    sketch.add(5, count=10)
+
+    assert sketch.n == 1_000_010
+    assert sketch.quantile(0.5) == 3
+    assert sketch.quantile(1.0) == 5
+
+
+def test_sketches_do_not_mix():
+    with pytest.raises(TypeError):
+        ExactQuantiles().merge(KLLSketch())
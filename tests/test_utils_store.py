@@ -49,6 +49,24 @@ def test_store_mismatched_target_clears_cache(tmpdir):
     assert not store2.has_cached_recap
 
 
+def test_store_mismatched_metrics_clears_cache(tmpdir):
+    tmppath = Path(tmpdir)
+    store = Store(tmppath, "some/target", metrics=["lines", "args"])
+    store.save_recap(recap)
+
+    assert Store(tmppath, "some/target", metrics=["args", "lines"]).has_cached_recap
+    assert not Store(tmppath, "some/target").has_cached_recap
+
+
+def test_store_mismatched_plugins_clears_cache(tmpdir):
+    tmppath = Path(tmpdir)
+    store = Store(tmppath, "some/target", plugins=["calls"])
+    store.save_recap(recap)
+
+    assert Store(tmppath, "some/target", plugins=["calls"]).has_cached_recap
+    assert not Store(tmppath, "some/target").has_cached_recap
+
+
 def test_store_force_clears_cache(tmpdir):
     tmppath = Path(tmpdir)
     store = Store(tmppath, "some/target")
@@ -67,3 +85,113 @@ def test_store_force_clears_cache(tmpdir):
 
     store2 = Store(tmppath, "some/target", force=True)
     assert not store2.has_cached_recap
+
+
+def test_store_history_is_cleared_by_target_only(tmpdir):
+    tmppath = Path(tmpdir)
+    Store(tmppath, "some/target")
+    (tmppath / "commit_history.csv").write_text("commit_hash\nabc\n")
+
+    assert Store(tmppath, "some/target", force=True).has_history
+    assert Store(tmppath, "some/target", metrics=["lines"]).has_history
+    assert Store(tmppath, "some/target", plugins=["calls"], docstrings=True).has_history
+    assert not Store(tmppath, "different/target").has_history
+
+
+def test_store_saves_and_loads_rollups(tmpdir):
+    from morthal.analyze.rollup import Rollups
+
+    store = Store(Path(tmpdir), "some/target")
+    assert store.load_rollups() is None
+
+    store.save_rollups(Rollups(df=pl.DataFrame({"prefix": [".", "pkg"]})))
+    assert store.load_rollups().df["prefix"].to_list() == [".", "pkg"]
+
+
+def test_store_saves_and_loads_index(tmpdir):
+    from morthal.analyze.index import build_funcs_index
+
+    indexed = CodeRecap(
+        funcs_recap=recap.funcs_recap,
+        funcs_df=recap.funcs_df,
+        funcs_index=build_funcs_index(recap.funcs_df, metrics=["x"]),
+    )
+    store = Store(Path(tmpdir), "some/target")
+    store.save_recap(indexed)
+
+    loaded = store.load_recap()
+    assert loaded.funcs_index.top_k(loaded.funcs_df, "x", 2)["x"].to_list() == [3, 2]
+    assert loaded.funcs_index.cuts == indexed.funcs_index.cuts
+    assert loaded.name_index is None
+
+
+def test_store_saves_and_loads_name_index(tmpdir):
+    from morthal.analyze.index import build_name_index
+
+    funcs_df = pl.DataFrame({"qualname": ["m.C.g", "m.f", "m.C.f"], "x": [1, 2, 3]})
+    indexed = CodeRecap(
+        funcs_recap=recap.funcs_recap,
+        funcs_df=funcs_df,
+        name_index=build_name_index(funcs_df),
+    )
+    store = Store(Path(tmpdir), "some/target")
+    store.save_recap(indexed)
+
+    loaded = store.load_recap()
+    assert loaded.name_index.lookup(loaded.funcs_df, "m.f")["x"].to_list() == [2]
+    assert loaded.name_index.subtree(loaded.funcs_df, "m.C")["x"].to_list() == [3, 1]
+
+
+def test_store_ipc_cache(tmpdir):
+    tmppath = Path(tmpdir)
+    store = Store(tmppath, "some/target", ipc_cache=True)
+    store.save_recap(recap)
+    assert (tmppath / "funcs.arrow").exists()
+
+    loaded = Store(tmppath, "some/target", ipc_cache=True).load_recap()
+    assert loaded.funcs_df.equals(recap.funcs_df)
+
+
+def test_store_ipc_cache_is_warmed_on_load(tmpdir):
+    tmppath = Path(tmpdir)
+    Store(tmppath, "some/target").save_recap(recap)
+    assert not (tmppath / "funcs.arrow").exists()
+
+    store = Store(tmppath, "some/target", ipc_cache=True)
+    assert store.load_recap().funcs_df.equals(recap.funcs_df)
+    assert (tmppath / "funcs.arrow").exists()
+    assert store.load_funcs().equals(recap.funcs_df)
+
+
+def test_store_keeps_paths_in_a_file_table(tmpdir):
+    tmppath = Path(tmpdir)
+    funcs_df = pl.DataFrame({
+        "fpath": ["b.py", "a.py", "b.py"],
+        "name": ["f", "g", "h"],
+    })
+    paths_recap = CodeRecap(funcs_recap=recap.funcs_recap, funcs_df=funcs_df)
+    for ipc_cache in (False, True):
+        store = Store(tmppath, "some/target", ipc_cache=ipc_cache)
+        store.save_recap(paths_recap)
+
+        assert "fpath" not in pl.read_parquet_schema(tmppath / "funcs.parquet")
+        assert pl.read_parquet(tmppath / "files.parquet")["fpath"].to_list() == ["b.py", "a.py"]
+
+        loaded = store.load_funcs()
+        assert loaded["fpath"].dtype == pl.Enum(["b.py", "a.py"])
+        assert loaded["fpath"].cast(pl.Utf8).to_list() == ["b.py", "a.py", "b.py"]
+        assert store.scan_funcs().collect().equals(loaded)
+
+
+def test_store_docstrings_side_table(tmpdir):
+    tmppath = Path(tmpdir)
+    store = Store(tmppath, "some/target")
+    store.save_recap(recap)
+    assert store.scan_docstrings() is None
+
+    store.save_docstrings(pl.DataFrame({"func_id": [0, 2], "docstring": ["a", "b"]}))
+    assert store.scan_docstrings().collect()["docstring"].to_list() == ["a", "b"]
+    assert Store(tmppath, "some/target").has_cached_recap
+
+    # docstrings asked for, which the stored results don't have
+    assert not Store(tmppath, "some/target", docstrings=True).has_cached_recap